@@ -0,0 +1,230 @@
+"""Measure build and cleanup throughput against a fake Discord API.
+
+Runs the real build path (compile_plan + execute_build through a
+RouteScheduler) and cleanup path (plan_cleanup + execute_cleanup) against
+fake_discord.FakeDiscord, for the shipped templates and synthetic ones up
+to Discord's limits of 500 channels and 250 roles per guild.  Each run
+reports wall time, API calls per phase, 429 responses and peak traced
+memory.
+
+Latency/rate-limit profiles:
+
+* ``instant`` - no latency, no rate limits (pure code overhead)
+* ``latency`` - 30-80 ms per request, no rate limits
+* ``limited`` - 30-80 ms per request and small per-route buckets
+
+Peak memory comes from tracemalloc, which slows Python code noticeably and
+also counts the in-process fake server; pass ``--no-memory`` for clean
+timings.
+
+Usage: ``python benchmarks/bench_build.py [--templates all] [--profiles instant,latency] [--json] [--output FILE]``
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import discord  # noqa: E402
+
+from build_executor import RouteScheduler, execute_build  # noqa: E402
+from build_plans import compile_plan  # noqa: E402
+from cleanup import execute_cleanup, plan_cleanup  # noqa: E402
+from fake_discord import FakeDiscord  # noqa: E402
+
+PROFILES = {
+    'instant': {'latency': 0.0, 'rate_limits': None},
+    'latency': {'latency': (0.03, 0.08), 'rate_limits': None},
+    'limited': {'latency': (0.03, 0.08), 'rate_limits': {
+        'POST /guilds/{guild_id}/roles': (10, 1.0),
+        'POST /guilds/{guild_id}/channels': (10, 1.0),
+        'DELETE /guilds/{guild_id}/roles/{role_id}': (10, 1.0),
+        'DELETE /channels/{channel_id}': (10, 1.0),
+    }},
+}
+
+# (channels including categories, roles); Discord caps a guild at 500 and 250
+SYNTHETIC_SIZES = [(100, 50), (250, 125), (500, 250)]
+
+# Discord allows at most 50 channels in one category
+CHANNELS_PER_CATEGORY = 50
+
+
+def synthetic_template(total_channels, roles):
+    """A template with ``total_channels`` channels (categories included) and ``roles`` roles"""
+    category_count = -(-total_channels // CHANNELS_PER_CATEGORY)
+    remaining = total_channels - category_count
+    categories = []
+    for c in range(category_count):
+        size = remaining // (category_count - c)
+        remaining -= size
+        channels = [{'name': f'channel-{c}-{i}', 'type': 'voice' if i % 5 == 4 else 'text',
+                     'topic': f'Synthetic channel {i}'} for i in range(size)]
+        categories.append({'name': f'Category {c}', 'channels': channels})
+    return {
+        'server_name': f'Synthetic {total_channels}c/{roles}r',
+        'categories': categories,
+        'roles': [{'name': f'Role {r}', 'permissions': ['send_messages', 'read_message_history']}
+                  for r in range(roles)],
+    }
+
+
+def load_templates(selection):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates.json'),
+              'r', encoding='utf-8') as f:
+        templates = json.load(f)
+    for total_channels, roles in SYNTHETIC_SIZES:
+        templates[f'synthetic-{total_channels}'] = synthetic_template(total_channels, roles)
+    if selection == 'all':
+        return templates
+    names = selection.split(',')
+    unknown = [name for name in names if name not in templates]
+    if unknown:
+        raise SystemExit(f"Unknown templates: {', '.join(unknown)} (have: {', '.join(templates)})")
+    return {name: templates[name] for name in names}
+
+
+def phase_calls(requests):
+    calls = {}
+    for request in requests:
+        calls[request['route']] = calls.get(request['route'], 0) + 1
+    return calls
+
+
+async def timed_phase(fake, measure_memory, coroutine):
+    """Run one phase and return (result, stats) for the requests it made"""
+    fake.reset_log()
+    if measure_memory:
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    # The executors log every created/deleted object
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = await coroutine
+    stats = {
+        'seconds': time.perf_counter() - started,
+        'api_calls': len(fake.requests),
+        'calls_by_route': phase_calls(fake.requests),
+        'rate_limited': fake.count(status=429),
+    }
+    if measure_memory:
+        stats['peak_memory'] = tracemalloc.get_traced_memory()[1]
+    return result, stats
+
+
+async def run_one(name, template, profile, measure_memory):
+    fake = FakeDiscord(**PROFILES[profile])
+    client = discord.Client(intents=discord.Intents.default())
+    async with fake:
+        await client.login('fake-token')
+        try:
+            guild_id = fake.create_guild('Benchmark', channels=('commands',))
+            fake.attach(client)
+            guild = client.get_guild(int(guild_id))
+            keep_channel = guild.text_channels[0]
+
+            started = time.perf_counter()
+            plan = compile_plan(template, key=name)
+            compile_seconds = time.perf_counter() - started
+
+            build, build_stats = await timed_phase(
+                fake, measure_memory, execute_build(guild, plan.ops, RouteScheduler(), reason='Benchmark'))
+            cleanup, cleanup_stats = await timed_phase(
+                fake, measure_memory,
+                execute_cleanup(plan_cleanup(guild, keep_channel=keep_channel), RouteScheduler()))
+        finally:
+            await client.close()
+
+    build_stats.update(created=len(build.created), failed=len(build.failed))
+    cleanup_stats.update(deleted=len(cleanup.deleted), failed=len(cleanup.failed))
+    return {
+        'template': name,
+        'profile': profile,
+        'categories': plan.category_count,
+        'channels': plan.channel_count,
+        'roles': plan.role_count,
+        'compile_seconds': compile_seconds,
+        'build': build_stats,
+        'cleanup': cleanup_stats,
+        'total_seconds': build_stats['seconds'] + cleanup_stats['seconds'],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run_all(templates, profiles, measure_memory):
+    results = []
+    for profile in profiles:
+        for name, template in templates.items():
+            result = await run_one(name, template, profile, measure_memory)
+            results.append(result)
+            print(f"  {profile:<8} {name:<16} {result['total_seconds']:.2f}s", file=sys.stderr)
+    return results
+
+
+def print_table(results):
+    print(f"{'profile':<9}{'template':<17}{'cat':>4}{'chan':>5}{'role':>5}"
+          f"{'build':>9}{'calls':>6}{'cleanup':>9}{'calls':>6}{'429s':>6}{'peak mem':>10}")
+    for r in results:
+        build, cleanup = r['build'], r['cleanup']
+        peak = max(build.get('peak_memory', 0), cleanup.get('peak_memory', 0))
+        peak_text = f"{peak / 1024 / 1024:.1f} MB" if peak else '-'
+        print(f"{r['profile']:<9}{r['template']:<17}{r['categories']:>4}{r['channels']:>5}{r['roles']:>5}"
+              f"{build['seconds']:>8.2f}s{build['api_calls']:>6}{cleanup['seconds']:>8.2f}s{cleanup['api_calls']:>6}"
+              f"{build['rate_limited'] + cleanup['rate_limited']:>6}{peak_text:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--templates', default='all', help='comma-separated template names, or "all"')
+    parser.add_argument('--profiles', default='instant,latency', help=f"comma-separated, from {', '.join(PROFILES)}")
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc for undistorted timings')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    args = parser.parse_args()
+
+    profiles = args.profiles.split(',')
+    unknown = [profile for profile in profiles if profile not in PROFILES]
+    if unknown:
+        raise SystemExit(f"Unknown profiles: {', '.join(unknown)} (have: {', '.join(PROFILES)})")
+    templates = load_templates(args.templates)
+
+    measure_memory = not args.no_memory
+    if measure_memory:
+        tracemalloc.start()
+    results = asyncio.run(run_all(templates, profiles, measure_memory))
+
+    report = {
+        'benchmark': 'build',
+        'revision': git_revision(),
+        'recorded_at': datetime.datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'discord.py': discord.__version__,
+        'memory_traced': measure_memory,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""Compare saved-build store encodings on a synthetic store.
+
+Generates N synthetic saved builds (default 100,000) spread over users
+and measures file size, save time, load time and build code lookup time
+for:
+
+* ``legacy``  - the original per-user layout, pretty-printed JSON
+* ``json``    - JsonBuildStore with shared bodies, pretty-printed JSON
+* ``compact`` - JsonBuildStore with shared bodies, zlib-compressed minified JSON
+* ``sqlite``  - SQLiteBuildStore (the default backend) with shared bodies in
+  ``build_bodies``, filled by migrating the legacy file the way
+  ``open_build_store`` does; its save time is the migration.  Deduplication
+  empties each migrated row's inline data but SQLite keeps the half-empty
+  pages, so the size after a ``VACUUM`` is reported as well
+
+Usage: ``python benchmarks/bench_store_encoding.py [--builds N] [--duplicates 0.2] [--json]``
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from build_store import BUILD_FORMAT_VERSION, JsonBuildStore, SQLiteBuildStore, open_build_store  # noqa: E402
+from store_encoding import ENCODING_COMPACT, ENCODING_JSON  # noqa: E402
+
+# Build codes looked up per store when timing get_by_code
+LOOKUPS = 1000
+
+WORDS = ['general', 'chat', 'memes', 'music', 'gaming', 'study', 'help', 'announcements',
+         'rules', 'media', 'events', 'voice', 'lounge', 'support', 'projects', 'trading']
+
+
+def synthetic_build(rng, i):
+    """A saved build shaped like save_server_structure output"""
+    categories = []
+    for c in range(rng.randint(3, 8)):
+        channels = []
+        for _ in range(rng.randint(2, 6)):
+            channel = {'name': f"{rng.choice(WORDS)}-{rng.randint(0, 999)}",
+                       'type': 'voice' if rng.random() < 0.25 else 'text'}
+            if channel['type'] == 'text' and rng.random() < 0.6:
+                channel['topic'] = f"Talk about {rng.choice(WORDS)} and {rng.choice(WORDS)}"
+            channels.append(channel)
+        categories.append({'name': f"{rng.choice(WORDS).title()} {c}", 'channels': channels})
+    roles = [{'name': f"{rng.choice(WORDS).title()} Role {r}", 'permissions': rng.getrandbits(40)}
+             for r in range(rng.randint(3, 8))]
+    return {'format': BUILD_FORMAT_VERSION, 'server_name': f"Server {i}", 'categories': categories, 'roles': roles}
+
+
+def synthetic_builds(count, duplicates, seed=1):
+    """user id -> {code: build}; ``duplicates`` of the builds repeat an earlier one"""
+    rng = random.Random(seed)
+    builds = {}
+    originals = []
+    for i in range(count):
+        if originals and rng.random() < duplicates:
+            build = json.loads(json.dumps(rng.choice(originals)))
+        else:
+            build = synthetic_build(rng, i)
+            originals.append(build)
+        builds.setdefault(str(100000 + i % (count // 3 + 1)), {})[f"{i:08X}"] = build
+    return builds
+
+
+def timed(func):
+    # Don't bill one run for the garbage left by the previous one
+    gc.collect()
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def timed_lookups(store, codes):
+    """Average seconds per get_by_code over ``codes``"""
+    _, seconds = timed(lambda: [store.get_by_code(code) for code in codes])
+    return seconds / len(codes)
+
+
+def lookup_codes(builds, seed=2):
+    codes = [code for user_builds in builds.values() for code in user_builds]
+    return random.Random(seed).sample(codes, min(LOOKUPS, len(codes)))
+
+
+def bench_legacy(builds, directory):
+    path = os.path.join(directory, 'legacy.json')
+
+    def save():
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(builds, f, indent=2, ensure_ascii=False)
+
+    _, save_time = timed(save)
+
+    # The bot read the legacy file with a plain json.load
+    def load():
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    _, load_time = timed(load)
+    return {'size': os.path.getsize(path), 'save_seconds': save_time, 'load_seconds': load_time,
+            'lookup_seconds': None, 'path': path}
+
+
+def bench_store(builds, directory, encoding):
+    path = os.path.join(directory, f'{encoding}.store')
+    store = JsonBuildStore(path, encoding=encoding)
+    store.builds = {user_id: dict(user_builds) for user_id, user_builds in builds.items()}
+    store.rebuild_index()
+
+    _, save_time = timed(lambda: store._write(store._snapshot()))
+    loaded, load_time = timed(lambda: JsonBuildStore(path, encoding=encoding))
+    assert loaded.count() == store.count()
+    return {'size': os.path.getsize(path), 'save_seconds': save_time, 'load_seconds': load_time,
+            'lookup_seconds': timed_lookups(loaded, lookup_codes(builds)), 'bodies': loaded.body_count()}
+
+
+def bench_sqlite(builds, directory, legacy_path):
+    path = os.path.join(directory, 'sqlite.db')
+    json_path = os.path.join(directory, 'migrate.json')
+    with open(legacy_path, 'rb') as source, open(json_path, 'wb') as copy:
+        copy.write(source.read())
+
+    # Migration, format upgrade and deduplication, as on the first start after switching backends
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrated, save_time = timed(lambda: open_build_store('sqlite', path=path, json_path=json_path))
+    count = sum(len(user_builds) for user_builds in builds.values())
+    assert migrated.count() == count
+    migrated.close()
+
+    # Opening the database reads nothing up front; counting forces a real read
+    def load():
+        store = SQLiteBuildStore(path)
+        store.count()
+        return store
+
+    loaded, load_time = timed(load)
+    result = {'save_seconds': save_time, 'load_seconds': load_time,
+              'lookup_seconds': timed_lookups(loaded, lookup_codes(builds)), 'bodies': loaded.body_count()}
+    loaded.close()
+    # Closing the last connection checkpoints the write-ahead log into the database file
+    result['size'] = sum(os.path.getsize(p) for p in (path, f'{path}-wal') if os.path.exists(p))
+    conn = sqlite3.connect(path)
+    conn.execute('VACUUM')
+    conn.close()
+    result['vacuumed_size'] = os.path.getsize(path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--builds', type=int, default=100000, help='number of saved builds')
+    parser.add_argument('--duplicates', type=float, default=0.2, help='fraction of builds that repeat another')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    builds = synthetic_builds(args.builds, args.duplicates)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        results['legacy'] = bench_legacy(builds, directory)
+        legacy_path = results['legacy'].pop('path')
+        results[ENCODING_JSON] = bench_store(builds, directory, ENCODING_JSON)
+        results[ENCODING_COMPACT] = bench_store(builds, directory, ENCODING_COMPACT)
+        results['sqlite'] = bench_sqlite(builds, directory, legacy_path)
+
+    if args.json:
+        print(json.dumps({'builds': args.builds, 'duplicates': args.duplicates, 'results': results}, indent=2))
+        return
+
+    baseline = results['legacy']['size']
+    print(f"{args.builds} builds, {args.duplicates:.0%} duplicates")
+    print(f"{'encoding':<10}{'size':>14}{'ratio':>8}{'save':>10}{'load':>10}{'lookup':>12}{'bodies':>9}")
+    for name, result in results.items():
+        lookup = f"{result['lookup_seconds'] * 1e6:>9.1f} us" if result['lookup_seconds'] is not None else f"{'-':>12}"
+        print(f"{name:<10}{result['size'] / 1024 / 1024:>11.1f} MB{result['size'] / baseline:>8.2f}"
+              f"{result['save_seconds']:>9.2f}s{result['load_seconds']:>9.2f}s{lookup}{result.get('bodies', '-'):>9}")
+    vacuumed = results['sqlite']['vacuumed_size']
+    print(f"{'vacuumed':<10}{vacuumed / 1024 / 1024:>11.1f} MB{vacuumed / baseline:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,44 @@ import json
 import os
 from dotenv import load_dotenv
 import asyncio
+import time
 from datetime import datetime
 
+from build_executor import ROUTE_DELETE_CHANNEL, ROUTE_DELETE_ROLE, ROUTE_EDIT_ROLE_POSITIONS, RouteScheduler, execute_build
+from build_plans import PlanCache, compile_plan
+from build_store import BUILD_FORMAT_VERSION, JsonBuildStore, open_build_store
+from checkpoints import (
+    PHASE_BUILD,
+    PHASE_CLEANUP,
+    PHASE_RENAME,
+    PHASE_SYNC,
+    CheckpointStore,
+)
+from cleanup import execute_cleanup, plan_cleanup, plan_from_ids
+from command_sync import CommandSyncState
+from estimator import ROUTE_EDIT_GUILD, ThroughputModel, estimate_rebuild, estimate_sync, format_duration
+from guild_settings import DEFAULT_SETTINGS_PATH, GuildSettingsStore
+from jobs import BuildJob, BuildJobScheduler
+from memory_report import discord_cache_report, format_bytes, process_rss
+from memory_report import estimate as estimate_memory
+from metrics import (
+    BUILD_PHASE_SECONDS,
+    COMMAND_SECONDS,
+    STORE_OPERATION_SECONDS,
+    Gauge,
+    MetricsCommandTree,
+    MetricsServer,
+    api_trace_config,
+    record_app_command,
+    timed_autocomplete,
+)
+from progress import ProgressReporter
+from reconcile import apply_sync, diff_structure
+from render_cache import EmbedCache
+from sharding import cluster_id, format_shard_ids, shard_config_from_env
+from template_registry import TemplateRegistry
+import tracing
+
 # Load environment variables
 load_dotenv()
 
@@ -15,6 +51,15 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
 
+# Low-memory mode: no message cache, no member cache and no member chunking.
+# The commands never read message history and only need members they are handed.
+LOW_MEMORY = os.getenv('LOW_MEMORY', '').lower() in ('1', 'true', 'yes')
+CACHE_OPTIONS = {
+    'max_messages': None,
+    'member_cache_flags': discord.MemberCacheFlags.none(),
+    'chunk_guilds_at_startup': False
+} if LOW_MEMORY else {}
+
 # Bot owner information
 BOT_OWNER_ID = 1179595808585285704
 BOT_OWNER_NAME = "Server Builder Pro"
@@ -38,6 +83,8 @@ LANGUAGES = {
         'channels': '💬 Channels',
         'roles': '🛡️ Roles',
         'cleaned': '🧹 Cleaned',
+        'eta': '⏱️ Estimated Time',
+        'eta_value': '`~{duration}` • `{requests}` API requests',
         'server_renamed': '🏷️ Server Renamed',
         'support_bot': '⭐ Support BuilderBot!',
         'support_desc': '**Enjoying the bot? Please vote for us on Top.gg!**\n[Vote Now]({vote_url}) • [Leave Review]({review_url})',
@@ -109,13 +156,19 @@ LANGUAGES = {
         'saved_builds_section': '💾 Saved Builds',
         'saved_builds_usage': 'Use `!build <code>` with a saved build code\n**Available saved builds:** `{count}`',
         'usage_examples': '📋 Usage Examples',
-        'usage_examples_desc': '`!build community` - Use community template\n`!build ABC12345` - Use saved build code',
+        'usage_examples_desc': '`!build community` - Use community template\n`!build ABC12345` - Use saved build code\n`!build community sync` - Only apply what changed, keeping existing channels',
         'template_not_found': '❌ Template Not Found',
         'template_not_found_desc': '**Template `{template}` not found!**\nUse `!build` to see available templates and build codes.',
         'deploying_structure': '🚀 Deploying Server Structure',
         'source_template': '**Source:** `{source}`\n**Name:** `{name}`\n**Status:** Initializing deployment...',
         'server_cleanup': '🧹 Server Cleanup',
         'phase_1': '**Phase 1:** Removing existing structure\n**Status:** Cleaning channels, categories, and roles...',
+        'server_sync': '🔁 Server Sync',
+        'phase_sync': '**Phase 1:** Comparing server with the target structure\n**Status:** Applying only the changes needed...',
+        'changes_applied': '🔁 Changes Applied',
+        'changes_applied_desc': '`{created} created, {updated} updated, {deleted} deleted`',
+        'build_queued': '⏳ Build Queued',
+        'build_queued_desc': '**Queue position:** `{position}`\n**Status:** Waiting for other builds to finish, yours will start automatically.',
         'phase_2': '**Phase 2:** Building structure\n**Current:** `{current}` ({progress})',
         'phase_3': '**Phase 3:** Finalizing deployment\n**Status:** All components created successfully!',
         'confirm_deletion': '⚠️ Confirm Deletion',
@@ -146,6 +199,8 @@ LANGUAGES = {
         'channels': '💬 القنوات',
         'roles': '🛡️ الأدوار',
         'cleaned': '🧹 تم التنظيف',
+        'eta': '⏱️ الوقت المقدر',
+        'eta_value': '`~{duration}` • `{requests}` طلب API',
         'server_renamed': '🏷️ تم إعادة تسمية الخادم',
         'support_bot': '⭐ ادعم BuilderBot!',
         'support_desc': '**هل تستمتع بالبوت؟ يرجى التصويت لنا على Top.gg!**\n[صوت الآن]({vote_url}) • [اترك مراجعة]({review_url})',
@@ -217,13 +272,19 @@ LANGUAGES = {
         'saved_builds_section': '💾 البنيات المحفوظة',
         'saved_builds_usage': 'استخدم `!build <code>` مع رمز بناء محفوظ\n**البنيات المحفوظة المتاحة:** `{count}`',
         'usage_examples': '📋 أمثلة الاستخدام',
-        'usage_examples_desc': '`!build community` - استخدم قالب المجتمع\n`!build ABC12345` - استخدم رمز بناء محفوظ',
+        'usage_examples_desc': '`!build community` - استخدم قالب المجتمع\n`!build ABC12345` - استخدم رمز بناء محفوظ\n`!build community sync` - طبّق التغييرات فقط مع الإبقاء على القنوات الحالية',
         'template_not_found': '❌ القالب غير موجود',
         'template_not_found_desc': '**القالب `{template}` غير موجود!**\nاستخدم `!build` لرؤية القوالب ورموز البناء المتاحة.',
         'deploying_structure': '🚀 نشر هيكل الخادم',
         'source_template': '**المصدر:** `{source}`\n**الاسم:** `{name}`\n**الحالة:** تهيئة النشر...',
         'server_cleanup': '🧹 تنظيف الخادم',
         'phase_1': '**المرحلة 1:** إزالة الهيكل الموجود\n**الحالة:** تنظيف القنوات والفئات والأدوار...',
+        'server_sync': '🔁 مزامنة الخادم',
+        'phase_sync': '**المرحلة 1:** مقارنة الخادم بالهيكل المطلوب\n**الحالة:** تطبيق التغييرات اللازمة فقط...',
+        'changes_applied': '🔁 التغييرات المطبقة',
+        'changes_applied_desc': '`{created} إنشاء، {updated} تحديث، {deleted} حذف`',
+        'build_queued': '⏳ البناء في قائمة الانتظار',
+        'build_queued_desc': '**الترتيب في القائمة:** `{position}`\n**الحالة:** في انتظار انتهاء عمليات البناء الأخرى، سيبدأ بناؤك تلقائيًا.',
         'phase_2': '**المرحلة 2:** بناء الهيكل\n**الحالي:** `{current}` ({progress})',
         'phase_3': '**المرحلة 3:** إنهاء النشر\n**الحالة:** تم إنشاء جميع المكونات بنجاح!',
         'confirm_deletion': '⚠️ تأكيد الحذف',
@@ -246,8 +307,8 @@ LANGUAGES = {
 # Default language
 DEFAULT_LANGUAGE = 'en'
 
-# Server language storage (in-memory for now, can be extended to database)
-SERVER_LANGUAGES = {}
+# Per-server settings (language, ...), cached in memory and persisted write-behind
+GUILD_SETTINGS = GuildSettingsStore(os.getenv('GUILD_SETTINGS_PATH', DEFAULT_SETTINGS_PATH))
 
 def get_message(key, language=DEFAULT_LANGUAGE, **kwargs):
     """Get localized message with optional formatting"""
@@ -255,18 +316,105 @@ def get_message(key, language=DEFAULT_LANGUAGE, **kwargs):
     message = lang.get(key, LANGUAGES[DEFAULT_LANGUAGE].get(key, key))
     return message.format(**kwargs) if kwargs else message
 
-def get_server_language(guild_id):
+async def get_server_language(guild_id):
     """Get the language setting for a server"""
-    return SERVER_LANGUAGES.get(str(guild_id), DEFAULT_LANGUAGE)
+    language = await GUILD_SETTINGS.get(guild_id, 'language', DEFAULT_LANGUAGE)
+    return language if language in LANGUAGES else DEFAULT_LANGUAGE
 
-def set_server_language(guild_id, language):
+async def set_server_language(guild_id, language):
     """Set the language for a server"""
     if language in LANGUAGES:
-        SERVER_LANGUAGES[str(guild_id)] = language
+        await GUILD_SETTINGS.set(guild_id, 'language', language)
         return True
     return False
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Sharding is opt-in via SHARDING/SHARD_COUNT/SHARD_IDS (cluster.py sets them per worker)
+SHARD_CONFIG = shard_config_from_env()
+CLUSTER_ID = cluster_id()
+
+# Prometheus metrics are always recorded; METRICS_PORT exposes them on /metrics
+METRICS_PORT = os.getenv('METRICS_PORT')
+METRICS_SERVER = MetricsServer(int(METRICS_PORT), host=os.getenv('METRICS_HOST', '127.0.0.1')) if METRICS_PORT else None
+
+class BuilderBot(commands.AutoShardedBot if SHARD_CONFIG is not None else commands.Bot):
+    """Bot with startup and shutdown hooks for background services"""
+    
+    async def setup_hook(self):
+        # Start write-behind persistence now that the event loop is running
+        BUILD_STORE.start()
+        CHECKPOINTS.start()
+        GUILD_SETTINGS.start()
+        TRACE_LOG.start()
+        # Pick up edits to templates.json without a restart
+        TEMPLATES.start()
+        if METRICS_SERVER is not None:
+            try:
+                await METRICS_SERVER.start()
+            except OSError as e:
+                print(f"❌ Error starting metrics server on port {METRICS_PORT}: {e}")
+        
+        # Sync slash commands only when they changed (from the first worker only when clustered)
+        if not CLUSTER_ID:
+            try:
+                synced = await sync_slash_commands()
+                if synced is None:
+                    print("✅ Slash commands unchanged, skipping sync")
+                else:
+                    print(f"✅ Successfully synced {len(synced)} slash commands!")
+            except Exception as e:
+                print(f"❌ Error syncing slash commands: {e}")
+                print("💡 Make sure your bot has 'applications.commands' scope enabled!")
+    
+    async def invoke(self, ctx):
+        # Record prefix command latency; unknown commands aren't timed
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        started = time.perf_counter()
+        try:
+            await super().invoke(ctx)
+        finally:
+            COMMAND_SECONDS.observe(
+                time.perf_counter() - started,
+                command=ctx.command.qualified_name,
+                kind='prefix',
+                outcome='error' if ctx.command_failed else 'ok'
+            )
+    
+    async def on_app_command_completion(self, interaction, command):
+        # Failed slash commands are recorded by MetricsCommandTree.on_error
+        record_app_command(interaction, 'ok')
+    
+    async def close(self):
+        await TEMPLATES.stop()
+        if METRICS_SERVER is not None:
+            await METRICS_SERVER.stop()
+        # Flush pending saved-build writes and build checkpoints before disconnecting
+        try:
+            await BUILD_STORE.shutdown()
+        except Exception as e:
+            print(f"Error flushing build store on shutdown: {e}")
+        try:
+            await CHECKPOINTS.shutdown()
+        except Exception as e:
+            print(f"Error flushing build checkpoints on shutdown: {e}")
+        try:
+            await GUILD_SETTINGS.shutdown()
+        except Exception as e:
+            print(f"Error flushing guild settings on shutdown: {e}")
+        try:
+            await TRACE_LOG.shutdown()
+        except Exception as e:
+            print(f"Error flushing build traces on shutdown: {e}")
+        await super().close()
+
+bot = BuilderBot(
+    command_prefix='!',
+    intents=intents,
+    tree_cls=MetricsCommandTree,
+    http_trace=tracing.add_http_callbacks(api_trace_config()),
+    **CACHE_OPTIONS,
+    **(SHARD_CONFIG or {})
+)
 
 # Remove default help command to avoid conflicts
 bot.remove_command('help')
@@ -275,92 +423,162 @@ bot.remove_command('help')
 # No need to create a new one as it causes ClientException
 # The bot.tree is already available for registering slash commands
 
-# Load templates
-def load_templates():
-    """Load server templates from JSON file"""
-    try:
-        with open('templates.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print("Error: templates.json not found!")
-        return {}
-    except json.JSONDecodeError:
-        print("Error: Invalid JSON in templates.json!")
-        return {}
-
-# Store templates globally
-TEMPLATES = load_templates()
-
-# Build storage system - JSON file storage
-SAVED_BUILDS_FILE = 'saved_builds.json'
-
-def load_saved_builds():
-    """Load saved builds from JSON file"""
-    try:
-        with open(SAVED_BUILDS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except json.JSONDecodeError:
-        print("Error: Invalid JSON in saved_builds.json!")
-        return {}
-
-def save_builds_to_file():
-    """Save builds to JSON file"""
-    try:
-        with open(SAVED_BUILDS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(SAVED_BUILDS, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving builds to file: {e}")
+# Store templates globally; the registry validates templates.json and reloads it when it changes
+TEMPLATES = TemplateRegistry(
+    os.getenv('TEMPLATES_PATH', 'templates.json'),
+    poll_interval=float(os.getenv('TEMPLATE_POLL_INTERVAL', '5'))
+)
+
+# Rendered option-embed field and slash choice per template
+TEMPLATE_DISPLAY = {}
+
+# Hash of the last synced slash command tree, so restarts don't resync unchanged commands
+COMMAND_SYNC = CommandSyncState(os.getenv('COMMAND_SYNC_PATH', 'command_sync.json'))
+
+# Staging: sync commands to this guild only (updates instantly) instead of globally
+SYNC_GUILD_ID = os.getenv('SYNC_GUILD_ID')
+
+async def sync_slash_commands(guild=None, force=False):
+    """Sync slash commands if the command tree changed; returns the synced commands or None"""
+    if guild is None and SYNC_GUILD_ID:
+        guild = discord.Object(id=int(SYNC_GUILD_ID))
+    if guild is not None:
+        bot.tree.copy_global_to(guild=guild)
+    return await COMMAND_SYNC.sync(bot.tree, guild=guild, force=force)
+
+# Shared scheduler so concurrent builds respect the same global and per-route limits
+BUILD_SCHEDULER = RouteScheduler()
+
+# Per-route throughput learned from finished builds, for ETAs
+THROUGHPUT = ThroughputModel()
+
+# Compiled build plans for templates and saved builds, reused across builds
+PLAN_CACHE = PlanCache()
+
+# Rendered help and build option embeds per (command, language, templates version);
+# call RENDER_CACHE.invalidate() after changing LANGUAGES at runtime
+RENDER_CACHE = EmbedCache()
+
+def on_templates_changed(changed):
+    """Drop derived data for templates whose content changed"""
+    for template_name in changed:
+        PLAN_CACHE.invalidate(f'template:{template_name}')
+        TEMPLATE_DISPLAY.pop(template_name, None)
+    if changed:
+        RENDER_CACHE.invalidate()
+
+TEMPLATES.add_listener(on_templates_changed)
 
-# Load existing saved builds
-SAVED_BUILDS = load_saved_builds()
+# Build job queue: one job per guild, a global cap on concurrent builds
+BUILD_JOBS = BuildJobScheduler(max_concurrent=int(os.getenv('MAX_CONCURRENT_BUILDS', '3')))
 
-def generate_build_code():
+# Checkpoints of running deployments so they can resume after a restart
+CHECKPOINTS = CheckpointStore(os.getenv('CHECKPOINT_PATH', 'build_checkpoints.json'))
+BUILDS_RESUMED = False
+
+# Recent build traces (phase and API call timelines) for !traces
+TRACE_LOG = tracing.TraceLog(
+    os.getenv('TRACE_PATH', 'build_traces.jsonl'),
+    max_bytes=int(os.getenv('TRACE_MAX_BYTES', str(5 * 1024 * 1024))),
+    backups=int(os.getenv('TRACE_BACKUPS', '3'))
+)
+
+# Minimum seconds between progress message edits during a build
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', '2.0'))
+
+# Build storage system - SQLite by default, set BUILD_STORE_BACKEND=json for the legacy file
+BUILD_STORE = open_build_store(
+    os.getenv('BUILD_STORE_BACKEND', 'sqlite'),
+    path=os.getenv('BUILD_STORE_PATH'),
+    encoding=os.getenv('BUILD_STORE_ENCODING', 'json')
+)
+
+# Gauges are read when /metrics is scraped
+Gauge('builderbot_guilds', 'Guilds this process is connected to', collect=lambda: len(bot.guilds))
+Gauge(
+    'builderbot_gateway_latency_seconds', 'Gateway heartbeat latency per shard', ('shard',),
+    collect=lambda: dict(((shard_id,), latency) for shard_id, latency in getattr(bot, 'latencies', [(0, bot.latency)]))
+)
+Gauge(
+    'builderbot_build_jobs', 'Build jobs by state', ('state',),
+    collect=lambda: {('active',): BUILD_JOBS.active_count, ('queued',): BUILD_JOBS.queued_count}
+)
+Gauge(
+    'builderbot_store_pending_writes', 'Mutations not yet persisted, by store', ('store',),
+    collect=lambda: {
+        ('saved builds',): BUILD_STORE.persistence_lag()[0],
+        ('build checkpoints',): CHECKPOINTS.writer.lag()[0],
+        ('guild settings',): GUILD_SETTINGS.persistence_lag()[0],
+    }
+)
+
+async def run_store(operation, method, *args):
+    """Call the build store, in a worker thread when the backend waits on disk"""
+    with STORE_OPERATION_SECONDS.time(operation=operation):
+        if BUILD_STORE.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+async def generate_build_code():
     """Generate a unique 8-character build code"""
     import random
     import string
     while True:
         code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
         # Check if code exists in any user's builds
-        exists = any(code in user_builds for user_builds in SAVED_BUILDS.values())
-        if not exists:
+        if not await run_store('code_exists', BUILD_STORE.code_exists, code):
             return code
 
-def save_user_build(user_id, build_code, build_data):
+async def save_user_build(user_id, build_code, build_data):
     """Save a build for a specific user"""
-    user_id_str = str(user_id)
-    if user_id_str not in SAVED_BUILDS:
-        SAVED_BUILDS[user_id_str] = {}
-    
-    SAVED_BUILDS[user_id_str][build_code] = build_data
-    save_builds_to_file()
+    await run_store('save', BUILD_STORE.save, user_id, build_code, build_data)
 
-def get_user_builds(user_id):
+async def get_user_builds(user_id):
     """Get all builds for a specific user"""
-    user_id_str = str(user_id)
-    return SAVED_BUILDS.get(user_id_str, {})
+    return await run_store('get_user_builds', BUILD_STORE.get_user_builds, user_id)
 
-def get_build_by_code(build_code):
+async def get_build_by_code(build_code):
     """Get a build by code from any user"""
-    for user_builds in SAVED_BUILDS.values():
-        if build_code in user_builds:
-            return user_builds[build_code]
-    return None
+    return await run_store('get_by_code', BUILD_STORE.get_by_code, build_code)
+
+async def get_build_owner(build_code):
+    """Get the id of the user who owns a build code"""
+    return await run_store('get_owner', BUILD_STORE.get_owner, build_code)
 
-def remove_user_build(user_id, build_code):
+async def remove_user_build(user_id, build_code):
     """Remove a build for a specific user"""
-    user_id_str = str(user_id)
-    if user_id_str in SAVED_BUILDS and build_code in SAVED_BUILDS[user_id_str]:
-        build_data = SAVED_BUILDS[user_id_str][build_code]
-        del SAVED_BUILDS[user_id_str][build_code]
-        save_builds_to_file()
-        return build_data
-    return None
-
-def save_server_structure(guild):
-    """Save the complete server structure"""
+    PLAN_CACHE.invalidate(f'code:{build_code}')
+    return await run_store('remove', BUILD_STORE.remove, user_id, build_code)
+
+def get_template_plan(template_name):
+    """Get the compiled build plan for a template, or None if it doesn't exist"""
+    return PLAN_CACHE.get(f'template:{template_name}', lambda: TEMPLATES.get(template_name))
+
+def get_template_display(template_name, template_data):
+    """Get the cached (option embed field value, slash choice) for a template"""
+    display = TEMPLATE_DISPLAY.get(template_name)
+    if display is None:
+        display = TEMPLATE_DISPLAY[template_name] = (
+            f"**{template_data['server_name']}**\n`{len(template_data['categories'])}` categories • `{len(template_data['roles'])}` roles",
+            app_commands.Choice(name=template_data['server_name'][:100], value=template_name)
+        )
+    return display
+
+async def get_build_plan(build_code, build_data=None):
+    """Get the compiled build plan for a saved build code, or None if it doesn't exist"""
+    key = f'code:{build_code}'
+    if build_data is None and key not in PLAN_CACHE:
+        build_data = await get_build_by_code(build_code)
+    return PLAN_CACHE.get(key, lambda: build_data)
+
+def save_server_structure(guild, include_ids=False):
+    """Save the complete server structure
+    
+    With ``include_ids`` every category, channel and role also records its
+    Discord id, which is what the sync mode diffs against.
+    """
     build_data = {
+        'format': BUILD_FORMAT_VERSION,
         'server_name': guild.name,
         'categories': [],
         'roles': []
@@ -372,6 +590,8 @@ def save_server_structure(guild):
             'name': category.name,
             'channels': []
         }
+        if include_ids:
+            category_data['id'] = category.id
         
         # Save channels in this category
         for channel in category.channels:
@@ -383,6 +603,9 @@ def save_server_structure(guild):
             # Add topic for text channels
             if isinstance(channel, discord.TextChannel) and channel.topic:
                 channel_data['topic'] = channel.topic
+            
+            if include_ids:
+                channel_data['id'] = channel.id
                 
             category_data['channels'].append(channel_data)
             
@@ -391,20 +614,310 @@ def save_server_structure(guild):
     # Save roles (excluding @everyone and bot roles)
     for role in guild.roles:
         if role.name != "@everyone" and role != guild.me.top_role:
+            # Permissions are stored as the compact integer bitmask; the
+            # position lets a rebuild restore the hierarchy in one request
             role_data = {
                 'name': role.name,
-                'permissions': []
+                'permissions': role.permissions.value,
+                'position': role.position
             }
+            if include_ids:
+                role_data['id'] = role.id
+                role_data['protected'] = role.managed or role >= guild.me.top_role
             
-            # Convert permissions to strings
-            for perm, value in role.permissions:
-                if value:
-                    role_data['permissions'].append(perm)
-                    
             build_data['roles'].append(role_data)
     
     return build_data
 
+async def sync_structure(guild, template, keep_channel=None):
+    """Apply only the changes needed to turn the guild into the template"""
+    live = save_server_structure(guild, include_ids=True)
+    ops = diff_structure(live, template)
+    return await apply_sync(
+        guild,
+        ops,
+        BUILD_SCHEDULER,
+        reason=f"Server structure synced by {bot.user.name}",
+        keep_channel=keep_channel
+    )
+
+def estimate_deployment(guild, plan, keep_channel=None, sync_mode=False):
+    """Estimate the requests and duration of deploying ``plan`` into the guild as it is now"""
+    template = plan.template
+    rename = bool(template.get('server_name')) and guild.name != template['server_name']
+    if sync_mode:
+        ops = diff_structure(save_server_structure(guild, include_ids=True), template)
+        return estimate_sync(ops, rename, THROUGHPUT)
+    return estimate_rebuild(plan_cleanup(guild, keep_channel=keep_channel), plan, rename, THROUGHPUT)
+
+# ==================== BUILD JOBS ====================
+
+def deploy_embed(title, description, lang=DEFAULT_LANGUAGE, counts=None, color=0x00ff00, estimate=None):
+    """Create a deployment status embed with optional category/channel/role counts and ETA"""
+    embed = discord.Embed(
+        title=title,
+        description=description,
+        color=color,
+        timestamp=datetime.utcnow()
+    )
+    if counts is not None:
+        categories, channels, roles = counts
+        embed.add_field(name=get_message('categories', lang), value=f"`{categories}`", inline=True)
+        embed.add_field(name=get_message('channels', lang), value=f"`{channels}`", inline=True)
+        embed.add_field(name=get_message('roles', lang), value=f"`{roles}`", inline=True)
+    if estimate is not None:
+        embed.add_field(
+            name=get_message('eta', lang),
+            value=get_message('eta_value', lang, duration=format_duration(estimate.remaining()), requests=estimate.total_requests),
+            inline=False
+        )
+    embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
+    return embed
+
+def queued_embed(lang, position):
+    """Create the embed shown while a job waits in the build queue"""
+    return deploy_embed(
+        get_message('build_queued', lang),
+        get_message('build_queued_desc', lang, position=position),
+        lang,
+        color=0xffaa00
+    )
+
+def progress_renderer(lang, total_categories, estimate=None):
+    """Create the render function used by a deployment's ProgressReporter"""
+    def render(phase, state):
+        if phase == PHASE_SYNC:
+            return deploy_embed(get_message('server_sync', lang), get_message('phase_sync', lang), lang, estimate=estimate)
+        if phase == PHASE_CLEANUP:
+            return deploy_embed(get_message('server_cleanup', lang), get_message('phase_1', lang), lang, estimate=estimate)
+        return deploy_embed(
+            get_message('deploying_structure', lang),
+            get_message('phase_2', lang, current=state.get('current', '-'), progress=f"{state.get('categories', 0)}/{total_categories}"),
+            lang,
+            counts=(state.get('categories', 0), state.get('channels', 0), state.get('roles', 0)),
+            estimate=estimate
+        )
+    return render
+
+async def deploy_structure(guild, plan, lang, message, keep_channel=None, sync_mode=False, checkpoint=None):
+    """Deploy a compiled build plan into a guild, reporting progress on ``message``
+    
+    Every completed step is checkpointed; pass an unfinished ``checkpoint``
+    to resume a deployment from where it was interrupted.
+    """
+    template = plan.template
+    total_categories = plan.category_count
+    
+    resuming = checkpoint is not None
+    if not resuming:
+        checkpoint = CHECKPOINTS.begin(
+            guild.id,
+            template,
+            'sync' if sync_mode else 'rebuild',
+            lang,
+            channel_id=message.channel.id,
+            message_id=message.id,
+            keep_channel_id=keep_channel.id if keep_channel else None
+        )
+    
+    # Re-estimated now that the job is running; resumed builds have no meaningful estimate
+    estimate = None if resuming else estimate_deployment(guild, plan, keep_channel=keep_channel, sync_mode=sync_mode)
+    if estimate is not None:
+        estimate.start()
+    
+    # Progress edits are coalesced so they don't compete with the build for rate limits
+    progress = ProgressReporter(message, progress_renderer(lang, total_categories, estimate), interval=PROGRESS_INTERVAL)
+    
+    try:
+        if checkpoint['phase'] == PHASE_RENAME:
+            # Rename server if template has a name
+            if template.get('server_name') and guild.name != template['server_name']:
+                with BUILD_PHASE_SECONDS.time(phase='rename'), tracing.span('rename'):
+                    await guild.edit(name=template['server_name'])
+                if estimate is not None:
+                    estimate.complete(ROUTE_EDIT_GUILD)
+            CHECKPOINTS.set_phase(guild.id, PHASE_SYNC if sync_mode else PHASE_CLEANUP)
+        
+        if sync_mode:
+            progress.update(PHASE_SYNC)
+            
+            # Sync is idempotent, so resuming simply diffs again
+            with tracing.span('sync'):
+                sync_result = await sync_structure(guild, template, keep_channel=keep_channel)
+            
+            counts = plan.counts
+            summary_name = get_message('changes_applied', lang)
+            summary_value = get_message('changes_applied_desc', lang, created=sync_result.created_count, updated=sync_result.updated_count, deleted=sync_result.deleted_count)
+        else:
+            if checkpoint['phase'] == PHASE_CLEANUP:
+                # Delete all existing channels and categories first
+                progress.update(PHASE_CLEANUP)
+                
+                if checkpoint['cleanup'] is None:
+                    # Delete all channels, categories and roles except the command channel
+                    cleanup_plan = plan_cleanup(guild, keep_channel=keep_channel)
+                    CHECKPOINTS.set_cleanup_plan(guild.id, cleanup_plan)
+                else:
+                    recorded = checkpoint['cleanup']
+                    cleanup_plan = plan_from_ids(guild, recorded['channels'], recorded['categories'], recorded['roles'])
+                
+                def on_deleted(item):
+                    CHECKPOINTS.mark_deleted(guild.id, item)
+                    if estimate is not None:
+                        estimate.complete(ROUTE_DELETE_ROLE if item['kind'] == 'role' else ROUTE_DELETE_CHANNEL)
+                        # Coalesced like build progress; keeps the ETA moving during cleanup
+                        progress.update(PHASE_CLEANUP)
+                
+                with tracing.span('cleanup', items=cleanup_plan.total):
+                    await execute_cleanup(
+                        cleanup_plan,
+                        BUILD_SCHEDULER,
+                        reason=f"Cleanup before building {template['server_name']}",
+                        on_deleted=on_deleted
+                    )
+                CHECKPOINTS.set_phase(guild.id, PHASE_BUILD)
+            
+            # Objects created before an interruption are reused, not recreated
+            done = {}
+            for key, object_id in checkpoint['created'].items():
+                obj = guild.get_role(object_id) if key.startswith('role:') else guild.get_channel(object_id)
+                if obj is not None:
+                    done[key] = obj
+            
+            # Create roles, categories and channels concurrently
+            async def report_progress(result, op):
+                if estimate is not None:
+                    estimate.complete(op.route)
+                created = result.created.get(op.key)
+                if created is not None:
+                    CHECKPOINTS.mark_created(guild.id, op.key, created.id)
+                    if op.kind == 'category':
+                        progress.update(PHASE_BUILD, current=op.data['name'])
+                progress.update(
+                    PHASE_BUILD,
+                    categories=len(result.categories),
+                    channels=len(result.channels),
+                    roles=len(result.roles)
+                )
+            
+            # The bulk role position update is one estimated request of its own
+            async def report_roles_ordered(result):
+                if estimate is not None:
+                    estimate.complete(ROUTE_EDIT_ROLE_POSITIONS)
+                    progress.update(PHASE_BUILD)
+            
+            with tracing.span('build', operations=len(plan.ops) - len(done)):
+                result = await execute_build(
+                    guild,
+                    plan.ops,
+                    BUILD_SCHEDULER,
+                    reason=f"Server structure created by {bot.user.name}",
+                    on_progress=report_progress,
+                    done=done,
+                    adopt=resuming,
+                    on_roles_ordered=report_roles_ordered,
+                    keep_channel=keep_channel
+                )
+            
+            counts = (len(result.categories), len(result.channels), len(result.roles))
+            
+            role_ids = set((checkpoint['cleanup'] or {}).get('roles', []))
+            deleted_roles = sum(1 for object_id in checkpoint['deleted'] if object_id in role_ids)
+            deleted_count = len(checkpoint['deleted']) - deleted_roles
+            summary_name = get_message('cleaned', lang)
+            summary_value = f"`{deleted_count} channels, {deleted_roles} roles`"
+        
+        # Update success message
+        success_embed = deploy_embed(
+            get_message('build_success', lang),
+            get_message('build_success_desc', lang, server_name=template['server_name']),
+            lang,
+            counts=counts
+        )
+        success_embed.add_field(name=summary_name, value=summary_value, inline=True)
+        
+        if template.get('server_name'):
+            success_embed.add_field(name=get_message('server_renamed', lang), value=f"`{template['server_name']}`", inline=False)
+        
+        # Add Top.gg voting prompt
+        success_embed.add_field(
+            name=get_message('support_bot', lang),
+            value=get_message('support_desc', lang, vote_url=TOPGG_VOTE_URL, review_url=TOPGG_REVIEW_URL),
+            inline=False
+        )
+        
+        CHECKPOINTS.finish(guild.id)
+        if estimate is not None:
+            THROUGHPUT.learn(estimate)
+            tracing.set_attributes(estimated_seconds=round(estimate.seconds, 1))
+        tracing.set_attributes(outcome='ok', counts=list(counts))
+        await progress.finish(success_embed)
+        
+    except Exception as e:
+        # A failed deployment is not resumed; only interruptions (shutdown, crash) keep the checkpoint
+        CHECKPOINTS.finish(guild.id)
+        tracing.set_attributes(outcome='failed', error=str(e))
+        await progress.finish(deploy_embed(
+            get_message('deployment_failed', lang),
+            get_message('deployment_failed_desc', lang, error=str(e)),
+            lang,
+            color=0xff0000
+        ))
+
+def submit_build(guild, plan, build_type, lang, message, keep_channel=None, sync_mode=False, checkpoint=None):
+    """Queue a deployment for a guild; progress and queue position are shown on ``message``"""
+    async def run(job):
+        # One trace per deployment, from the job leaving the queue to the final message
+        with tracing.trace(
+            'build',
+            TRACE_LOG,
+            guild_id=guild.id,
+            plan=plan.key,
+            server_name=plan.server_name,
+            mode='sync' if sync_mode else 'rebuild',
+            resumed=checkpoint is not None,
+            queued=round(time.time() - job.submitted_at, 3)
+        ):
+            await deploy_structure(guild, plan, lang, message, keep_channel=keep_channel, sync_mode=sync_mode, checkpoint=checkpoint)
+    
+    async def show_position(job, position):
+        await message.edit(embed=queued_embed(lang, position))
+    
+    return BUILD_JOBS.submit(BuildJob(guild.id, build_type, run, on_queued=show_position))
+
+def resume_unfinished_builds():
+    """Resubmit deployments that were interrupted by a restart"""
+    for checkpoint in CHECKPOINTS.pending():
+        guild = bot.get_guild(checkpoint['guild_id'])
+        channel = guild.get_channel(checkpoint['channel_id']) if guild else None
+        if channel is None:
+            # The bot left the guild or the progress channel is gone
+            CHECKPOINTS.finish(checkpoint['guild_id'])
+            continue
+        
+        keep_channel = guild.get_channel(checkpoint['keep_channel_id']) if checkpoint['keep_channel_id'] else None
+        print(f"♻️ Resuming interrupted build in {guild.name} from phase '{checkpoint['phase']}'")
+        submit_build(
+            guild,
+            compile_plan(checkpoint['template']),
+            "resumed build",
+            checkpoint['lang'],
+            channel.get_partial_message(checkpoint['message_id']),
+            keep_channel=keep_channel,
+            sync_mode=checkpoint['mode'] == 'sync',
+            checkpoint=checkpoint
+        )
+
+@bot.event
+async def on_guild_available(guild):
+    """Warm the settings cache as guilds come in, instead of loading every guild up front"""
+    GUILD_SETTINGS.prefetch_soon(guild.id)
+
+@bot.event
+async def on_guild_join(guild):
+    """Warm the settings cache for a guild that added the bot after startup"""
+    GUILD_SETTINGS.prefetch_soon(guild.id)
+
 @bot.event
 async def on_ready():
     """Called when the bot is ready"""
@@ -414,17 +927,11 @@ async def on_ready():
     print(f'👑 Bot Owner: <@{BOT_OWNER_ID}>')
     print('✅ Bot is ready!')
     
-    # Sync slash commands globally
-    try:
-        print("🔄 Syncing slash commands with Discord...")
-        synced = await bot.tree.sync()
-        print(f"✅ Successfully synced {len(synced)} slash commands globally!")
-        print("📋 Available slash commands:")
-        for cmd in synced:
-            print(f"   /{cmd.name} - {cmd.description}")
-    except Exception as e:
-        print(f"❌ Error syncing slash commands: {e}")
-        print("💡 Make sure your bot has 'applications.commands' scope enabled!")
+    # Resume builds interrupted by a restart (on_ready also fires on reconnects)
+    global BUILDS_RESUMED
+    if not BUILDS_RESUMED:
+        BUILDS_RESUMED = True
+        resume_unfinished_builds()
     
     # Set modern bot status
     await bot.change_presence(
@@ -439,7 +946,7 @@ async def set_language(ctx, language: str = None):
     """Set the bot language for this server (Administrator only)"""
     # Check permissions - Administrator required
     if not ctx.author.guild_permissions.administrator:
-        lang = get_server_language(ctx.guild.id)
+        lang = await get_server_language(ctx.guild.id)
         embed = discord.Embed(
             title=get_message('permission_denied', lang),
             description=get_message('admin_required', lang),
@@ -452,8 +959,8 @@ async def set_language(ctx, language: str = None):
     
     if not language:
         # Show current language and available options
-        current_lang = get_server_language(ctx.guild.id)
-        lang = get_server_language(ctx.guild.id)
+        current_lang = await get_server_language(ctx.guild.id)
+        lang = await get_server_language(ctx.guild.id)
         
         embed = discord.Embed(
             title="🌐 Language Settings",
@@ -472,7 +979,7 @@ async def set_language(ctx, language: str = None):
     
     language = language.lower()
     if language not in LANGUAGES:
-        lang = get_server_language(ctx.guild.id)
+        lang = await get_server_language(ctx.guild.id)
         embed = discord.Embed(
             title="❌ Invalid Language",
             description=f"**Available languages:** `en` (English), `ar` (العربية)",
@@ -484,7 +991,7 @@ async def set_language(ctx, language: str = None):
         return
     
     # Set the language
-    set_server_language(ctx.guild.id, language)
+    await set_server_language(ctx.guild.id, language)
     
     # Get message in the new language
     embed = discord.Embed(
@@ -499,7 +1006,7 @@ async def set_language(ctx, language: str = None):
 @bot.command(name='ping')
 async def ping(ctx):
     """Check bot latency"""
-    lang = get_server_language(ctx.guild.id)
+    lang = await get_server_language(ctx.guild.id)
     latency = round(bot.latency * 1000)
     embed = discord.Embed(
         title=get_message('system_status', lang),
@@ -513,7 +1020,7 @@ async def ping(ctx):
 @bot.command(name='builds')
 async def list_saved_builds(ctx):
     """List all saved build codes (Administrator only)"""
-    lang = get_server_language(ctx.guild.id)
+    lang = await get_server_language(ctx.guild.id)
     
     # Check permissions - Administrator required
     if not ctx.author.guild_permissions.administrator:
@@ -528,7 +1035,7 @@ async def list_saved_builds(ctx):
         return
     
     # Get user's saved builds
-    user_builds = get_user_builds(ctx.author.id)
+    user_builds = await get_user_builds(ctx.author.id)
     
     if not user_builds:
         embed = discord.Embed(
@@ -550,9 +1057,7 @@ async def list_saved_builds(ctx):
     
     # List all saved builds with details
     for build_code, build_data in user_builds.items():
-        total_categories = len(build_data['categories'])
-        total_channels = sum(len(cat['channels']) for cat in build_data['categories'])
-        total_roles = len(build_data['roles'])
+        total_categories, total_channels, total_roles = (await get_build_plan(build_code, build_data)).counts
         
         embed.add_field(
             name=f"🔑 `{build_code}`",
@@ -572,7 +1077,7 @@ async def list_saved_builds(ctx):
 @bot.command(name='removebuild')
 async def remove_saved_build(ctx, build_code: str):
     """Remove a saved build code (Administrator only)"""
-    lang = get_server_language(ctx.guild.id)
+    lang = await get_server_language(ctx.guild.id)
     
     # Check permissions - Administrator required
     if not ctx.author.guild_permissions.administrator:
@@ -600,10 +1105,7 @@ async def remove_saved_build(ctx, build_code: str):
     # Convert to uppercase for consistency
     build_code = build_code.upper()
     
-    # Get user's builds
-    user_builds = get_user_builds(ctx.author.id)
-    
-    if build_code not in user_builds:
+    if await get_build_owner(build_code) != str(ctx.author.id):
         embed = discord.Embed(
             title=get_message('build_not_found', lang),
             description=get_message('build_not_found_desc', lang, code=build_code),
@@ -614,18 +1116,16 @@ async def remove_saved_build(ctx, build_code: str):
         await ctx.send(embed=embed)
         return
     
-    # Get build data before removing
-    build_data = user_builds[build_code]
+    # Get build data before removing; only this build is loaded, not all of the user's
+    build_data = await get_build_by_code(build_code)
     server_name = build_data['server_name']
-    total_categories = len(build_data['categories'])
-    total_channels = sum(len(cat['channels']) for cat in build_data['categories'])
-    total_roles = len(build_data['roles'])
+    total_categories, total_channels, total_roles = (await get_build_plan(build_code, build_data)).counts
     
     # Remove the build
-    remove_user_build(ctx.author.id, build_code)
+    await remove_user_build(ctx.author.id, build_code)
     
     # Get updated count
-    updated_user_builds = get_user_builds(ctx.author.id)
+    remaining_count = await run_store('count', BUILD_STORE.count, ctx.author.id)
     
     embed = discord.Embed(
         title=get_message('build_removed', lang),
@@ -635,7 +1135,7 @@ async def remove_saved_build(ctx, build_code: str):
     )
     embed.add_field(name="🔑 Removed Code", value=f"`{build_code}`", inline=True)
     embed.add_field(name="📊 Build Details", value=f"**{server_name}**\n📁 `{total_categories}` categories • 💬 `{total_channels}` channels • 🛡️ `{total_roles}` roles", inline=False)
-    embed.add_field(name=get_message('remaining_builds', lang), value=get_message('remaining_builds_desc', lang, count=len(updated_user_builds)), inline=True)
+    embed.add_field(name=get_message('remaining_builds', lang), value=get_message('remaining_builds_desc', lang, count=remaining_count), inline=True)
     
     embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
     await ctx.send(embed=embed)
@@ -643,7 +1143,7 @@ async def remove_saved_build(ctx, build_code: str):
 @bot.command(name='savebuild')
 async def save_build(ctx):
     """Save the current server structure with a unique code (Administrator only)"""
-    lang = get_server_language(ctx.guild.id)
+    lang = await get_server_language(ctx.guild.id)
     
     # Check permissions - Administrator required
     if not ctx.author.guild_permissions.administrator:
@@ -672,15 +1172,13 @@ async def save_build(ctx):
         build_data = save_server_structure(ctx.guild)
         
         # Generate unique code
-        build_code = generate_build_code()
+        build_code = await generate_build_code()
         
         # Store the build data for this user
-        save_user_build(ctx.author.id, build_code, build_data)
+        await save_user_build(ctx.author.id, build_code, build_data)
         
-        # Count components
-        total_categories = len(build_data['categories'])
-        total_channels = sum(len(cat['channels']) for cat in build_data['categories'])
-        total_roles = len(build_data['roles'])
+        # Compile the plan now so the first build of this code is already warm
+        total_categories, total_channels, total_roles = (await get_build_plan(build_code, build_data)).counts
         
         # Create success embed
         success_embed = discord.Embed(
@@ -723,18 +1221,23 @@ async def save_build(ctx):
         await message.edit(embed=error_embed)
 
 @bot.command(name='sync')
-async def sync_commands(ctx):
-    """Sync slash commands (Owner only)"""
+async def sync_commands(ctx, scope: str = None):
+    """Force a slash command sync (Owner only)
+    
+    ``!sync guild`` syncs to the current server only, for staging.
+    """
     if ctx.author.id != BOT_OWNER_ID:
         await ctx.send("❌ This command is only available to the bot owner!")
         return
     
     try:
         await ctx.send("🔄 Syncing slash commands...")
-        synced = await bot.tree.sync()
+        guild = ctx.guild if scope and scope.lower() == 'guild' else None
+        synced = await sync_slash_commands(guild=guild, force=True)
+        target = f"this server ({ctx.guild.name})" if guild else (f"staging guild `{SYNC_GUILD_ID}`" if SYNC_GUILD_ID else "Discord")
         embed = discord.Embed(
             title="✅ Commands Synced Successfully!",
-            description=f"**{len(synced)}** slash commands have been synced with Discord.",
+            description=f"**{len(synced)}** slash commands have been synced with {target}.",
             color=0x00ff00,
             timestamp=datetime.utcnow()
         )
@@ -748,11 +1251,147 @@ async def sync_commands(ctx):
     except Exception as e:
         await ctx.send(f"❌ Error syncing commands: {str(e)}")
 
-@bot.command(name='help')
-async def help_command(ctx):
-    """Show all available commands"""
-    lang = get_server_language(ctx.guild.id)
+@bot.command(name='storage')
+async def storage_status(ctx):
+    """Show saved-build storage status (Owner only)"""
+    if ctx.author.id != BOT_OWNER_ID:
+        await ctx.send("❌ This command is only available to the bot owner!")
+        return
+    
+    pending, lag_seconds = BUILD_STORE.persistence_lag()
+    build_count = await run_store('count', BUILD_STORE.count)
+    body_count = await run_store('body_count', BUILD_STORE.body_count)
+    embed = discord.Embed(
+        title="💾 Build Storage",
+        description=f"**Backend:** `{type(BUILD_STORE).__name__}`\n**Saved Builds:** `{build_count}` (`{body_count}` unique)",
+        color=0x00ff00,
+        timestamp=datetime.utcnow()
+    )
+    embed.add_field(name="⏳ Pending Writes", value=f"`{pending}`", inline=True)
+    embed.add_field(name="🕒 Disk Lag", value=f"`{lag_seconds:.2f}s`", inline=True)
+    writer = getattr(BUILD_STORE, 'writer', None)
+    if writer is not None:
+        embed.add_field(name="🧾 Flushes", value=f"`{writer.flushes}` (last `{writer.last_flush_duration * 1000:.1f}ms`)", inline=True)
+    settings_pending, _ = GUILD_SETTINGS.persistence_lag()
+    embed.add_field(
+        name="⚙️ Guild Settings",
+        value=f"`{GUILD_SETTINGS.cached_count}` cached • `{GUILD_SETTINGS.hits}` hits / `{GUILD_SETTINGS.misses}` misses • `{settings_pending}` pending",
+        inline=False
+    )
+    embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
+    await ctx.send(embed=embed)
+
+@bot.command(name='shards')
+async def shards_status(ctx):
+    """Show the status of every shard in this process (Owner only)"""
+    if ctx.author.id != BOT_OWNER_ID:
+        await ctx.send("❌ This command is only available to the bot owner!")
+        return
+    
+    shard_count = bot.shard_count or 1
+    cluster = f"`{CLUSTER_ID}`" if CLUSTER_ID is not None else "`-`"
+    embed = discord.Embed(
+        title="🧩 Shards",
+        description=f"**Cluster:** {cluster} (pid `{os.getpid()}`)\n**Total Shards:** `{shard_count}`\n**This Guild:** shard `{ctx.guild.shard_id}`",
+        color=0x00ff00,
+        timestamp=datetime.utcnow()
+    )
+    
+    guild_counts = {}
+    for guild in bot.guilds:
+        guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+    
+    if isinstance(bot, commands.AutoShardedBot):
+        shards = [(shard.id, shard.latency, shard.is_closed()) for shard in bot.shards.values()]
+    else:
+        shards = [(bot.shard_id or 0, bot.latency, bot.is_closed())]
+    
+    for shard_id, latency, closed in sorted(shards)[:25]:
+        status = "🔴 Disconnected" if closed else f"🟢 `{round(latency * 1000)}ms`"
+        embed.add_field(
+            name=f"Shard {shard_id}",
+            value=f"{status}\n`{guild_counts.get(shard_id, 0)}` guilds",
+            inline=True
+        )
+    if len(shards) > 25:
+        embed.add_field(name="…", value=f"`{len(shards) - 25}` more shards ({format_shard_ids([s[0] for s in shards])})", inline=False)
+    
+    embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
+    await ctx.send(embed=embed)
+
+@bot.command(name='memory')
+async def memory_status(ctx):
+    """Show approximate memory used by each cache (Owner only)"""
+    if ctx.author.id != BOT_OWNER_ID:
+        await ctx.send("❌ This command is only available to the bot owner!")
+        return
+    
+    rss = process_rss()
+    embed = discord.Embed(
+        title="🧠 Memory Usage",
+        description=f"**Process RSS:** `{format_bytes(rss) if rss is not None else 'unknown'}`\n**Low-Memory Mode:** `{'on' if LOW_MEMORY else 'off'}`",
+        color=0x00ff00,
+        timestamp=datetime.utcnow()
+    )
+    
+    # Every cache is estimated from a sample of its objects; walking all of them would stall the event loop on big bots
+    for name, (count, size) in discord_cache_report(bot).items():
+        embed.add_field(name=f"📦 {name.capitalize()}", value=f"`{count}` • ~`{format_bytes(size)}`", inline=True)
+    
+    if isinstance(BUILD_STORE, JsonBuildStore):
+        # Saved codes share their bodies, so the bodies are what takes the memory
+        _, builds_size = estimate_memory(BUILD_STORE.bodies.values())
+        builds_value = f"`{BUILD_STORE.count()}` • ~`{format_bytes(builds_size)}`"
+    else:
+        builds_value = f"`{await run_store('count', BUILD_STORE.count)}` • on disk"
+    embed.add_field(name="💾 Saved Builds", value=builds_value, inline=True)
+    plan_count, plans_size = estimate_memory(PLAN_CACHE.plans())
+    embed.add_field(name="🧩 Build Plans", value=f"`{plan_count}` • ~`{format_bytes(plans_size)}`", inline=True)
+    embed.add_field(name="⚙️ Guild Settings", value=f"`{GUILD_SETTINGS.cached_count}` cached", inline=True)
+    
+    embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
+    await ctx.send(embed=embed)
+
+@bot.command(name='traces')
+async def build_traces(ctx, count: int = 3, guild_id: int = None):
+    """Show the timelines of the last builds in a server (Owner only)"""
+    if ctx.author.id != BOT_OWNER_ID:
+        await ctx.send("❌ This command is only available to the bot owner!")
+        return
+    
+    if guild_id is None:
+        if ctx.guild is None:
+            await ctx.send("❌ Usage: `!traces [count] [guild_id]`")
+            return
+        guild_id = ctx.guild.id
+    count = max(1, min(count, 5))
+    
+    traces = await TRACE_LOG.recent(guild_id, count)
+    if not traces:
+        await ctx.send(f"❌ No build traces recorded for server `{guild_id}`.")
+        return
     
+    embed = discord.Embed(
+        title="🧭 Build Traces",
+        description=f"Last `{len(traces)}` builds in server `{guild_id}` (newest first)",
+        color=0x00ff00,
+        timestamp=datetime.utcnow()
+    )
+    for trace_data in traces:
+        attrs = trace_data['attrs']
+        status = '✅' if attrs.get('outcome') == 'ok' else '❌'
+        started = datetime.utcfromtimestamp(trace_data['started_at']).strftime('%Y-%m-%d %H:%M:%S')
+        name = f"{status} {started} • {attrs.get('server_name')} • {attrs.get('mode')} • {trace_data['duration']:.1f}s"
+        timeline = tracing.summarize(trace_data)
+        if attrs.get('queued'):
+            timeline = f"queued before start: {attrs['queued']:.1f}s\n{timeline}"
+        embed.add_field(name=name[:256], value=f"```{timeline[:1000]}```", inline=False)
+    
+    embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
+    await ctx.send(embed=embed)
+
+def render_help_embed(lang):
+    """Render the help embed for a language (cached in RENDER_CACHE)"""
     embed = discord.Embed(
         title=get_message('help_title', lang),
         description=get_message('help_desc', lang),
@@ -763,7 +1402,7 @@ async def help_command(ctx):
     # Core Commands (Administrator required)
     admin_commands = {
         "**🔧 Core Commands (Admin):**": "",
-        "`!build <template/code>`": "🏗️ Deploy server structure from template or saved build",
+        "`!build <template/code> [sync]`": "🏗️ Deploy server structure from template or saved build",
         "`!savebuild`": "💾 Save current server structure with unique code",
         "`!deletebuild`": "🗑️ Clean slate - remove all structure",
         "`!builds`": "📋 List all your saved server builds",
@@ -827,12 +1466,49 @@ async def help_command(ctx):
     embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
     embed.set_thumbnail(url=bot.user.avatar.url if bot.user.avatar else None)
     
+    return embed
+
+@bot.command(name='help')
+async def help_command(ctx):
+    """Show all available commands"""
+    lang = await get_server_language(ctx.guild.id)
+    
+    embed = RENDER_CACHE.get(('help', lang, TEMPLATES.version), lambda: render_help_embed(lang))
+    
     await ctx.send(embed=embed)
 
+def render_build_options_embed(lang):
+    """Render the template part of the build options embed (cached in RENDER_CACHE)"""
+    embed = discord.Embed(
+        title=get_message('available_build_options', lang),
+        description=get_message('choose_template', lang),
+        color=0x00ff00
+    )
+    
+    # Show templates
+    embed.add_field(
+        name=get_message('templates_section', lang), 
+        value=get_message('templates_usage', lang), 
+        inline=False
+    )
+    
+    for template_key, template_data in TEMPLATES.items():
+        embed.add_field(
+            name=f"`{template_key}`", 
+            value=get_template_display(template_key, template_data)[0],
+            inline=True
+        )
+    
+    return embed
+
 @bot.command(name='build')
-async def build_server(ctx, build_code: str = None):
-    """Build server structure based on template or saved build code"""
-    lang = get_server_language(ctx.guild.id)
+async def build_server(ctx, build_code: str = None, mode: str = None):
+    """Build server structure based on template or saved build code
+    
+    Pass ``sync`` as the mode to apply only the differences instead of
+    wiping and rebuilding the whole server.
+    """
+    lang = await get_server_language(ctx.guild.id)
     
     # Check permissions - Administrator required
     if not ctx.author.guild_permissions.administrator:
@@ -848,28 +1524,10 @@ async def build_server(ctx, build_code: str = None):
     
     if not build_code:
         # Show available templates and build options
-        embed = discord.Embed(
-            title=get_message('available_build_options', lang),
-            description=get_message('choose_template', lang),
-            color=0x00ff00
-        )
-        
-        # Show templates
-        embed.add_field(
-            name=get_message('templates_section', lang), 
-            value=get_message('templates_usage', lang), 
-            inline=False
-        )
-        
-        for template_key, template_data in TEMPLATES.items():
-            embed.add_field(
-                name=f"`{template_key}`", 
-                value=f"**{template_data['server_name']}**\n`{len(template_data['categories'])}` categories • `{len(template_data['roles'])}` roles",
-                inline=True
-            )
+        embed = RENDER_CACHE.get(('build_options', lang, TEMPLATES.version), lambda: render_build_options_embed(lang))
         
         # Get user's saved builds count
-        user_builds = get_user_builds(ctx.author.id)
+        user_builds = await get_user_builds(ctx.author.id)
         
         # Show saved builds info
         embed.add_field(
@@ -890,8 +1548,8 @@ async def build_server(ctx, build_code: str = None):
     # Check if it's a saved build code (8 characters, alphanumeric)
     if len(build_code) == 8 and build_code.isalnum():
         # Try to find saved build from any user
-        template = get_build_by_code(build_code.upper())
-        if template:
+        plan = await get_build_plan(build_code.upper())
+        if plan:
             build_type = "saved build"
         else:
             embed = discord.Embed(
@@ -917,176 +1575,22 @@ async def build_server(ctx, build_code: str = None):
             await ctx.send(embed=embed)
             return
         
-        template = TEMPLATES[template_name]
+        plan = get_template_plan(template_name)
         build_type = "template"
-    guild = ctx.guild
     
     # Send initial message
-    embed = discord.Embed(
-        title=get_message('deploying_structure', lang),
-        description=get_message('source_template', lang, source=build_type, name=template['server_name']),
-        color=0x00ff00
+    sync_mode = bool(mode) and mode.lower() == 'sync'
+    embed = deploy_embed(
+        get_message('deploying_structure', lang),
+        get_message('source_template', lang, source=build_type, name=plan.server_name),
+        lang,
+        counts=plan.counts,
+        estimate=estimate_deployment(ctx.guild, plan, keep_channel=ctx.channel, sync_mode=sync_mode)
     )
-    embed.add_field(name=get_message('categories', lang), value=f"`{len(template['categories'])}`", inline=True)
-    embed.add_field(name=get_message('roles', lang), value=f"`{len(template['roles'])}`", inline=True)
-    embed.add_field(name=get_message('channels', lang), value=f"`{sum(len(cat['channels']) for cat in template['categories'])}`", inline=True)
-    
     message = await ctx.send(embed=embed)
     
-    try:
-        # Rename server if template has a name
-        if template.get('server_name'):
-            await guild.edit(name=template['server_name'])
-        
-        # Delete all existing channels and categories first
-        cleanup_embed = discord.Embed(
-            title=get_message('server_cleanup', lang),
-            description=get_message('phase_1', lang),
-            color=0x00ff00
-        )
-        await message.edit(embed=cleanup_embed)
-        
-        deleted_count = 0
-        deleted_roles = 0
-        
-        # Delete all channels and categories
-        for channel in guild.channels:
-            if channel != ctx.channel:  # Don't delete the command channel
-                try:
-                    await channel.delete(reason=f"Cleanup before building {template['server_name']}")
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"Error deleting channel {channel.name}: {e}")
-        
-        # Delete all roles except @everyone and bot's own role
-        for role in guild.roles:
-            if role.name != "@everyone" and role != guild.me.top_role:
-                try:
-                    await role.delete(reason=f"Cleanup before building {template['server_name']}")
-                    deleted_roles += 1
-                except Exception as e:
-                    print(f"Error deleting role {role.name}: {e}")
-        
-        print(f"Deleted {deleted_count} channels/categories and {deleted_roles} roles")
-        
-        # Create roles
-        created_roles = []
-        for role_data in template['roles']:
-            print(f"Creating role: {role_data['name']}")
-            try:
-                # Convert permission strings to discord.Permissions
-                permissions = discord.Permissions()
-                for perm in role_data.get('permissions', []):
-                    if hasattr(discord.Permissions, perm):
-                        setattr(permissions, perm, True)
-                
-                role = await guild.create_role(
-                    name=role_data['name'],
-                    permissions=permissions,
-                    reason=f"Server structure created by {bot.user.name}"
-                )
-                created_roles.append(role)
-            except Exception as e:
-                print(f"Error creating role {role_data['name']}: {e}")
-        
-        # Create categories and channels
-        created_categories = []
-        created_channels = []
-        
-        for i, category_data in enumerate(template['categories']):
-            # Update progress
-            progress_embed = discord.Embed(
-                title=get_message('deploying_structure', lang),
-                description=get_message('phase_2', lang, current=category_data['name'], progress=f"{i+1}/{len(template['categories'])}"),
-                color=0x00ff00
-            )
-            progress_embed.add_field(name=get_message('categories', lang), value=f"`{len(created_categories)}`", inline=True)
-            progress_embed.add_field(name=get_message('channels', lang), value=f"`{len(created_channels)}`", inline=True)
-            progress_embed.add_field(name=get_message('roles', lang), value=f"`{len(created_roles)}`", inline=True)
-            await message.edit(embed=progress_embed)
-            try:
-                print(f"Creating category: {category_data['name']}")
-                # Create category
-                category = await guild.create_category(
-                    name=category_data['name'],
-                    reason=f"Server structure created by {bot.user.name}"
-                )
-                created_categories.append(category)
-                
-                # Create channels in category
-                for channel_data in category_data['channels']:
-                    try:
-                        if channel_data['type'] == 'voice':
-                            # Create voice channel
-                            channel = await guild.create_voice_channel(
-                                name=channel_data['name'],
-                                category=category,
-                                reason=f"Server structure created by {bot.user.name}"
-                            )
-                        else:
-                            # Create text channel
-                            channel_kwargs = {
-                                'name': channel_data['name'],
-                                'category': category,
-                                'reason': f"Server structure created by {bot.user.name}"
-                            }
-                            
-                            # Add topic for text channels
-                            if channel_data.get('topic'):
-                                channel_kwargs['topic'] = channel_data['topic']
-                            
-                            channel = await guild.create_text_channel(**channel_kwargs)
-                        
-                        created_channels.append(channel)
-                        print(f"Created channel: {channel.name} in category: {category.name}")
-                        
-                    except Exception as e:
-                        print(f"Error creating channel {channel_data['name']}: {e}")
-                        
-            except Exception as e:
-                print(f"Error creating category {category_data['name']}: {e}")
-        
-        # Final progress update
-        final_progress_embed = discord.Embed(
-            title=get_message('deploying_structure', lang),
-            description=get_message('phase_3', lang),
-            color=0x00ff00
-        )
-        final_progress_embed.add_field(name=get_message('categories', lang), value=f"`{len(created_categories)}`", inline=True)
-        final_progress_embed.add_field(name=get_message('channels', lang), value=f"`{len(created_channels)}`", inline=True)
-        final_progress_embed.add_field(name=get_message('roles', lang), value=f"`{len(created_roles)}`", inline=True)
-        await message.edit(embed=final_progress_embed)
-        
-        # Update success message
-        success_embed = discord.Embed(
-            title=get_message('build_success', lang),
-            description=get_message('build_success_desc', lang, server_name=template['server_name']),
-            color=0x00ff00
-        )
-        success_embed.add_field(name=get_message('categories', lang), value=f"`{len(created_categories)}`", inline=True)
-        success_embed.add_field(name=get_message('channels', lang), value=f"`{len(created_channels)}`", inline=True)
-        success_embed.add_field(name=get_message('roles', lang), value=f"`{len(created_roles)}`", inline=True)
-        success_embed.add_field(name=get_message('cleaned', lang), value=f"`{deleted_count} channels, {deleted_roles} roles`", inline=True)
-        
-        if template.get('server_name'):
-            success_embed.add_field(name=get_message('server_renamed', lang), value=f"`{template['server_name']}`", inline=False)
-        
-        # Add Top.gg voting prompt
-        success_embed.add_field(
-            name=get_message('support_bot', lang),
-            value=get_message('support_desc', lang, vote_url=TOPGG_VOTE_URL, review_url=TOPGG_REVIEW_URL),
-            inline=False
-        )
-        
-        await message.edit(embed=success_embed)
-        
-    except Exception as e:
-        error_embed = discord.Embed(
-            title=get_message('deployment_failed', lang),
-            description=get_message('deployment_failed_desc', lang, error=str(e)),
-            color=0xff0000
-        )
-        await message.edit(embed=error_embed)
+    # Queue the deployment instead of running it inline
+    submit_build(ctx.guild, plan, build_type, lang, message, keep_channel=ctx.channel, sync_mode=sync_mode)
 
 @bot.command(name='deletebuild')
 async def delete_build(ctx):
@@ -1108,37 +1612,32 @@ async def delete_build(ctx):
     await message.add_reaction('✅')
     await message.add_reaction('❌')
     
-    def check(reaction, user):
-        return user == ctx.author and str(reaction.emoji) in ['✅', '❌'] and reaction.message.id == message.id
+    # Raw events work without the message cache (disabled in low-memory mode)
+    def check(payload):
+        return payload.user_id == ctx.author.id and str(payload.emoji) in ['✅', '❌'] and payload.message_id == message.id
     
     try:
-        reaction, user = await bot.wait_for('reaction_add', timeout=30.0, check=check)
+        payload = await bot.wait_for('raw_reaction_add', timeout=30.0, check=check)
         
-        if str(reaction.emoji) == '✅':
-            # Delete all categories and channels
-            deleted_count = 0
-            
-            for channel in ctx.guild.channels:
-                if channel.category:  # Only delete channels in categories
-                    try:
-                        await channel.delete(reason=f"Cleanup by {bot.user.name}")
-                        deleted_count += 1
-                    except Exception as e:
-                        print(f"Error deleting channel {channel.name}: {e}")
+        if str(payload.emoji) == '✅':
+            async def run_cleanup(job):
+                # Delete all categories and the channels inside them
+                cleanup_plan = plan_cleanup(ctx.guild, keep_channel=ctx.channel, include_roles=False, categorized_only=True)
+                cleanup_report = await execute_cleanup(cleanup_plan, BUILD_SCHEDULER, reason=f"Cleanup by {bot.user.name}")
+                deleted_count = cleanup_report.deleted_channels
+                
+                success_embed = discord.Embed(
+                    title="🗑️ Cleanup Complete",
+                    description=f"Successfully deleted {deleted_count} channels and categories.",
+                    color=0x00ff00
+                )
+                await ctx.send(embed=success_embed)
             
-            for category in ctx.guild.categories:
-                try:
-                    await category.delete(reason=f"Cleanup by {bot.user.name}")
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"Error deleting category {category.name}: {e}")
+            async def show_position(job, position):
+                await message.edit(embed=queued_embed(await get_server_language(ctx.guild.id), position))
             
-            success_embed = discord.Embed(
-                title="🗑️ Cleanup Complete",
-                description=f"Successfully deleted {deleted_count} channels and categories.",
-                color=0x00ff00
-            )
-            await ctx.send(embed=success_embed)
+            # Queue the cleanup so it never overlaps a build in this guild
+            BUILD_JOBS.submit(BuildJob(ctx.guild.id, 'cleanup', run_cleanup, on_queued=show_position))
             
         else:
             await ctx.send("❌ Deletion cancelled.")
@@ -1146,6 +1645,12 @@ async def delete_build(ctx):
     except asyncio.TimeoutError:
         await ctx.send("⏰ Confirmation timed out. Deletion cancelled.")
 
+async def fetch_guild_owner(guild):
+    """Get the guild owner, fetching it when the member cache doesn't have it"""
+    if guild.owner is not None or guild.owner_id is None:
+        return guild.owner
+    return await guild.fetch_member(guild.owner_id)
+
 @bot.command(name='server')
 async def server_info(ctx):
     """Show server information and statistics"""
@@ -1165,7 +1670,7 @@ async def server_info(ctx):
     
     # Get server owner information
     try:
-        owner = guild.owner
+        owner = await fetch_guild_owner(guild)
         if owner:
             owner_info = f"{owner.mention}\n**{owner.name}#{owner.discriminator}**\nID: `{owner.id}`"
         else:
@@ -1275,81 +1780,9 @@ async def on_command_error(ctx, error):
 @bot.tree.command(name="help", description="📚 Show all available commands")
 async def slash_help(interaction: discord.Interaction):
     """Slash command version of help"""
-    lang = get_server_language(interaction.guild.id)
+    lang = await get_server_language(interaction.guild.id)
     
-    embed = discord.Embed(
-        title=get_message('help_title', lang),
-        description=get_message('help_desc', lang),
-        color=0x00ff00,
-        timestamp=datetime.utcnow()
-    )
-    
-    # Core Commands (Administrator required)
-    admin_commands = {
-        "**🔧 Core Commands (Admin):**": "",
-        "`!build <template/code>`": "🏗️ Deploy server structure from template or saved build",
-        "`!savebuild`": "💾 Save current server structure with unique code",
-        "`!deletebuild`": "🗑️ Clean slate - remove all structure",
-        "`!builds`": "📋 List all your saved server builds",
-        "`!removebuild <code>`": "🗑️ Delete a specific saved build",
-        "`!language <en/ar>`": "🌐 Set bot language (English/Arabic)",
-        "`!addrole <name>`": "🛡️ Create a new role",
-        "`!deleterole <name>`": "🗑️ Delete a role by name"
-    }
-    
-    # Utility Commands (All members)
-    utility_commands = {
-        "**⚡ Utility Commands:**": "",
-        "`!server`": "📊 Advanced server analytics",
-        "`!ping`": "⚡ System performance check",
-        "`!help`": "📖 Command documentation",
-        "`!owner`": "👑 Show bot owner information"
-    }
-    
-    # Slash Commands
-    slash_commands = {
-        "**🎯 Slash Commands:**": "",
-        "`/build`": "🎯 Interactive template deployment",
-        "`/deletebuild`": "🔄 One-click server reset",
-        "`/server`": "📈 Real-time server metrics",
-        "`/ping`": "⚡ Performance diagnostics",
-        "`/help`": "📚 Command reference"
-    }
-    
-    # Add all command sections
-    for cmd, desc in admin_commands.items():
-        if cmd.startswith("**"):
-            embed.add_field(name=cmd, value=desc, inline=False)
-        else:
-            embed.add_field(name=cmd, value=desc, inline=False)
-    
-    for cmd, desc in utility_commands.items():
-        if cmd.startswith("**"):
-            embed.add_field(name=cmd, value=desc, inline=False)
-        else:
-            embed.add_field(name=cmd, value=desc, inline=False)
-    
-    for cmd, desc in slash_commands.items():
-        if cmd.startswith("**"):
-            embed.add_field(name=cmd, value=desc, inline=False)
-        else:
-            embed.add_field(name=cmd, value=desc, inline=False)
-    
-    embed.add_field(
-        name=get_message('available_templates', lang), 
-        value=get_message('templates_list', lang), 
-        inline=False
-    )
-    
-    # Add Top.gg support section
-    embed.add_field(
-        name=get_message('support_bot', lang),
-        value=get_message('support_desc', lang, vote_url=TOPGG_VOTE_URL, review_url=TOPGG_REVIEW_URL),
-        inline=False
-    )
-    
-    embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
-    embed.set_thumbnail(url=bot.user.avatar.url if bot.user.avatar else None)
+    embed = RENDER_CACHE.get(('help', lang, TEMPLATES.version), lambda: render_help_embed(lang))
     
     await interaction.response.send_message(embed=embed)
 
@@ -1385,7 +1818,7 @@ async def slash_server(interaction: discord.Interaction):
     
     # Get server owner information
     try:
-        owner = guild.owner
+        owner = await fetch_guild_owner(guild)
         if owner:
             owner_info = f"{owner.mention}\n**{owner.name}#{owner.discriminator}**\nID: `{owner.id}`"
         else:
@@ -1413,15 +1846,12 @@ async def slash_server(interaction: discord.Interaction):
     await interaction.response.send_message(embed=embed)
 
 @bot.tree.command(name="build", description="🏗️ Deploy server structure with templates")
-@app_commands.describe(template="Choose a template to build")
-@app_commands.choices(template=[
-    app_commands.Choice(name="Community Hub", value="community"),
-    app_commands.Choice(name="Gaming Community", value="gaming"),
-    app_commands.Choice(name="Study Group", value="study"),
-    app_commands.Choice(name="Marketplace", value="marketplace"),
-    app_commands.Choice(name="Tech Community", value="tech")
+@app_commands.describe(template="Choose a template to build", mode="Wipe and rebuild, or only apply what changed")
+@app_commands.choices(mode=[
+    app_commands.Choice(name="Wipe and rebuild", value="rebuild"),
+    app_commands.Choice(name="Sync changes only", value="sync")
 ])
-async def slash_build(interaction: discord.Interaction, template: str):
+async def slash_build(interaction: discord.Interaction, template: str, mode: str = "rebuild"):
     """Slash command version of build"""
     # Check permissions
     if not interaction.user.guild_permissions.administrator:
@@ -1435,7 +1865,8 @@ async def slash_build(interaction: discord.Interaction, template: str):
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
     
-    if template not in TEMPLATES:
+    plan = get_template_plan(template)
+    if plan is None:
         embed = discord.Embed(
             title="❌ Template Not Found",
             description=f"Template '{template}' not found!",
@@ -1449,189 +1880,32 @@ async def slash_build(interaction: discord.Interaction, template: str):
     # Defer response since this will take time
     await interaction.response.defer()
     
-    template_data = TEMPLATES[template]
-    guild = interaction.guild
+    lang = await get_server_language(interaction.guild.id)
     
     # Send initial message
-    embed = discord.Embed(
-        title="🚀 Deploying Server Structure",
-        description=f"**Template:** `{template_data['server_name']}`\n**Status:** Initializing deployment...",
-        color=0x00ff00,
-        timestamp=datetime.utcnow()
+    embed = deploy_embed(
+        get_message('deploying_structure', lang),
+        get_message('source_template', lang, source="template", name=plan.server_name),
+        lang,
+        counts=plan.counts,
+        estimate=estimate_deployment(interaction.guild, plan, keep_channel=interaction.channel, sync_mode=mode == 'sync')
     )
-    embed.add_field(name="📁 Categories", value=f"`{len(template_data['categories'])}`", inline=True)
-    embed.add_field(name="🛡️ Roles", value=f"`{len(template_data['roles'])}`", inline=True)
-    embed.add_field(name="💬 Channels", value=f"`{sum(len(cat['channels']) for cat in template_data['categories'])}`", inline=True)
-    embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
-    
     message = await interaction.followup.send(embed=embed)
     
-    try:
-        # Rename server if template has a name
-        if template_data.get('server_name'):
-            await guild.edit(name=template_data['server_name'])
-        
-        # Delete all existing channels and categories first
-        cleanup_embed = discord.Embed(
-            title="🧹 Server Cleanup",
-            description="**Phase 1:** Removing existing structure\n**Status:** Cleaning channels, categories, and roles...",
-            color=0x00ff00,
-            timestamp=datetime.utcnow()
-        )
-        cleanup_embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
-        await message.edit(embed=cleanup_embed)
-        
-        deleted_count = 0
-        deleted_roles = 0
-        
-        # Delete all channels and categories
-        for channel in guild.channels:
-            if channel != interaction.channel:  # Don't delete the command channel
-                try:
-                    await channel.delete(reason=f"Cleanup before building {template_data['server_name']}")
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"Error deleting channel {channel.name}: {e}")
-        
-        # Delete all roles except @everyone and bot's own role
-        for role in guild.roles:
-            if role.name != "@everyone" and role != guild.me.top_role:
-                try:
-                    await role.delete(reason=f"Cleanup before building {template_data['server_name']}")
-                    deleted_roles += 1
-                except Exception as e:
-                    print(f"Error deleting role {role.name}: {e}")
-        
-        print(f"Deleted {deleted_count} channels/categories and {deleted_roles} roles")
-        
-        # Create roles
-        created_roles = []
-        for role_data in template_data['roles']:
-            print(f"Creating role: {role_data['name']}")
-            try:
-                # Convert permission strings to discord.Permissions
-                permissions = discord.Permissions()
-                for perm in role_data.get('permissions', []):
-                    if hasattr(discord.Permissions, perm):
-                        setattr(permissions, perm, True)
-                
-                role = await guild.create_role(
-                    name=role_data['name'],
-                    permissions=permissions,
-                    reason=f"Server structure created by {bot.user.name}"
-                )
-                created_roles.append(role)
-            except Exception as e:
-                print(f"Error creating role {role_data['name']}: {e}")
-        
-        # Create categories and channels
-        created_categories = []
-        created_channels = []
-        
-        for i, category_data in enumerate(template_data['categories']):
-            # Update progress
-            progress_embed = discord.Embed(
-                title="🚀 Deploying Server Structure",
-                description=f"**Phase 2:** Building structure\n**Current:** `{category_data['name']}` ({i+1}/{len(template_data['categories'])})",
-                color=0x00ff00,
-                timestamp=datetime.utcnow()
-            )
-            progress_embed.add_field(name="📁 Categories", value=f"`{len(created_categories)}`", inline=True)
-            progress_embed.add_field(name="💬 Channels", value=f"`{len(created_channels)}`", inline=True)
-            progress_embed.add_field(name="🛡️ Roles", value=f"`{len(created_roles)}`", inline=True)
-            progress_embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
-            await message.edit(embed=progress_embed)
-            
-            try:
-                print(f"Creating category: {category_data['name']}")
-                # Create category
-                category = await guild.create_category(
-                    name=category_data['name'],
-                    reason=f"Server structure created by {bot.user.name}"
-                )
-                created_categories.append(category)
-                
-                # Create channels in category
-                for channel_data in category_data['channels']:
-                    try:
-                        if channel_data['type'] == 'voice':
-                            # Create voice channel
-                            channel = await guild.create_voice_channel(
-                                name=channel_data['name'],
-                                category=category,
-                                reason=f"Server structure created by {bot.user.name}"
-                            )
-                        else:
-                            # Create text channel
-                            channel_kwargs = {
-                                'name': channel_data['name'],
-                                'category': category,
-                                'reason': f"Server structure created by {bot.user.name}"
-                            }
-                            
-                            # Add topic for text channels
-                            if channel_data.get('topic'):
-                                channel_kwargs['topic'] = channel_data['topic']
-                            
-                            channel = await guild.create_text_channel(**channel_kwargs)
-                        
-                        created_channels.append(channel)
-                        print(f"Created channel: {channel.name} in category: {category.name}")
-                        
-                    except Exception as e:
-                        print(f"Error creating channel {channel_data['name']}: {e}")
-                        
-            except Exception as e:
-                print(f"Error creating category {category_data['name']}: {e}")
-        
-        # Final progress update
-        final_progress_embed = discord.Embed(
-            title="🚀 Deploying Server Structure",
-            description="**Phase 3:** Finalizing deployment\n**Status:** All components created successfully!",
-            color=0x00ff00,
-            timestamp=datetime.utcnow()
-        )
-        final_progress_embed.add_field(name="📁 Categories", value=f"`{len(created_categories)}`", inline=True)
-        final_progress_embed.add_field(name="💬 Channels", value=f"`{len(created_channels)}`", inline=True)
-        final_progress_embed.add_field(name="🛡️ Roles", value=f"`{len(created_roles)}`", inline=True)
-        final_progress_embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
-        await message.edit(embed=final_progress_embed)
-        
-        # Update success message
-        success_embed = discord.Embed(
-            title="✅ Deployment Successful!",
-            description=f"**{template_data['server_name']}** has been deployed successfully!\nYour server is now ready for use.",
-            color=0x00ff00,
-            timestamp=datetime.utcnow()
-        )
-        success_embed.add_field(name="📁 Categories", value=f"`{len(created_categories)}`", inline=True)
-        success_embed.add_field(name="💬 Channels", value=f"`{len(created_channels)}`", inline=True)
-        success_embed.add_field(name="🛡️ Roles", value=f"`{len(created_roles)}`", inline=True)
-        success_embed.add_field(name="🧹 Cleaned", value=f"`{deleted_count} channels, {deleted_roles} roles`", inline=True)
-        
-        if template_data.get('server_name'):
-            success_embed.add_field(name="🏷️ Server Renamed", value=f"`{template_data['server_name']}`", inline=False)
-        
-        # Add Top.gg voting prompt
-        success_embed.add_field(
-            name="⭐ Support BuilderBot!",
-            value=f"**Enjoying the bot? Please vote for us on Top.gg!**\n[Vote Now]({TOPGG_VOTE_URL}) • [Leave Review]({TOPGG_REVIEW_URL})",
-            inline=False
-        )
-        
-        success_embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
-        
-        await message.edit(embed=success_embed)
-        
-    except Exception as e:
-        error_embed = discord.Embed(
-            title="❌ Deployment Failed",
-            description=f"**Error:** `{str(e)}`\nPlease check bot permissions and try again.",
-            color=0xff0000,
-            timestamp=datetime.utcnow()
-        )
-        error_embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
-        await message.edit(embed=error_embed)
+    # Queue the deployment instead of running it inline
+    submit_build(interaction.guild, plan, "template", lang, message, keep_channel=interaction.channel, sync_mode=mode == 'sync')
+
+@slash_build.autocomplete('template')
+@timed_autocomplete
+async def slash_build_template_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest templates from the live registry, so reloaded templates show up without a resync"""
+    current = current.lower()
+    choices = []
+    for template_key, template_data in TEMPLATES.items():
+        choice = get_template_display(template_key, template_data)[1]
+        if current in template_key or current in choice.name.lower():
+            choices.append(choice)
+    return choices[:25]
 
 @bot.tree.command(name="deletebuild", description="🗑️ Reset server to clean slate")
 async def slash_deletebuild(interaction: discord.Interaction):
@@ -1664,43 +1938,38 @@ async def slash_deletebuild(interaction: discord.Interaction):
             super().__init__(timeout=30.0)
         
         @discord.ui.button(label="✅ Confirm", style=discord.ButtonStyle.danger)
-        async def confirm(self, button: discord.ui.Button, interaction: discord.Interaction):
+        async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
             if interaction.user.guild_permissions.administrator:
-                # Delete all categories and channels
-                deleted_count = 0
-                deleted_roles = 0
-                
-                for channel in interaction.guild.channels:
-                    if channel != interaction.channel:  # Don't delete the command channel
-                        try:
-                            await channel.delete(reason=f"Cleanup by {bot.user.name}")
-                            deleted_count += 1
-                        except Exception as e:
-                            print(f"Error deleting channel {channel.name}: {e}")
+                # Cleanup can outlast the 3 second interaction window
+                await interaction.response.defer()
                 
-                # Delete all roles except @everyone and bot's own role
-                for role in interaction.guild.roles:
-                    if role.name != "@everyone" and role != interaction.guild.me.top_role:
-                        try:
-                            await role.delete(reason=f"Cleanup by {bot.user.name}")
-                            deleted_roles += 1
-                        except Exception as e:
-                            print(f"Error deleting role {role.name}: {e}")
+                async def run_reset(job):
+                    # Delete all channels and roles except the command channel
+                    cleanup_plan = plan_cleanup(interaction.guild, keep_channel=interaction.channel)
+                    cleanup_report = await execute_cleanup(cleanup_plan, BUILD_SCHEDULER, reason=f"Cleanup by {bot.user.name}")
+                    deleted_count = cleanup_report.deleted_channels
+                    deleted_roles = cleanup_report.deleted_roles
+                    
+                    success_embed = discord.Embed(
+                        title="✅ Server Reset Complete",
+                        description=f"**Server has been reset successfully!**\n`{deleted_count}` channels/categories and `{deleted_roles}` roles removed.",
+                        color=0x00ff00,
+                        timestamp=datetime.utcnow()
+                    )
+                    success_embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
+                    
+                    await interaction.edit_original_response(embed=success_embed, view=None)
                 
-                success_embed = discord.Embed(
-                    title="✅ Server Reset Complete",
-                    description=f"**Server has been reset successfully!**\n`{deleted_count}` channels/categories and `{deleted_roles}` roles removed.",
-                    color=0x00ff00,
-                    timestamp=datetime.utcnow()
-                )
-                success_embed.set_footer(text=f"Developed by <@{BOT_OWNER_ID}> | {BOT_OWNER_NAME} {BOT_VERSION}")
+                async def show_position(job, position):
+                    await interaction.edit_original_response(embed=queued_embed(await get_server_language(interaction.guild.id), position), view=None)
                 
-                await interaction.response.edit_message(embed=success_embed, view=None)
+                # Queue the reset so it never overlaps a build in this guild
+                BUILD_JOBS.submit(BuildJob(interaction.guild.id, 'reset', run_reset, on_queued=show_position))
             else:
                 await interaction.response.send_message("❌ You don't have permission to do this!", ephemeral=True)
         
         @discord.ui.button(label="❌ Cancel", style=discord.ButtonStyle.secondary)
-        async def cancel(self, button: discord.ui.Button, interaction: discord.Interaction):
+        async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
             cancel_embed = discord.Embed(
                 title="❌ Reset Cancelled",
                 description="**Server reset has been cancelled.**\nYour server structure remains unchanged.",
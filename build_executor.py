@@ -0,0 +1,427 @@
+"""Concurrent build executor for server templates and saved builds.
+
+A template is turned into a dependency graph of create operations: roles,
+then categories, then the channels that need their parent category.
+Operations whose dependencies are met run concurrently through a
+RouteScheduler, which bounds the number of in-flight requests globally and
+per Discord rate-limit route so independent work overlaps without hammering
+a single bucket.
+
+Roles are created concurrently, so the order they land in says nothing
+about the hierarchy; once the last one exists a single bulk position update
+puts them in template order, instead of one edit per role.
+"""
+import asyncio
+import time
+
+import discord
+
+import tracing
+from metrics import BUILD_OPERATIONS, BUILD_PHASE_SECONDS, SCHEDULER_RETRIES
+
+# Rate-limit routes used while building (major parameter is the guild id)
+ROUTE_CREATE_ROLE = 'POST /guilds/{guild_id}/roles'
+ROUTE_CREATE_CHANNEL = 'POST /guilds/{guild_id}/channels'
+ROUTE_DELETE_ROLE = 'DELETE /guilds/{guild_id}/roles/{role_id}'
+ROUTE_DELETE_CHANNEL = 'DELETE /channels/{channel_id}'
+ROUTE_EDIT_ROLE = 'PATCH /guilds/{guild_id}/roles/{role_id}'
+ROUTE_EDIT_CHANNEL = 'PATCH /channels/{channel_id}'
+ROUTE_EDIT_ROLE_POSITIONS = 'PATCH /guilds/{guild_id}/roles'
+
+# Maximum number of API calls in flight across every guild
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Maximum number of API calls in flight per route bucket
+DEFAULT_ROUTE_LIMITS = {
+    ROUTE_CREATE_ROLE: 3,
+    ROUTE_CREATE_CHANNEL: 5,
+    ROUTE_DELETE_ROLE: 3,
+    ROUTE_DELETE_CHANNEL: 5,
+    ROUTE_EDIT_ROLE: 3,
+    ROUTE_EDIT_CHANNEL: 5,
+}
+DEFAULT_ROUTE_LIMIT = 2
+
+# Trace span each kind of build operation is grouped under
+TRACE_GROUPS = {'role': 'roles', 'category': 'categories', 'text': 'channels', 'voice': 'channels'}
+
+# How many times a call is retried after a 429 before giving up
+DEFAULT_MAX_RETRIES = 3
+
+# Fallback wait when a 429 response carries no Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def retry_after_from(error):
+    """Get the retry-after delay in seconds from a rate-limit error"""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    headers = getattr(error.response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After', DEFAULT_RETRY_AFTER))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class RouteScheduler:
+    """Bound concurrent API calls globally and per rate-limit bucket.
+
+    discord.py already sleeps through most 429s internally; when one still
+    surfaces (``RateLimited`` or an exhausted retry), the whole bucket is
+    paused for the Retry-After delay and the call is retried.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, route_limits=None,
+                 max_retries=DEFAULT_MAX_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.route_limits = dict(DEFAULT_ROUTE_LIMITS)
+        if route_limits:
+            self.route_limits.update(route_limits)
+        self.rate_limited = 0
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._buckets = {}
+        self._resume_at = {}
+
+    def _bucket(self, route, major_id):
+        """Get the semaphore for a (route, major parameter) bucket"""
+        key = (route, major_id)
+        semaphore = self._buckets.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.route_limits.get(route, DEFAULT_ROUTE_LIMIT))
+            self._buckets[key] = semaphore
+        return semaphore
+
+    async def _wait_for_bucket(self, key):
+        """Sleep until a paused bucket may be used again"""
+        loop = asyncio.get_running_loop()
+        while True:
+            delay = self._resume_at.get(key, 0) - loop.time()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def call(self, route, major_id, factory, target=None):
+        """Run ``factory()`` once a slot is free in its bucket and globally
+
+        ``target`` names the object being changed in the call's trace span.
+        """
+        key = (route, major_id)
+        attempt = 0
+        waited = 0.0
+        with tracing.span(route, kind=tracing.KIND_API, **({'target': target} if target else {})) as span:
+            while True:
+                queued_at = time.perf_counter()
+                await self._wait_for_bucket(key)
+                try:
+                    async with self._bucket(route, major_id):
+                        async with self._global:
+                            waited += time.perf_counter() - queued_at
+                            span.set(waited=round(waited, 4))
+                            return await factory()
+                except (discord.RateLimited, discord.HTTPException) as e:
+                    if isinstance(e, discord.HTTPException) and e.status != 429:
+                        raise
+                    if attempt >= self.max_retries:
+                        raise
+                    attempt += 1
+                    self.rate_limited += 1
+                    SCHEDULER_RETRIES.inc(route=route)
+                    retry_after = retry_after_from(e)
+                    span.annotate('retry', attempt=attempt, retry_after=retry_after)
+                    loop = asyncio.get_running_loop()
+                    self._resume_at[key] = max(self._resume_at.get(key, 0), loop.time() + retry_after)
+                    print(f"Rate limited on {route}, retrying in {retry_after:.2f}s")
+
+
+class BuildOp:
+    """A single create operation in a build graph"""
+
+    __slots__ = ('key', 'kind', 'route', 'data', 'parent', 'position', 'permissions')
+
+    def __init__(self, key, kind, route, data, parent=None, position=None, permissions=None):
+        self.key = key
+        self.kind = kind
+        self.route = route
+        self.data = data
+        self.parent = parent
+        self.position = position
+        # Precompiled role permission bitmask (see build_plans)
+        self.permissions = permissions
+
+    def __repr__(self):
+        return f"<BuildOp {self.key} {self.kind} {self.data.get('name')!r}>"
+
+
+class BuildResult:
+    """Objects created by a build, in template order"""
+
+    def __init__(self, ops):
+        self.ops = ops
+        self.created = {}
+        self.failed = []
+
+    def _created_of(self, *kinds):
+        return [self.created[op.key] for op in self.ops if op.kind in kinds and op.key in self.created]
+
+    @property
+    def roles(self):
+        return self._created_of('role')
+
+    @property
+    def categories(self):
+        return self._created_of('category')
+
+    @property
+    def channels(self):
+        return self._created_of('text', 'voice')
+
+
+def role_hierarchy(template):
+    """Indexes of a template's roles from the top of the hierarchy down
+
+    Templates list roles top first.  Saved builds list them the way
+    ``guild.roles`` does, bottom first, and record each role's position.
+    """
+    roles = template.get('roles', [])
+    if roles and all('position' in role for role in roles):
+        # guild.roles breaks position ties by id, i.e. by list order
+        return sorted(range(len(roles)), key=lambda i: (roles[i]['position'], i), reverse=True)
+    if 'format' in template:
+        # Saved before positions were recorded, still in guild.roles order
+        return list(range(len(roles) - 1, -1, -1))
+    return list(range(len(roles)))
+
+
+def build_ops(template):
+    """Turn a template or saved build into an ordered list of build operations
+
+    Role operations come first, from the top of the hierarchy down.
+    """
+    ops = []
+    roles = template.get('roles', [])
+    for i in role_hierarchy(template):
+        ops.append(BuildOp(f'role:{i}', 'role', ROUTE_CREATE_ROLE, roles[i]))
+
+    for i, category_data in enumerate(template.get('categories', [])):
+        category_key = f'category:{i}'
+        ops.append(BuildOp(category_key, 'category', ROUTE_CREATE_CHANNEL, category_data, position=i))
+        for j, channel_data in enumerate(category_data.get('channels', [])):
+            kind = 'voice' if channel_data.get('type') == 'voice' else 'text'
+            ops.append(BuildOp(f'channel:{i}:{j}', kind, ROUTE_CREATE_CHANNEL, channel_data,
+                               parent=category_key, position=j))
+    return ops
+
+
+def permission_value(permissions):
+    """Get the Permissions bitmask for saved role permissions.
+
+    Accepts the compact integer format as well as the legacy list of flag
+    names (unknown names are ignored).
+    """
+    if isinstance(permissions, int):
+        return permissions
+    value = 0
+    for perm in permissions or []:
+        flag = discord.Permissions.VALID_FLAGS.get(perm)
+        if flag is not None:
+            value |= flag
+    return value
+
+
+def role_permissions(permissions):
+    """Convert saved role permissions (bitmask or name list) to discord.Permissions"""
+    return discord.Permissions(permission_value(permissions))
+
+
+async def _create(guild, op, parent, reason):
+    """Perform the API call for a single build operation"""
+    data = op.data
+    if op.kind == 'role':
+        if op.permissions is not None:
+            permissions = discord.Permissions(op.permissions)
+        else:
+            permissions = role_permissions(data.get('permissions', []))
+        return await guild.create_role(
+            name=data['name'],
+            permissions=permissions,
+            reason=reason
+        )
+    if op.kind == 'category':
+        return await guild.create_category(name=data['name'], position=op.position, reason=reason)
+    if op.kind == 'voice':
+        return await guild.create_voice_channel(
+            name=data['name'],
+            category=parent,
+            position=op.position,
+            reason=reason
+        )
+
+    channel_kwargs = {
+        'name': data['name'],
+        'category': parent,
+        'position': op.position,
+        'reason': reason
+    }
+    # Add topic for text channels
+    if data.get('topic'):
+        channel_kwargs['topic'] = data['topic']
+    return await guild.create_text_channel(**channel_kwargs)
+
+
+async def order_roles(guild, roles, scheduler, reason=None):
+    """Put ``roles`` (top first) in hierarchy order with one bulk position update
+
+    The roles take the positions directly above @everyone; every other role
+    below the bot's top role keeps its relative order above them.
+    """
+    ordered = {role.id for role in roles}
+    top_role = guild.me.top_role
+    others = [role for role in guild.roles
+              if not role.is_default() and role < top_role and role.id not in ordered]
+    positions = {role: position for position, role in enumerate(list(reversed(roles)) + others, start=1)}
+    return await scheduler.call(ROUTE_EDIT_ROLE_POSITIONS, guild.id,
+                                lambda: guild.edit_role_positions(positions=positions, reason=reason),
+                                target='role hierarchy')
+
+
+def _kind_matches(obj, kind):
+    if kind == 'role':
+        return isinstance(obj, discord.Role)
+    if kind == 'category':
+        return isinstance(obj, discord.CategoryChannel)
+    if kind == 'voice':
+        return isinstance(obj, discord.VoiceChannel)
+    return isinstance(obj, discord.TextChannel)
+
+
+def _adoptable(guild, obj, keep_channel=None):
+    """Whether a build may take over ``obj``; the same objects cleanup leaves alone are excluded"""
+    if isinstance(obj, discord.Role):
+        return not (obj.is_default() or obj.managed or obj >= guild.me.top_role)
+    return keep_channel is None or obj.id != keep_channel.id
+
+
+def _find_existing(guild, op, parent, claimed, keep_channel=None):
+    """Find an unclaimed object that an interrupted run already created for ``op``"""
+    if op.kind == 'role':
+        candidates = guild.roles
+    elif op.kind == 'category':
+        candidates = guild.categories
+    else:
+        candidates = parent.channels if parent is not None else []
+    for obj in candidates:
+        if not _adoptable(guild, obj, keep_channel):
+            continue
+        if obj.id not in claimed and obj.name == op.data['name'] and _kind_matches(obj, op.kind):
+            return obj
+    return None
+
+
+async def execute_build(guild, ops, scheduler, reason=None, on_progress=None, done=None, adopt=False,
+                        on_roles_ordered=None, keep_channel=None):
+    """Run build operations concurrently, respecting parent dependencies.
+
+    ``on_progress(result, op)`` is awaited after every operation finishes,
+    whether it succeeded or not.  Failures are collected on the result rather
+    than aborting the build, matching the per-item error handling of the
+    original sequential loops.
+
+    When resuming, ``done`` maps op keys to the objects an earlier run
+    created; those ops are skipped.  With ``adopt`` an existing object with
+    the op's name, kind and parent is reused instead of created, covering ops
+    that finished just before the interruption was checkpointed.  Objects the
+    bot must not manage (``keep_channel``, @everyone, managed roles and roles
+    at or above the bot's top role) are never adopted.
+
+    Once every role op has finished, the created roles are ordered with
+    ``order_roles`` while categories and channels carry on;
+    ``on_roles_ordered(result)`` is awaited after that request, whether it
+    succeeded or not.
+    """
+    result = BuildResult(ops)
+    finished = {op.key: asyncio.Event() for op in ops}
+    if done:
+        result.created.update(done)
+        for key in done:
+            finished[key].set()
+    claimed = {obj.id for obj in result.created.values()}
+
+    # One trace span per group, from its first op starting to its last finishing
+    build_span = tracing.current_span()
+    group_spans = {}
+    group_remaining = {}
+    for op in ops:
+        if op.key not in result.created:
+            group = TRACE_GROUPS[op.kind]
+            group_remaining[group] = group_remaining.get(group, 0) + 1
+
+    def group_span(op):
+        group = TRACE_GROUPS[op.kind]
+        if group not in group_spans:
+            group_spans[group] = tracing.start_span(group, parent=build_span)
+        return group_spans[group]
+
+    def group_done(op):
+        group = TRACE_GROUPS[op.kind]
+        group_remaining[group] -= 1
+        if not group_remaining[group] and group in group_spans:
+            group_spans[group].finish()
+
+    async def run(op):
+        if op.key in result.created:
+            return
+        try:
+            parent = None
+            if op.parent:
+                await finished[op.parent].wait()
+                parent = result.created.get(op.parent)
+                if parent is None:
+                    raise RuntimeError(f"parent {op.parent} was not created")
+
+            created = _find_existing(guild, op, parent, claimed, keep_channel) if adopt else None
+            if created is None:
+                with tracing.use(group_span(op)):
+                    created = await scheduler.call(op.route, guild.id, lambda: _create(guild, op, parent, reason),
+                                                   target=op.data['name'])
+                print(f"Created {op.kind}: {op.data['name']}")
+                BUILD_OPERATIONS.inc(kind=op.kind, outcome='created')
+            else:
+                BUILD_OPERATIONS.inc(kind=op.kind, outcome='adopted')
+            claimed.add(created.id)
+            result.created[op.key] = created
+        except Exception as e:
+            result.failed.append((op, e))
+            BUILD_OPERATIONS.inc(kind=op.kind, outcome='failed')
+            print(f"Error creating {op.kind} {op.data.get('name')}: {e}")
+        finally:
+            finished[op.key].set()
+            group_done(op)
+
+        if on_progress:
+            try:
+                await on_progress(result, op)
+            except Exception as e:
+                print(f"Error reporting build progress: {e}")
+
+    async def order_created_roles():
+        for op in ops:
+            if op.kind == 'role':
+                await finished[op.key].wait()
+        roles = result.roles
+        if len(roles) < 2:
+            return
+        try:
+            await order_roles(guild, roles, scheduler, reason=reason)
+            print(f"Ordered {len(roles)} roles")
+        except Exception as e:
+            print(f"Error ordering roles: {e}")
+        if on_roles_ordered:
+            try:
+                await on_roles_ordered(result)
+            except Exception as e:
+                print(f"Error reporting build progress: {e}")
+
+    with BUILD_PHASE_SECONDS.time(phase='build'):
+        await asyncio.gather(order_created_roles(), *(run(op) for op in ops))
+    return result
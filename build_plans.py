@@ -0,0 +1,101 @@
+"""Precompiled, cached build plans.
+
+A template or saved build is compiled once into an immutable BuildPlan: the
+ordered build operations, role permissions as integer bitmasks and the
+component counts the embeds need.  Plans are cached by template name or
+build code, so repeated builds skip re-walking the template.
+"""
+from collections import OrderedDict
+from typing import NamedTuple
+
+from build_executor import build_ops, permission_value
+
+# Saved-build plans kept in memory; templates are few and always fit
+DEFAULT_PLAN_CACHE_SIZE = 256
+
+
+class BuildPlan(NamedTuple):
+    """Immutable, ready-to-run form of a template or saved build"""
+
+    key: str
+    server_name: str
+    ops: tuple
+    category_count: int
+    channel_count: int
+    role_count: int
+    # The source structure; sync mode and checkpoints still diff/store it
+    template: dict
+
+    @property
+    def counts(self):
+        """(categories, channels, roles) as shown in the deploy embeds"""
+        return (self.category_count, self.channel_count, self.role_count)
+
+
+def compile_plan(template, key=None):
+    """Compile a template or saved build into a BuildPlan"""
+    ops = build_ops(template)
+    for op in ops:
+        if op.kind == 'role':
+            op.permissions = permission_value(op.data.get('permissions', []))
+
+    categories = template.get('categories', [])
+    return BuildPlan(
+        key=key,
+        server_name=template.get('server_name'),
+        ops=tuple(ops),
+        category_count=len(categories),
+        channel_count=sum(len(cat.get('channels', [])) for cat in categories),
+        role_count=len(template.get('roles', [])),
+        template=template
+    )
+
+
+class PlanCache:
+    """LRU cache of compiled plans keyed by template name or build code.
+
+    Templates and saved builds do not change once loaded, so entries only
+    go away when evicted or explicitly invalidated (e.g. a removed build).
+    """
+
+    def __init__(self, max_size=DEFAULT_PLAN_CACHE_SIZE):
+        self.max_size = max_size
+        self._plans = OrderedDict()
+
+    def get(self, key, load):
+        """Get the plan for ``key``, compiling ``load()`` on a miss.
+
+        ``load`` returns the template or saved build, or None if it does not
+        exist (None is returned and nothing is cached).
+        """
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+            return plan
+
+        template = load()
+        if template is None:
+            return None
+        plan = compile_plan(template, key)
+        self._plans[key] = plan
+        self._plans.move_to_end(key)
+        while len(self._plans) > self.max_size:
+            self._plans.popitem(last=False)
+        return plan
+
+    def __contains__(self, key):
+        return key in self._plans
+
+    def plans(self):
+        """The cached plans, least recently used first"""
+        return list(self._plans.values())
+
+    def invalidate(self, key=None):
+        """Drop one cached plan, or all of them"""
+        if key is None:
+            self._plans.clear()
+        else:
+            self._plans.pop(key, None)
+
+    def __len__(self):
+        return len(self._plans)
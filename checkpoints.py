@@ -0,0 +1,123 @@
+"""Checkpoints for resumable build jobs.
+
+Each running deployment keeps a compact checkpoint per guild: the target
+structure it is building, the current phase, the ids the cleanup phase
+still has to delete and the ids of every object created so far.  The
+checkpoints are persisted write-behind to a small JSON file, so a restart
+in the middle of a build can pick up from the last completed step instead
+of wiping and rebuilding the whole guild again.  Only the parts that change
+during a build are copied on the event loop; the target structure never
+changes once a checkpoint begins, so it is shared with the writer thread,
+which does all of the JSON encoding.
+"""
+import json
+import time
+
+from persistence import WriteBehindWorker, atomic_write
+
+DEFAULT_CHECKPOINT_PATH = 'build_checkpoints.json'
+
+# Checkpoints are small and losing the last few steps is recoverable
+# (resumed builds adopt matching objects), so flush quickly
+CHECKPOINT_FLUSH_DELAY = 0.25
+
+PHASE_RENAME = 'rename'
+PHASE_CLEANUP = 'cleanup'
+PHASE_BUILD = 'build'
+PHASE_SYNC = 'sync'
+
+
+class CheckpointStore:
+    """Per-guild build checkpoints persisted to a JSON file"""
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH):
+        self.path = path
+        self.checkpoints = self._load()
+        self.writer = WriteBehindWorker('build checkpoints', self._snapshot, self._write,
+                                        delay=CHECKPOINT_FLUSH_DELAY)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return {int(guild_id): checkpoint for guild_id, checkpoint in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"Error: Invalid build checkpoints in {self.path} ({e}), ignoring them")
+            return {}
+
+    def _snapshot(self):
+        """Copy the checkpoints so they can be serialized off the loop"""
+        return {
+            str(guild_id): dict(checkpoint, deleted=list(checkpoint['deleted']), created=dict(checkpoint['created']))
+            for guild_id, checkpoint in self.checkpoints.items()
+        }
+
+    def _write(self, checkpoints):
+        data = json.dumps(checkpoints, ensure_ascii=False, separators=(',', ':'))
+        atomic_write(self.path, data.encode('utf-8'))
+
+    def _changed(self):
+        self.writer.mark_dirty()
+        if not self.writer.running:
+            self.writer.flush_sync()
+
+    def get(self, guild_id):
+        """Get the unfinished checkpoint for a guild, if any"""
+        return self.checkpoints.get(guild_id)
+
+    def pending(self):
+        """All unfinished checkpoints"""
+        return list(self.checkpoints.values())
+
+    def begin(self, guild_id, template, mode, lang, channel_id=None, message_id=None, keep_channel_id=None):
+        """Start a checkpoint for a new deployment"""
+        checkpoint = {
+            'guild_id': guild_id,
+            'template': template,
+            'mode': mode,
+            'lang': lang,
+            'channel_id': channel_id,
+            'message_id': message_id,
+            'keep_channel_id': keep_channel_id,
+            'phase': PHASE_RENAME,
+            'cleanup': None,
+            'deleted': [],
+            'created': {},
+            'started_at': time.time()
+        }
+        self.checkpoints[guild_id] = checkpoint
+        self._changed()
+        return checkpoint
+
+    def set_phase(self, guild_id, phase):
+        self.checkpoints[guild_id]['phase'] = phase
+        self._changed()
+
+    def set_cleanup_plan(self, guild_id, plan):
+        """Record the ids the cleanup phase is going to delete"""
+        self.checkpoints[guild_id]['cleanup'] = {
+            'channels': [c.id for c in plan.channels],
+            'categories': [c.id for c in plan.categories],
+            'roles': [r.id for r in plan.roles]
+        }
+        self._changed()
+
+    def mark_deleted(self, guild_id, item):
+        self.checkpoints[guild_id]['deleted'].append(item['id'])
+        self._changed()
+
+    def mark_created(self, guild_id, op_key, object_id):
+        self.checkpoints[guild_id]['created'][op_key] = object_id
+        self._changed()
+
+    def finish(self, guild_id):
+        """Drop a guild's checkpoint once its deployment has ended"""
+        if self.checkpoints.pop(guild_id, None) is not None:
+            self._changed()
+
+    def start(self):
+        self.writer.start()
+
+    async def shutdown(self):
+        await self.writer.stop()
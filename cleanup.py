@@ -0,0 +1,142 @@
+"""Parallel cleanup engine for removing a guild's existing structure.
+
+The deletion plan is snapshotted up front, so the guild cache changing while
+deletes are in flight does not affect what gets removed.  Channels inside
+categories go first, then the categories themselves, while roles below the
+bot's top role are removed alongside them.  Every delete goes through the
+shared RouteScheduler, which bounds parallelism and honors 429 retry-after.
+"""
+import asyncio
+
+import discord
+
+import tracing
+from build_executor import ROUTE_DELETE_CHANNEL, ROUTE_DELETE_ROLE
+from metrics import BUILD_PHASE_SECONDS
+
+
+class CleanupPlan:
+    """Snapshot of the channels, categories and roles to delete"""
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.channels = []
+        self.categories = []
+        self.roles = []
+        self.skipped = []
+
+    @property
+    def total(self):
+        return len(self.channels) + len(self.categories) + len(self.roles)
+
+
+class CleanupReport:
+    """Structured outcome of a cleanup run"""
+
+    def __init__(self):
+        self.deleted = []
+        self.skipped = []
+        self.failed = []
+
+    def _count(self, *kinds):
+        return sum(1 for item in self.deleted if item['kind'] in kinds)
+
+    @property
+    def deleted_channels(self):
+        """Number of deleted channels and categories"""
+        return self._count('channel', 'category')
+
+    @property
+    def deleted_roles(self):
+        return self._count('role')
+
+
+def _item(kind, obj, **extra):
+    item = {'kind': kind, 'id': obj.id, 'name': obj.name}
+    item.update(extra)
+    return item
+
+
+def plan_cleanup(guild, keep_channel=None, include_roles=True, categorized_only=False):
+    """Snapshot what a cleanup of ``guild`` should delete.
+
+    ``keep_channel`` is never deleted (usually the command channel).  With
+    ``categorized_only`` only channels inside a category are removed, which is
+    what ``!deletebuild`` has always done.
+    """
+    plan = CleanupPlan(guild.id)
+
+    for channel in list(guild.channels):
+        if keep_channel is not None and channel.id == keep_channel.id:
+            plan.skipped.append(_item('channel', channel, reason='command channel'))
+        elif isinstance(channel, discord.CategoryChannel):
+            plan.categories.append(channel)
+        elif categorized_only and channel.category_id is None:
+            plan.skipped.append(_item('channel', channel, reason='not in a category'))
+        else:
+            plan.channels.append(channel)
+
+    if include_roles:
+        top_role = guild.me.top_role
+        for role in list(guild.roles):
+            if role.is_default() or role == top_role:
+                continue
+            if role.managed:
+                plan.skipped.append(_item('role', role, reason='managed by an integration'))
+            elif role >= top_role:
+                plan.skipped.append(_item('role', role, reason='above the bot\'s top role'))
+            else:
+                plan.roles.append(role)
+
+    return plan
+
+
+def plan_from_ids(guild, channel_ids=(), category_ids=(), role_ids=()):
+    """Rebuild a cleanup plan from recorded ids, e.g. when resuming a checkpoint.
+
+    Ids that no longer resolve have already been deleted and are dropped.
+    """
+    plan = CleanupPlan(guild.id)
+    plan.channels = [c for c in map(guild.get_channel, channel_ids) if c is not None]
+    plan.categories = [c for c in map(guild.get_channel, category_ids) if c is not None]
+    plan.roles = [r for r in map(guild.get_role, role_ids) if r is not None]
+    return plan
+
+
+async def execute_cleanup(plan, scheduler, reason=None, on_deleted=None):
+    """Run a cleanup plan with bounded parallelism and return a CleanupReport
+
+    ``on_deleted(item)`` is called after each successful delete.
+    """
+    report = CleanupReport()
+    report.skipped.extend(plan.skipped)
+
+    async def delete(kind, route, obj):
+        try:
+            await scheduler.call(route, plan.guild_id, lambda: obj.delete(reason=reason), target=obj.name)
+            item = _item(kind, obj)
+            report.deleted.append(item)
+            if on_deleted:
+                on_deleted(item)
+        except discord.NotFound:
+            report.skipped.append(_item(kind, obj, reason='already deleted'))
+        except Exception as e:
+            report.failed.append(_item(kind, obj, error=str(e)))
+            print(f"Error deleting {kind} {obj.name}: {e}")
+
+    async def delete_channels():
+        # Children first so categories are empty by the time they go
+        with tracing.span('channels'):
+            await asyncio.gather(*(delete('channel', ROUTE_DELETE_CHANNEL, c) for c in plan.channels))
+        with tracing.span('categories'):
+            await asyncio.gather(*(delete('category', ROUTE_DELETE_CHANNEL, c) for c in plan.categories))
+
+    async def delete_roles():
+        with tracing.span('roles'):
+            await asyncio.gather(*(delete('role', ROUTE_DELETE_ROLE, r) for r in plan.roles))
+
+    with BUILD_PHASE_SECONDS.time(phase='cleanup'):
+        await asyncio.gather(delete_channels(), delete_roles())
+    print(f"Deleted {report.deleted_channels} channels/categories and {report.deleted_roles} roles "
+          f"({len(report.skipped)} skipped, {len(report.failed)} failed)")
+    return report
@@ -0,0 +1,156 @@
+"""Run Server Builder Pro as a cluster of shard worker processes.
+
+Splits the bot's shards into contiguous ranges and runs one ``bot.py``
+process per range, so gateway events and builds are spread across CPU
+cores.  Workers share the SQLite build store and settings database; each
+keeps its own build checkpoint file, since a guild always lands on the
+same cluster while the shard and cluster counts stay the same.
+
+Usage: ``python cluster.py``.  ``SHARD_COUNT`` defaults to Discord's
+recommendation and ``CLUSTERS`` to the number of CPU cores.  Crashed
+workers are restarted with a backoff.
+"""
+import json
+import math
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from dotenv import load_dotenv
+
+from sharding import format_shard_ids, shard_ranges
+
+GATEWAY_BOT_URL = 'https://discord.com/api/v10/gateway/bot'
+
+# Discord allows one IDENTIFY per 5 seconds per max_concurrency bucket
+IDENTIFY_INTERVAL = 5.0
+
+RESTART_BACKOFF = 5.0
+MAX_RESTART_BACKOFF = 60.0
+# A worker that ran this long before exiting gets its backoff reset
+STABLE_UPTIME = 300.0
+
+
+def fetch_gateway_info(token):
+    """Get the recommended shard count and identify concurrency from Discord"""
+    request = urllib.request.Request(GATEWAY_BOT_URL, headers={
+        'Authorization': f'Bot {token}',
+        'User-Agent': 'DiscordBot (https://github.com/Rapptz/discord.py, cluster launcher)'
+    })
+    with urllib.request.urlopen(request, timeout=30) as response:
+        data = json.load(response)
+    return data['shards'], data.get('session_start_limit', {}).get('max_concurrency', 1)
+
+
+class Worker:
+    """One bot.py process running a range of shards"""
+
+    def __init__(self, cluster_id, shard_ids, shard_count):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+        self.started_at = None
+        self.backoff = RESTART_BACKOFF
+        self.restart_at = None
+
+    def environment(self):
+        env = dict(os.environ)
+        env['SHARD_COUNT'] = str(self.shard_count)
+        env['SHARD_IDS'] = format_shard_ids(self.shard_ids)
+        env['CLUSTER_ID'] = str(self.cluster_id)
+        env.setdefault('CHECKPOINT_PATH', 'build_checkpoints.json')
+        root, ext = os.path.splitext(env['CHECKPOINT_PATH'])
+        env['CHECKPOINT_PATH'] = f"{root}.cluster{self.cluster_id}{ext}"
+        env.setdefault('TRACE_PATH', 'build_traces.jsonl')
+        root, ext = os.path.splitext(env['TRACE_PATH'])
+        env['TRACE_PATH'] = f"{root}.cluster{self.cluster_id}{ext}"
+        if env.get('METRICS_PORT'):
+            # One metrics port per worker, counting up from METRICS_PORT
+            env['METRICS_PORT'] = str(int(env['METRICS_PORT']) + self.cluster_id)
+        return env
+
+    def start(self):
+        print(f"🚀 Starting cluster {self.cluster_id} (shards {format_shard_ids(self.shard_ids)})")
+        self.process = subprocess.Popen([sys.executable, 'bot.py'], env=self.environment())
+        self.started_at = time.monotonic()
+        self.restart_at = None
+
+    def check(self):
+        """Restart the worker if it crashed and its backoff has passed"""
+        if self.process is None:
+            return
+        code = self.process.poll()
+        if code is None:
+            return
+        now = time.monotonic()
+        if self.restart_at is None:
+            if now - self.started_at >= STABLE_UPTIME:
+                self.backoff = RESTART_BACKOFF
+            print(f"⚠️ Cluster {self.cluster_id} exited with code {code}, restarting in {self.backoff:.0f}s")
+            self.restart_at = now + self.backoff
+            self.backoff = min(self.backoff * 2, MAX_RESTART_BACKOFF)
+        elif now >= self.restart_at:
+            self.start()
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+
+def main():
+    load_dotenv()
+    token = os.getenv('DISCORD_TOKEN')
+    if not token:
+        print("❌ DISCORD_TOKEN not found in environment variables!")
+        return 1
+    if os.getenv('BUILD_STORE_BACKEND', 'sqlite') != 'sqlite':
+        # The JSON store is a single in-memory file per process and would be overwritten
+        print("❌ Clustering needs BUILD_STORE_BACKEND=sqlite so workers can share saved builds")
+        return 1
+
+    recommended, max_concurrency = fetch_gateway_info(token)
+    shard_count = int(os.getenv('SHARD_COUNT') or recommended)
+    clusters = int(os.getenv('CLUSTERS') or os.cpu_count() or 1)
+    workers = [Worker(i, shard_ids, shard_count) for i, shard_ids in enumerate(shard_ranges(shard_count, clusters))]
+    print(f"📊 {shard_count} shards across {len(workers)} clusters")
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    for worker in workers:
+        if stopping:
+            break
+        worker.start()
+        # Let this cluster identify its shards before the next one starts
+        time.sleep(math.ceil(len(worker.shard_ids) / max_concurrency) * IDENTIFY_INTERVAL)
+
+    while not stopping:
+        for worker in workers:
+            worker.check()
+        time.sleep(1)
+
+    print("🛑 Stopping clusters...")
+    for worker in workers:
+        worker.stop()
+    for worker in workers:
+        if worker.process is None:
+            continue
+        try:
+            worker.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            worker.process.kill()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
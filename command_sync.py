@@ -0,0 +1,67 @@
+"""Hash-gated slash command sync.
+
+Syncing the command tree is a rate-limited global API call, so instead of
+syncing on every start the bot hashes the commands it would send and
+compares that with the hash recorded at the last successful sync.  Only a
+changed tree is synced.  Hashes are stored per scope (global or one guild)
+in a small JSON file.
+"""
+import hashlib
+import json
+
+from persistence import atomic_write
+
+DEFAULT_SYNC_STATE_PATH = 'command_sync.json'
+
+
+def tree_hash(tree, guild=None):
+    """Stable hash of the command payloads a sync would send"""
+    payload = sorted(
+        (command.to_dict() for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get('type', 1), command['name'])
+    )
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _scope(guild):
+    return 'global' if guild is None else f'guild:{guild.id}'
+
+
+class CommandSyncState:
+    """Last synced command tree hash per scope"""
+
+    def __init__(self, path=DEFAULT_SYNC_STATE_PATH):
+        self.path = path
+        self.hashes = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError as e:
+            print(f"Error: Invalid command sync state in {self.path} ({e}), will resync")
+            return {}
+
+    def needs_sync(self, tree, guild=None):
+        return self.hashes.get(_scope(guild)) != tree_hash(tree, guild)
+
+    async def sync(self, tree, guild=None, force=False):
+        """Sync the tree to Discord if it changed since the last sync.
+
+        Returns the synced commands, or None if the sync was skipped.
+        """
+        current = tree_hash(tree, guild)
+        if not force and self.hashes.get(_scope(guild)) == current:
+            return None
+
+        synced = await tree.sync(guild=guild)
+        self.hashes[_scope(guild)] = current
+        try:
+            atomic_write(self.path, json.dumps(self.hashes, indent=2).encode('utf-8'))
+        except OSError as e:
+            # Worst case the next start syncs once more
+            print(f"Error saving command sync state: {e}")
+        return synced
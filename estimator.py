@@ -0,0 +1,196 @@
+"""Request-count and duration estimates for deployments.
+
+Before a build starts, the estimator predicts how many requests each
+rate-limit route will see: deletes from the cleanup plan and creates from
+the build plan for a rebuild, or the diff operations for a sync.  Each
+phase runs its routes in parallel, so a phase takes as long as its slowest
+route (requests / throughput), and phases run one after another.
+
+Throughput per route comes from a ThroughputModel: conservative defaults
+at first, then an exponential moving average of what finished builds
+actually achieved.  While a build runs its ``BuildEstimate`` is told about
+each completed request, so the remaining time is recomputed from the rate
+this build is getting rather than the historical one.  Learned rates are
+kept in memory and start from the defaults again after a restart.
+"""
+import time
+
+from build_executor import (
+    ROUTE_CREATE_CHANNEL,
+    ROUTE_CREATE_ROLE,
+    ROUTE_DELETE_CHANNEL,
+    ROUTE_DELETE_ROLE,
+    ROUTE_EDIT_CHANNEL,
+    ROUTE_EDIT_ROLE,
+    ROUTE_EDIT_ROLE_POSITIONS,
+)
+from reconcile import op_route
+
+ROUTE_EDIT_GUILD = 'PATCH /guilds/{guild_id}'
+
+# Requests per second per route for one guild before anything was observed
+DEFAULT_ROUTE_RATES = {
+    ROUTE_CREATE_ROLE: 1.5,
+    ROUTE_CREATE_CHANNEL: 2.0,
+    ROUTE_DELETE_ROLE: 2.0,
+    ROUTE_DELETE_CHANNEL: 2.5,
+    ROUTE_EDIT_ROLE: 2.0,
+    ROUTE_EDIT_CHANNEL: 2.0,
+    ROUTE_EDIT_GUILD: 2.0,
+    ROUTE_EDIT_ROLE_POSITIONS: 2.0,
+}
+DEFAULT_ROUTE_RATE = 1.0
+
+# Weight of a new observation in the moving average
+LEARNING_RATE = 0.3
+
+# Completions and seconds of activity needed before a route's live rate
+# replaces the learned one; shorter runs mostly measure the initial burst
+# a rate-limit bucket allows, not its sustained rate
+MIN_SAMPLES = 5
+MIN_LIVE_SECONDS = 1.0
+
+# Only runs at least this long on a route are learned from
+MIN_LEARN_SECONDS = 2.0
+
+# Even a single request takes about this long
+MIN_PHASE_SECONDS = 0.3
+
+
+class ThroughputModel:
+    """Learned requests-per-second for each rate-limit route"""
+
+    def __init__(self, defaults=None):
+        self.rates = dict(DEFAULT_ROUTE_RATES if defaults is None else defaults)
+        self.samples = {}
+
+    def rate(self, route):
+        return self.rates.get(route, DEFAULT_ROUTE_RATE)
+
+    def observe(self, route, rate):
+        """Fold an observed rate into the moving average"""
+        if rate <= 0:
+            return
+        if route in self.samples:
+            self.rates[route] = (1 - LEARNING_RATE) * self.rate(route) + LEARNING_RATE * rate
+        else:
+            # The first real observation replaces the default outright
+            self.rates[route] = rate
+        self.samples[route] = self.samples.get(route, 0) + 1
+
+    def learn(self, estimate):
+        """Learn from the rates a finished build achieved"""
+        for route in estimate.completed:
+            rate = estimate.live_rate(route, min_seconds=MIN_LEARN_SECONDS)
+            if rate is not None:
+                self.observe(route, rate)
+
+
+class BuildEstimate:
+    """Expected requests per phase and route, refined as requests complete"""
+
+    def __init__(self, phases, model):
+        self.phases = [(name, {route: count for route, count in routes.items() if count}) for name, routes in phases]
+        self.model = model
+        self.completed = {}
+        self._first = {}
+        self._last = {}
+        self.started_at = None
+        self.seconds = self._seconds({})
+
+    @property
+    def requests(self):
+        """Expected request count per route across all phases"""
+        totals = {}
+        for _, routes in self.phases:
+            for route, count in routes.items():
+                totals[route] = totals.get(route, 0) + count
+        return totals
+
+    @property
+    def total_requests(self):
+        return sum(self.requests.values())
+
+    def start(self):
+        self.started_at = time.monotonic()
+
+    def complete(self, route):
+        """Record one finished request on ``route``"""
+        now = time.monotonic()
+        self.completed[route] = self.completed.get(route, 0) + 1
+        self._first.setdefault(route, now)
+        self._last[route] = now
+
+    def live_rate(self, route, min_seconds=MIN_LIVE_SECONDS):
+        """Requests per second this build is getting on ``route``, once there are enough samples"""
+        count = self.completed.get(route, 0)
+        if count < MIN_SAMPLES:
+            return None
+        elapsed = self._last[route] - self._first[route]
+        return (count - 1) / elapsed if elapsed >= min_seconds else None
+
+    def _rate(self, route):
+        live = self.live_rate(route)
+        return live if live is not None else self.model.rate(route)
+
+    def _seconds(self, completed):
+        total = 0.0
+        for _, routes in self.phases:
+            phase = 0.0
+            for route, count in routes.items():
+                remaining = count - completed.get(route, 0)
+                if remaining > 0:
+                    phase = max(phase, MIN_PHASE_SECONDS, remaining / self._rate(route))
+            total += phase
+        return total
+
+    def remaining(self):
+        """Seconds left, from the requests not yet completed"""
+        if not self.completed and self.started_at is not None:
+            # Nothing is reported for this deployment (e.g. a sync), so count down instead
+            return max(0.0, self.seconds - (time.monotonic() - self.started_at))
+        return self._seconds(self.completed)
+
+
+def estimate_rebuild(cleanup_plan, plan, rename, model):
+    """Estimate a full rebuild: rename, delete the cleanup plan, create every plan op"""
+    creates = {}
+    for op in plan.ops:
+        creates[op.route] = creates.get(op.route, 0) + 1
+    # The roles are ordered in one request once they all exist
+    creates[ROUTE_EDIT_ROLE_POSITIONS] = 1 if plan.role_count > 1 else 0
+    return BuildEstimate([
+        ('rename', {ROUTE_EDIT_GUILD: 1 if rename else 0}),
+        ('cleanup', {
+            ROUTE_DELETE_CHANNEL: len(cleanup_plan.channels) + len(cleanup_plan.categories),
+            ROUTE_DELETE_ROLE: len(cleanup_plan.roles),
+        }),
+        ('build', creates),
+    ], model)
+
+
+def estimate_sync(ops, rename, model):
+    """Estimate a sync from its diff operations, in apply_sync's three stages"""
+    stages = [('roles and categories', {}), ('channels', {}), ('empty categories', {})]
+    for op in ops:
+        if op['kind'] in ('text', 'voice'):
+            stage = 1
+        elif op['kind'] == 'category' and op['action'] == 'delete':
+            stage = 2
+        else:
+            stage = 0
+        route = op_route(op)
+        changes = stages[stage][1]
+        changes[route] = changes.get(route, 0) + 1
+    return BuildEstimate([('rename', {ROUTE_EDIT_GUILD: 1 if rename else 0})] + stages, model)
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
@@ -0,0 +1,579 @@
+"""In-process stand-in for the Discord REST API.
+
+``FakeDiscord`` serves the REST endpoints the bot uses (login, guild edit,
+role and channel create/edit/delete, member fetch, message send/edit,
+reactions, interaction responses and followups) from a local aiohttp
+server and points discord.py's ``Route.BASE`` at it.  Successful mutations
+are fed back into the attached client's connection state the way gateway
+events would be, so guild caches stay in sync without a websocket.  User
+messages, reactions and slash commands are delivered the same way
+(``post_message``, ``add_user_reaction``, ``invoke_slash``), so tests drive
+the bot through its real command handlers.
+
+It can add latency, enforce per-route rate-limit buckets that answer with
+429s, inject failures, and records every request for later assertions.
+
+``python fake_discord.py`` runs a scripted offline smoke run: a full build,
+a sync, a save and a cleanup against a fake guild.
+"""
+import asyncio
+import datetime
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web
+from discord.http import Route
+from discord.webhook.async_ import Route as WebhookRoute
+
+API_PREFIX = '/api/v10'
+
+DISCORD_EPOCH = 1420070400000
+
+CHANNEL_TEXT = 0
+CHANNEL_VOICE = 2
+CHANNEL_CATEGORY = 4
+
+INTERACTION_APPLICATION_COMMAND = 2
+COMMAND_OPTION_STRING = 3
+
+# Every permission bit discord.py knows about, as sent for an owner's interactions
+PERMISSIONS_ALL = (1 << 53) - 1
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py only decodes bodies whose content type is exactly application/json
+    return web.Response(body=json.dumps(data).encode('utf-8'), status=status, headers=headers,
+                        content_type='application/json')
+
+
+def _now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+class RateLimitBucket:
+    """Fixed-window request budget for one route and major parameter"""
+
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self.window_start = 0.0
+        self.count = 0
+
+    def take(self, now):
+        """Use one request; returns seconds to wait if the bucket is exhausted, else None"""
+        if now - self.window_start >= self.per:
+            self.window_start = now
+            self.count = 0
+        if self.count >= self.limit:
+            return self.window_start + self.per - now
+        self.count += 1
+        return None
+
+    def headers(self, now, bucket_hash):
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(max(0, self.limit - self.count)),
+            'X-RateLimit-Reset-After': f"{max(0.0, self.window_start + self.per - now):.3f}",
+            'X-RateLimit-Bucket': bucket_hash,
+        }
+
+
+class FakeDiscord:
+    """Local fake of the Discord REST API for offline builds and benchmarks.
+
+    ``latency`` is the delay added to every request (a number, or a
+    ``(min, max)`` range); ``rate_limits`` maps route keys such as
+    ``'POST /guilds/{guild_id}/channels'`` to ``(limit, per_seconds)``.
+    """
+
+    def __init__(self, latency=0.0, rate_limits=None, seed=0):
+        self.latency = latency
+        self.rate_limits = dict(rate_limits or {})
+        self.requests = []
+        self.rate_limited = 0
+        self.guilds = {}
+        self.channels = {}
+        self.messages = {}
+        # Interaction token -> channel id, and -> original response message
+        self.interactions = {}
+        self.original_responses = {}
+        self.state = None
+        self.port = None
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._buckets = {}
+        self._failures = []
+        self._runner = None
+        self._original_base = None
+        self.user = self._user('Builder Bot', bot=True)
+        self.application_id = self.snowflake()
+
+    # Ids and payloads
+
+    def snowflake(self):
+        return str(((int(time.time() * 1000) - DISCORD_EPOCH) << 22) | (next(self._ids) & 0x3FFFFF))
+
+    def _user(self, name, bot=False):
+        return {'id': self.snowflake(), 'username': name, 'discriminator': '0000', 'global_name': None,
+                'avatar': None, 'bot': bot}
+
+    def _role(self, guild_id, name, permissions=0, position=1, managed=False, role_id=None):
+        return {'id': role_id or self.snowflake(), 'name': name, 'permissions': str(permissions),
+                'position': position, 'color': 0, 'hoist': False, 'managed': managed,
+                'mentionable': False, 'icon': None, 'unicode_emoji': None, 'flags': 0}
+
+    def _channel(self, guild_id, name, channel_type, position=0, parent_id=None, topic=None):
+        channel = {'id': self.snowflake(), 'type': channel_type, 'guild_id': guild_id, 'name': name,
+                   'position': position, 'parent_id': parent_id, 'permission_overwrites': [],
+                   'nsfw': False, 'flags': 0}
+        if channel_type == CHANNEL_TEXT:
+            channel.update(topic=topic, rate_limit_per_user=0, last_message_id=None)
+        elif channel_type == CHANNEL_VOICE:
+            channel.update(bitrate=64000, user_limit=0, rtc_region=None)
+        return channel
+
+    def _member(self, user, roles=()):
+        return {'user': user, 'roles': list(roles), 'joined_at': _now_iso(), 'deaf': False, 'mute': False,
+                'flags': 0, 'nick': None, 'avatar': None, 'premium_since': None, 'pending': False}
+
+    def _guild_payload(self, guild):
+        return {'id': guild['id'], 'name': guild['name'], 'owner_id': guild['owner']['id'],
+                'roles': list(guild['roles'].values()), 'emojis': [], 'stickers': [], 'features': [],
+                'icon': None, 'splash': None, 'banner': None, 'description': None,
+                'verification_level': 0, 'default_message_notifications': 0, 'explicit_content_filter': 0,
+                'mfa_level': 0, 'premium_tier': 0, 'preferred_locale': 'en-US', 'nsfw_level': 0,
+                'system_channel_id': None, 'rules_channel_id': None, 'public_updates_channel_id': None,
+                'afk_channel_id': None, 'afk_timeout': 300, 'max_members': 500000,
+                'member_count': len(guild['members'])}
+
+    # Guild setup
+
+    def create_guild(self, name='Test Server', channels=('general',)):
+        """Create a guild with a few text channels, the bot and an owner; returns its id"""
+        guild_id = self.snowflake()
+        owner = self._user('Owner')
+        everyone = self._role(guild_id, '@everyone', permissions=0, position=0, role_id=guild_id)
+        # Real bots get a managed integration role; keep it above the 250 roles a guild can hold
+        bot_role = self._role(guild_id, 'Builder Bot', permissions=8, position=251, managed=True)
+        guild = {
+            'id': guild_id,
+            'name': name,
+            'owner': owner,
+            'roles': {everyone['id']: everyone, bot_role['id']: bot_role},
+            'members': {owner['id']: self._member(owner), self.user['id']: self._member(self.user, [bot_role['id']])},
+            'channels': {}
+        }
+        self.guilds[guild_id] = guild
+        for position, channel_name in enumerate(channels):
+            channel = self._channel(guild_id, channel_name, CHANNEL_TEXT, position=position)
+            guild['channels'][channel['id']] = channel
+            self.channels[channel['id']] = channel
+        if self.state is not None:
+            self._add_to_state(guild)
+        return guild_id
+
+    def _add_to_state(self, guild):
+        data = self._guild_payload(guild)
+        data['channels'] = list(guild['channels'].values())
+        data['members'] = list(guild['members'].values())
+        self.state._add_guild_from_data(data)
+
+    def attach(self, client):
+        """Feed state changes into a logged-in client's cache, like gateway events would"""
+        self.state = client._connection
+        for guild in self.guilds.values():
+            self._add_to_state(guild)
+
+    def _dispatch(self, event, data):
+        if self.state is not None:
+            getattr(self.state, f'parse_{event}')(data)
+
+    # User input, delivered like gateway events
+
+    def _author(self, guild_id, user_id=None):
+        guild = self.guilds[guild_id]
+        return guild['members'][user_id or guild['owner']['id']]
+
+    def post_message(self, channel_id, content, user_id=None):
+        """Have a member (default: the guild owner) send ``content``; returns the message id"""
+        channel = self.channels[channel_id]
+        member = self._author(channel['guild_id'], user_id)
+        message = self._message(channel, {'content': content}, member['user'])
+        member_data = {key: value for key, value in member.items() if key != 'user'}
+        self._dispatch('message_create', dict(message, member=member_data))
+        return message['id']
+
+    def add_user_reaction(self, message_id, emoji, user_id=None):
+        """Have a member (default: the guild owner) react to a message"""
+        message = self.messages[message_id]
+        member = self._author(message['guild_id'], user_id)
+        self._dispatch('message_reaction_add', {
+            'user_id': member['user']['id'], 'channel_id': message['channel_id'], 'message_id': message_id,
+            'guild_id': message['guild_id'], 'emoji': {'id': None, 'name': emoji}, 'member': member,
+            'burst': False, 'type': 0,
+        })
+
+    def invoke_slash(self, channel_id, name, options=None, user_id=None):
+        """Have a member (default: the guild owner) run a slash command; returns the interaction token"""
+        channel = self.channels[channel_id]
+        member = self._author(channel['guild_id'], user_id)
+        token = f"fake-interaction-{self.snowflake()}"
+        self.interactions[token] = channel_id
+        self._dispatch('interaction_create', {
+            'id': self.snowflake(), 'application_id': self.application_id, 'token': token, 'version': 1,
+            'type': INTERACTION_APPLICATION_COMMAND, 'guild_id': channel['guild_id'], 'channel_id': channel_id,
+            'channel': {'id': channel_id, 'type': channel['type']}, 'locale': 'en-US',
+            'member': dict(member, permissions=str(PERMISSIONS_ALL)), 'app_permissions': str(PERMISSIONS_ALL),
+            'data': {
+                'id': self.snowflake(), 'name': name, 'type': 1,
+                'options': [{'name': key, 'type': COMMAND_OPTION_STRING, 'value': value}
+                            for key, value in (options or {}).items()],
+            },
+        })
+        return token
+
+    # Test controls
+
+    def fail(self, route, status=500, times=1, code=0, message='Injected failure', retry_after=0.05):
+        """Make the next ``times`` requests to ``route`` fail with ``status``; 429s carry ``retry_after``"""
+        self._failures.append({'route': route, 'status': status, 'times': times, 'code': code,
+                               'message': message, 'retry_after': retry_after})
+
+    def calls(self, route=None):
+        """Recorded requests, optionally only those for one route key"""
+        return [request for request in self.requests if route is None or request['route'] == route]
+
+    def count(self, route=None, status=None):
+        return sum(1 for request in self.calls(route) if status is None or request['status'] == status)
+
+    def assert_sequence(self, *routes):
+        """Assert the given route keys were requested in this order (other requests may interleave)"""
+        remaining = iter(request['route'] for request in self.requests)
+        for route in routes:
+            if not any(seen == route for seen in remaining):
+                raise AssertionError(f"{route} was not requested after the routes before it in {routes}")
+
+    def reset_log(self):
+        self.requests.clear()
+        self.rate_limited = 0
+
+    # Server
+
+    async def start(self):
+        """Serve on a free local port and point discord.py at it"""
+        app = web.Application(middlewares=[self._middleware])
+        self._add_routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._original_base = (Route.BASE, WebhookRoute.BASE)
+        Route.BASE = WebhookRoute.BASE = f'http://127.0.0.1:{self.port}{API_PREFIX}'
+        return self
+
+    async def stop(self):
+        if self._original_base is not None:
+            Route.BASE, WebhookRoute.BASE = self._original_base
+            self._original_base = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def _add_routes(self, app):
+        routes = [
+            ('GET', '/users/@me', self.get_me),
+            ('GET', '/oauth2/applications/@me', self.get_application),
+            ('PUT', '/applications/{application_id}/commands', self.put_commands),
+            ('PUT', '/applications/{application_id}/guilds/{guild_id}/commands', self.put_commands),
+            ('PATCH', '/guilds/{guild_id}', self.edit_guild),
+            ('GET', '/guilds/{guild_id}/members/{user_id}', self.get_member),
+            ('POST', '/guilds/{guild_id}/roles', self.create_role),
+            ('PATCH', '/guilds/{guild_id}/roles', self.move_roles),
+            ('PATCH', '/guilds/{guild_id}/roles/{role_id}', self.edit_role),
+            ('DELETE', '/guilds/{guild_id}/roles/{role_id}', self.delete_role),
+            ('POST', '/guilds/{guild_id}/channels', self.create_channel),
+            ('PATCH', '/guilds/{guild_id}/channels', self.move_channels),
+            ('PATCH', '/channels/{channel_id}', self.edit_channel),
+            ('DELETE', '/channels/{channel_id}', self.delete_channel),
+            ('POST', '/channels/{channel_id}/messages', self.send_message),
+            ('PATCH', '/channels/{channel_id}/messages/{message_id}', self.edit_message),
+            ('PUT', '/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me', self.add_reaction),
+            ('POST', '/interactions/{interaction_id}/{interaction_token}/callback', self.interaction_callback),
+            ('POST', '/webhooks/{application_id}/{interaction_token}', self.send_followup),
+            ('PATCH', '/webhooks/{application_id}/{interaction_token}/messages/{message_id}', self.edit_followup),
+        ]
+        for method, path, handler in routes:
+            app.router.add_route(method, API_PREFIX + path, handler)
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        route = f"{request.method} {request.match_info.route.resource.canonical[len(API_PREFIX):]}" \
+            if request.match_info.route.resource is not None else f"{request.method} {request.path}"
+        major = request.match_info.get('guild_id') or request.match_info.get('channel_id') or ''
+        body = await request.json() if request.can_read_body else None
+        record = {'route': route, 'path': request.path[len(API_PREFIX):], 'major': major, 'json': body,
+                  'at': time.perf_counter(), 'status': None}
+        self.requests.append(record)
+
+        if self.latency:
+            low, high = self.latency if isinstance(self.latency, tuple) else (self.latency, self.latency)
+            await asyncio.sleep(self._random.uniform(low, high))
+
+        headers = {}
+        limit = self.rate_limits.get(route)
+        if limit is not None:
+            now = time.monotonic()
+            bucket = self._buckets.setdefault((route, major), RateLimitBucket(*limit))
+            retry_after = bucket.take(now)
+            bucket_headers = bucket.headers(now, f"fake-{abs(hash(route)) % 10 ** 8}")
+            if retry_after is not None:
+                self.rate_limited += 1
+                record['status'] = 429
+                return json_response(
+                    {'message': 'You are being rate limited.', 'retry_after': round(retry_after, 3), 'global': False},
+                    status=429,
+                    headers={**bucket_headers, 'X-RateLimit-Remaining': '0', 'Retry-After': f"{retry_after:.3f}",
+                             'X-RateLimit-Scope': 'user', 'Via': '1.1 fake-discord'}
+                )
+            headers = bucket_headers
+
+        for failure in self._failures:
+            if failure['route'] == route and failure['times'] > 0:
+                failure['times'] -= 1
+                record['status'] = failure['status']
+                if failure['status'] == 429:
+                    self.rate_limited += 1
+                    return json_response({'message': failure['message'], 'retry_after': failure['retry_after'],
+                                          'global': False}, status=429, headers={'Via': '1.1 fake-discord'})
+                return json_response({'message': failure['message'], 'code': failure['code']},
+                                         status=failure['status'], headers={'Via': '1.1 fake-discord'})
+
+        try:
+            response = await handler(request, body)
+        except KeyError:
+            response = json_response({'message': 'Unknown resource', 'code': 10003}, status=404)
+        record['status'] = response.status
+        response.headers.update(headers)
+        return response
+
+    # Handlers
+
+    async def get_me(self, request, body):
+        return json_response(self.user)
+
+    async def get_application(self, request, body):
+        return json_response({'id': self.application_id, 'name': self.user['username'], 'icon': None,
+                                  'description': '', 'bot_public': True, 'bot_require_code_grant': False,
+                                  'verify_key': '', 'flags': 0, 'owner': self.user})
+
+    async def put_commands(self, request, body):
+        return json_response([])
+
+    async def edit_guild(self, request, body):
+        guild = self.guilds[request.match_info['guild_id']]
+        if 'name' in body:
+            guild['name'] = body['name']
+        payload = self._guild_payload(guild)
+        self._dispatch('guild_update', payload)
+        return json_response(payload)
+
+    async def get_member(self, request, body):
+        guild = self.guilds[request.match_info['guild_id']]
+        return json_response(guild['members'][request.match_info['user_id']])
+
+    async def create_role(self, request, body):
+        guild_id = request.match_info['guild_id']
+        guild = self.guilds[guild_id]
+        # New roles land directly above @everyone
+        for role in guild['roles'].values():
+            if role['position'] > 0 and not role['managed']:
+                role['position'] += 1
+        role = self._role(guild_id, body.get('name', 'new role'), int(body.get('permissions', 0)))
+        guild['roles'][role['id']] = role
+        self._dispatch('guild_role_create', {'guild_id': guild_id, 'role': role})
+        return json_response(role)
+
+    async def edit_role(self, request, body):
+        guild_id = request.match_info['guild_id']
+        role = self.guilds[guild_id]['roles'][request.match_info['role_id']]
+        for field in ('name', 'permissions', 'color', 'hoist', 'mentionable'):
+            if field in body:
+                role[field] = str(body[field]) if field == 'permissions' else body[field]
+        self._dispatch('guild_role_update', {'guild_id': guild_id, 'role': role})
+        return json_response(role)
+
+    async def move_roles(self, request, body):
+        guild_id = request.match_info['guild_id']
+        roles = self.guilds[guild_id]['roles']
+        for entry in body:
+            role = roles[str(entry['id'])]
+            role['position'] = entry['position']
+            self._dispatch('guild_role_update', {'guild_id': guild_id, 'role': role})
+        return json_response(list(roles.values()))
+
+    async def delete_role(self, request, body):
+        guild_id = request.match_info['guild_id']
+        self.guilds[guild_id]['roles'].pop(request.match_info['role_id'])
+        self._dispatch('guild_role_delete', {'guild_id': guild_id, 'role_id': request.match_info['role_id']})
+        return web.Response(status=204)
+
+    async def create_channel(self, request, body):
+        guild_id = request.match_info['guild_id']
+        guild = self.guilds[guild_id]
+        parent_id = body.get('parent_id')
+        if parent_id is not None and str(parent_id) not in self.channels:
+            return json_response({'message': 'Invalid Form Body', 'code': 50035}, status=400)
+        channel = self._channel(guild_id, body['name'], body.get('type', CHANNEL_TEXT),
+                                position=body.get('position') or 0,
+                                parent_id=str(parent_id) if parent_id is not None else None,
+                                topic=body.get('topic'))
+        guild['channels'][channel['id']] = channel
+        self.channels[channel['id']] = channel
+        self._dispatch('channel_create', channel)
+        return json_response(channel)
+
+    async def move_channels(self, request, body):
+        for entry in body:
+            channel = self.channels[str(entry['id'])]
+            channel['position'] = entry.get('position', channel['position'])
+            if 'parent_id' in entry:
+                channel['parent_id'] = str(entry['parent_id']) if entry['parent_id'] is not None else None
+            self._dispatch('channel_update', channel)
+        return web.Response(status=204)
+
+    async def edit_channel(self, request, body):
+        channel = self.channels[request.match_info['channel_id']]
+        for field in ('name', 'position', 'topic'):
+            if field in body:
+                channel[field] = body[field]
+        if 'parent_id' in body:
+            channel['parent_id'] = str(body['parent_id']) if body['parent_id'] is not None else None
+        self._dispatch('channel_update', channel)
+        return json_response(channel)
+
+    async def delete_channel(self, request, body):
+        channel = self.channels.pop(request.match_info['channel_id'])
+        self.guilds[channel['guild_id']]['channels'].pop(channel['id'], None)
+        self._dispatch('channel_delete', channel)
+        return json_response(channel)
+
+    def _message(self, channel, body, author):
+        message = {'id': self.snowflake(), 'channel_id': channel['id'], 'guild_id': channel['guild_id'],
+                   'author': author, 'content': body.get('content') or '', 'embeds': body.get('embeds') or [],
+                   'attachments': [], 'mentions': [], 'mention_roles': [], 'mention_everyone': False,
+                   'pinned': False, 'tts': False, 'timestamp': _now_iso(), 'edited_timestamp': None,
+                   'type': 0, 'flags': 0, 'components': body.get('components') or []}
+        self.messages[message['id']] = message
+        return message
+
+    def _edit(self, message, body):
+        for field in ('content', 'embeds', 'components'):
+            if field in body:
+                message[field] = body[field]
+        message['edited_timestamp'] = _now_iso()
+        return json_response(message)
+
+    async def send_message(self, request, body):
+        channel = self.channels[request.match_info['channel_id']]
+        return json_response(self._message(channel, body, self.user))
+
+    async def edit_message(self, request, body):
+        return self._edit(self.messages[request.match_info['message_id']], body)
+
+    async def add_reaction(self, request, body):
+        return web.Response(status=204)
+
+    async def interaction_callback(self, request, body):
+        token = request.match_info['interaction_token']
+        channel = self.channels[self.interactions[token]]
+        # Deferred and immediate responses both become the original response message
+        self.original_responses[token] = self._message(channel, body.get('data') or {}, self.user)
+        return web.Response(status=204)
+
+    async def send_followup(self, request, body):
+        channel = self.channels[self.interactions[request.match_info['interaction_token']]]
+        return json_response(self._message(channel, body, self.user))
+
+    async def edit_followup(self, request, body):
+        message_id = request.match_info['message_id']
+        if message_id == '@original':
+            return self._edit(self.original_responses[request.match_info['interaction_token']], body)
+        return self._edit(self.messages[message_id], body)
+
+
+async def smoke_run():
+    """Build, sync, save and clean a fake guild through the bot's real code paths"""
+    import os
+    import tempfile
+
+    directory = tempfile.mkdtemp(prefix='fake-discord-')
+    for name, filename in (('BUILD_STORE_PATH', 'builds.db'), ('GUILD_SETTINGS_PATH', 'settings.db'),
+                           ('CHECKPOINT_PATH', 'checkpoints.json'), ('COMMAND_SYNC_PATH', 'command_sync.json'),
+                           ('TRACE_PATH', 'traces.jsonl')):
+        os.environ[name] = os.path.join(directory, filename)
+    os.environ['PROGRESS_INTERVAL'] = '0'
+    import bot as builder
+
+    fake = FakeDiscord(rate_limits={'POST /guilds/{guild_id}/channels': (10, 1.0)})
+    async with fake:
+        await builder.bot.login('fake-token')
+        guild_id = fake.create_guild('Smoke Test', channels=('general', 'commands'))
+        fake.attach(builder.bot)
+        guild = builder.bot.get_guild(int(guild_id))
+        command_channel = guild.text_channels[1]
+
+        # Full rebuild of the biggest shipped template, with a 500 and two 429s injected
+        plan = builder.get_template_plan('tech')
+        fake.fail('POST /guilds/{guild_id}/roles', status=500)
+        fake.fail('POST /guilds/{guild_id}/channels', status=429, times=2)
+        message = await command_channel.send('starting')
+        await builder.deploy_structure(guild, plan, 'en', message, keep_channel=command_channel)
+
+        created_channels = fake.count('POST /guilds/{guild_id}/channels', status=200)
+        assert guild.name == plan.server_name, guild.name
+        assert len(guild.categories) == plan.category_count, len(guild.categories)
+        assert created_channels == plan.category_count + plan.channel_count, created_channels
+        assert fake.count('DELETE /channels/{channel_id}') == 1, "only the non-command channel is cleaned up"
+        fake.assert_sequence('PATCH /guilds/{guild_id}', 'DELETE /channels/{channel_id}',
+                             'POST /guilds/{guild_id}/channels', 'PATCH /channels/{channel_id}/messages/{message_id}')
+        # The fake rejects channels whose category does not exist yet
+        assert fake.count(status=400) == 0, "a channel was created before its category"
+        assert fake.count('POST /guilds/{guild_id}/roles', status=500) == 1
+        assert fake.count(status=429) == 2 and fake.rate_limited == 2
+        print(f"build: {len(fake.requests)} requests, {fake.rate_limited} rate limited, "
+              f"{len(guild.categories)} categories, {plan.channel_count} channels")
+
+        # Syncing the same template again changes nothing
+        fake.reset_log()
+        sync_result = await builder.sync_structure(guild, plan.template, keep_channel=command_channel)
+        mutations = [r for r in fake.requests if not r['route'].startswith(('GET', 'POST /channels'))]
+        assert not mutations, [r['route'] for r in mutations]
+        assert (sync_result.created_count, sync_result.updated_count, sync_result.deleted_count) == (0, 0, 0)
+        print("sync: no changes")
+
+        # Saving the built guild round-trips the template structure
+        saved = builder.save_server_structure(guild)
+        assert [c['name'] for c in saved['categories']] == [c['name'] for c in plan.template['categories']]
+
+        fake.reset_log()
+        cleanup_plan = builder.plan_cleanup(guild, keep_channel=command_channel)
+        report = await builder.execute_cleanup(cleanup_plan, builder.BUILD_SCHEDULER)
+        print(f"cleanup: {report.deleted_channels} channels and {report.deleted_roles} roles deleted "
+              f"in {len(fake.requests)} requests")
+        assert not guild.categories
+
+        await builder.bot.close()
+    print("✅ Fake Discord smoke run passed")
+
+
+if __name__ == '__main__':
+    asyncio.run(smoke_run())
@@ -0,0 +1,187 @@
+"""Persistent per-guild settings.
+
+Settings (currently just the language) live in an SQLite table with one
+JSON object per guild.  Reads are served from a bounded LRU cache that is
+filled lazily: guilds are prefetched in batches as they become available
+or join, and a guild missing from the cache costs a single primary-key
+lookup in a worker thread, so the event loop never waits on the database.
+Changes go into the cache immediately and are written behind by a
+WriteBehindWorker, so ``set`` never waits on disk either.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from persistence import WriteBehindWorker
+
+DEFAULT_SETTINGS_PATH = 'guild_settings.db'
+
+# Guild settings kept in memory; evicted guilds are reloaded on their next command
+DEFAULT_SETTINGS_CACHE_SIZE = 10000
+
+# Guild ids per prefetch query (stays below SQLite's bound parameter limit)
+PREFETCH_BATCH_SIZE = 500
+
+# Seconds to collect guild_available events into one prefetch
+PREFETCH_DELAY = 0.5
+
+
+class GuildSettingsStore:
+    """Cached, write-behind guild settings backed by SQLite"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER PRIMARY KEY,
+            settings TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path=DEFAULT_SETTINGS_PATH, cache_size=DEFAULT_SETTINGS_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # Cluster workers share the database; wait for a writer instead of failing
+        self.conn.execute('PRAGMA busy_timeout=5000')
+        self.conn.executescript(self.SCHEMA)
+        # The connection is shared by cache-miss, prefetch and writer threads
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._dirty = {}
+        self._prefetch_ids = set()
+        self._prefetch_task = None
+        self._loop = None
+        self.writer = WriteBehindWorker('guild settings', self._snapshot, self._write)
+
+    def _cache_put(self, guild_id, settings):
+        self._cache[guild_id] = settings
+        self._cache.move_to_end(guild_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, guild_id):
+        with self._db_lock:
+            row = self.conn.execute('SELECT settings FROM guild_settings WHERE guild_id = ?', (guild_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    async def _settings(self, guild_id):
+        settings = self._cache.get(guild_id)
+        if settings is not None:
+            self.hits += 1
+            self._cache.move_to_end(guild_id)
+            return settings
+
+        self.misses += 1
+        # Unflushed changes of an evicted guild win over the database
+        settings = self._dirty.get(guild_id)
+        if settings is None:
+            loaded = await asyncio.to_thread(self._load, guild_id)
+            # Anything set or loaded while the query ran wins over what it read
+            settings = self._cache.get(guild_id)
+            if settings is None:
+                settings = self._dirty.get(guild_id, loaded)
+        self._cache_put(guild_id, settings)
+        return settings
+
+    async def get(self, guild_id, key, default=None):
+        """Get one setting for a guild"""
+        return (await self._settings(guild_id)).get(key, default)
+
+    async def set(self, guild_id, key, value):
+        """Change one setting for a guild; persisted by the next flush"""
+        settings = dict(await self._settings(guild_id))
+        settings[key] = value
+        self._cache_put(guild_id, settings)
+        self._dirty[guild_id] = settings
+        self.writer.mark_dirty()
+        if not self.writer.running:
+            self.writer.flush_sync()
+
+    def _snapshot(self):
+        dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    def _write(self, dirty):
+        now = time.time()
+        rows = [(guild_id, json.dumps(settings, ensure_ascii=False), now) for guild_id, settings in dirty.items()]
+        try:
+            with self._db_lock, self.conn:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO guild_settings (guild_id, settings, updated_at) VALUES (?, ?, ?)',
+                    rows
+                )
+        except Exception:
+            # Hand the changes back so the worker's retry includes them
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._requeue, dirty)
+            else:
+                self._requeue(dirty)
+            raise
+
+    def _requeue(self, dirty):
+        for guild_id, settings in dirty.items():
+            self._dirty.setdefault(guild_id, settings)
+
+    def _fetch_many(self, guild_ids):
+        loaded = {}
+        for i in range(0, len(guild_ids), PREFETCH_BATCH_SIZE):
+            batch = guild_ids[i:i + PREFETCH_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            with self._db_lock:
+                rows = self.conn.execute(
+                    f'SELECT guild_id, settings FROM guild_settings WHERE guild_id IN ({placeholders})',
+                    batch
+                ).fetchall()
+            loaded.update((guild_id, json.loads(settings)) for guild_id, settings in rows)
+        return loaded
+
+    async def prefetch(self, guild_ids):
+        """Load settings for guilds that are not cached yet, off the event loop"""
+        missing = [guild_id for guild_id in guild_ids if guild_id not in self._cache]
+        if not missing:
+            return
+        loaded = await asyncio.to_thread(self._fetch_many, missing)
+        for guild_id in missing:
+            # Don't overwrite anything set or loaded while the query ran
+            if guild_id not in self._cache:
+                self._cache_put(guild_id, self._dirty.get(guild_id, loaded.get(guild_id, {})))
+
+    def prefetch_soon(self, guild_id):
+        """Queue a guild for the next batched prefetch"""
+        if guild_id in self._cache:
+            return
+        self._prefetch_ids.add(guild_id)
+        if self._prefetch_task is None or self._prefetch_task.done():
+            self._prefetch_task = asyncio.get_running_loop().create_task(self._prefetch_later())
+
+    async def _prefetch_later(self):
+        # Guilds queued while a batch is loading go into the next batch
+        while self._prefetch_ids:
+            await asyncio.sleep(PREFETCH_DELAY)
+            guild_ids, self._prefetch_ids = list(self._prefetch_ids), set()
+            try:
+                await self.prefetch(guild_ids)
+            except Exception as e:
+                print(f"Error prefetching guild settings: {e}")
+
+    @property
+    def cached_count(self):
+        return len(self._cache)
+
+    def persistence_lag(self):
+        return self.writer.lag()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.writer.start()
+
+    async def shutdown(self):
+        await self.writer.stop()
+        self.conn.close()
@@ -0,0 +1,147 @@
+"""Build job scheduler.
+
+Builds and cleanups are submitted as jobs instead of running inline in the
+command coroutine.  The scheduler runs at most one job per guild, caps the
+number of jobs running across all guilds (they share one global rate limit)
+and picks the next job round-robin across guilds so one busy guild cannot
+starve the others.  Waiting jobs are told their queue position whenever it
+changes.
+"""
+import asyncio
+import itertools
+import time
+from collections import deque
+
+# Maximum number of build jobs running at the same time across all guilds
+DEFAULT_MAX_CONCURRENT_BUILDS = 3
+
+_job_ids = itertools.count(1)
+
+
+class BuildJob:
+    """A unit of build or cleanup work for a single guild.
+
+    ``run(job)`` is awaited once the job reaches the front of the queue.
+    ``on_queued(job, position)`` is awaited while it waits, each time its
+    1-based queue position changes.
+    """
+
+    def __init__(self, guild_id, kind, run, on_queued=None):
+        self.id = next(_job_ids)
+        self.guild_id = guild_id
+        self.kind = kind
+        self.run = run
+        self.on_queued = on_queued
+        self.state = 'queued'
+        self.position = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.done = asyncio.Event()
+
+    def __repr__(self):
+        return f"<BuildJob {self.id} {self.kind} guild={self.guild_id} {self.state}>"
+
+
+class BuildJobScheduler:
+    """Per-guild job queues with a global concurrency cap and round-robin fairness"""
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT_BUILDS):
+        self.max_concurrent = max_concurrent
+        self._queues = {}
+        self._rotation = deque()
+        self._active = {}
+        self._tasks = set()
+
+    @property
+    def active_count(self):
+        return len(self._active)
+
+    @property
+    def queued_count(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def active_job(self, guild_id):
+        """Get the job currently running for a guild, if any"""
+        return self._active.get(guild_id)
+
+    def queued_jobs(self, guild_id):
+        """Get the jobs waiting for a guild, oldest first"""
+        return list(self._queues.get(guild_id, ()))
+
+    def submit(self, job):
+        """Queue a job; it starts as soon as its guild and a global slot are free"""
+        queue = self._queues.get(job.guild_id)
+        if queue is None:
+            queue = self._queues[job.guild_id] = deque()
+            self._rotation.append(job.guild_id)
+        queue.append(job)
+        self._dispatch()
+        self._notify_positions()
+        return job
+
+    def _pending_order(self):
+        """Waiting jobs in the order the round-robin will start them"""
+        order = []
+        queues = [list(self._queues[guild_id]) for guild_id in self._rotation]
+        for round_jobs in itertools.zip_longest(*queues):
+            order.extend(job for job in round_jobs if job is not None)
+        return order
+
+    def _dispatch(self):
+        """Start waiting jobs while global slots are free"""
+        while len(self._active) < self.max_concurrent:
+            guild_id = next((g for g in self._rotation if g not in self._active), None)
+            if guild_id is None:
+                return
+            queue = self._queues[guild_id]
+            job = queue.popleft()
+            # Move the guild to the back of the rotation, or drop it if drained
+            self._rotation.remove(guild_id)
+            if queue:
+                self._rotation.append(guild_id)
+            else:
+                del self._queues[guild_id]
+
+            self._active[guild_id] = job
+            task = asyncio.get_running_loop().create_task(self._run(job), name=f"build-job-{job.id}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _notify_positions(self):
+        for position, job in enumerate(self._pending_order(), start=1):
+            if job.position != position and job.on_queued:
+                job.position = position
+                task = asyncio.get_running_loop().create_task(self._report_position(job, position))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            job.position = position
+
+    async def _report_position(self, job, position):
+        try:
+            await job.on_queued(job, position)
+        except Exception as e:
+            print(f"Error reporting queue position for job {job.id}: {e}")
+
+    async def _run(self, job):
+        job.state = 'running'
+        job.position = None
+        job.started_at = time.time()
+        try:
+            await job.run(job)
+            job.state = 'done'
+        except Exception as e:
+            job.state = 'failed'
+            job.error = e
+            print(f"Error in {job.kind} job {job.id} for guild {job.guild_id}: {e}")
+        finally:
+            job.finished_at = time.time()
+            del self._active[job.guild_id]
+            # The guild just had its turn; let the others go first
+            if job.guild_id in self._rotation:
+                self._rotation.remove(job.guild_id)
+                self._rotation.append(job.guild_id)
+            job.done.set()
+            self._dispatch()
+            self._notify_positions()
@@ -0,0 +1,99 @@
+"""Approximate memory usage of the bot's caches.
+
+Exact accounting of discord.py's object graph is expensive, so each cache
+is estimated from a sample: the deep size of up to ``sample`` objects
+(not following references into other Discord models or the connection
+state) times the number of objects in the cache.
+"""
+import sys
+
+import discord
+from discord.mixins import Hashable
+from discord.state import ConnectionState
+
+# Objects measured per cache; the rest are extrapolated
+DEFAULT_SAMPLE_SIZE = 50
+
+# Other Discord models are counted in their own cache, not inside their parent
+_MODEL_TYPES = (Hashable, discord.Member, discord.user.BaseUser, discord.Emoji, ConnectionState, discord.Client)
+
+
+def deep_size(obj, seen=None, root=True):
+    """Approximate size in bytes of ``obj`` and what it owns"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or callable(obj) and not root:
+        return 0
+    if not root and isinstance(obj, _MODEL_TYPES):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key, seen, False) + deep_size(value, seen, False)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_size(item, seen, False)
+    elif not isinstance(obj, (str, bytes, int, float, bool)) and obj is not None:
+        if hasattr(obj, '__dict__'):
+            size += deep_size(vars(obj), seen, False)
+        for cls in type(obj).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if slot == '_state':
+                    continue
+                try:
+                    size += deep_size(getattr(obj, slot), seen, False)
+                except AttributeError:
+                    pass
+    return size
+
+
+def estimate(objects, sample=DEFAULT_SAMPLE_SIZE):
+    """Estimate (count, bytes) for a collection of objects from a sample"""
+    objects = list(objects)
+    if not objects:
+        return 0, 0
+    step = max(1, len(objects) // sample)
+    measured = objects[::step][:sample]
+    average = sum(deep_size(obj) for obj in measured) / len(measured)
+    return len(objects), int(average * len(objects))
+
+
+def process_rss():
+    """Resident memory of this process in bytes, or None if unavailable"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def discord_cache_report(client, sample=DEFAULT_SAMPLE_SIZE):
+    """Estimate the discord.py caches: {name: (count, bytes)}"""
+    guilds = client.guilds
+    return {
+        'guilds': estimate(guilds, sample),
+        'channels': estimate((channel for guild in guilds for channel in guild.channels), sample),
+        'roles': estimate((role for guild in guilds for role in guild.roles), sample),
+        'members': estimate((member for guild in guilds for member in guild.members), sample),
+        'users': estimate(client.users, sample),
+        'messages': estimate(client.cached_messages, sample),
+    }
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
@@ -0,0 +1,326 @@
+"""Prometheus metrics for commands, Discord API calls, builds and stores.
+
+Metrics are plain in-process counters and histograms with no dependency on
+``prometheus_client``: recording a value is a dict lookup and an addition,
+so instrumentation stays on in production.  ``MetricsServer`` renders them
+in the Prometheus text format at ``/metrics`` on a local port.
+
+Discord API calls are counted from an aiohttp trace config handed to the
+client (``http_trace``), so every request discord.py makes is covered, not
+just the ones the build executor schedules.  Routes are labelled with ids
+replaced by placeholders to keep label cardinality bounded.
+"""
+import bisect
+import functools
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import aiohttp
+from aiohttp import web
+from discord import app_commands
+
+DEFAULT_METRICS_HOST = '127.0.0.1'
+
+# Seconds; spans quick API calls through multi-minute builds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_SNOWFLAKE = re.compile(r'/\d{15,21}(?=/|$)')
+_TOKEN = re.compile(r'/(interactions|webhooks)/\{id\}/[^/]+')
+_REACTION = re.compile(r'/reactions/[^/]+')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Current value per label set, set directly or read from ``collect()`` at scrape time
+
+    ``collect`` returns a number for an unlabelled gauge, or a dict of
+    label-value tuples to numbers.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        if self.collect is not None:
+            try:
+                values = self.collect()
+            except Exception as e:
+                print(f"Error collecting metric {self.name}: {e}")
+                values = {}
+            if not isinstance(values, dict):
+                values = {(): values}
+            with self._lock:
+                self._values = {tuple(str(v) for v in key): value for key, value in values.items()}
+        return super().render()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not yet cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the ``with`` block, even if it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """The set of metrics exposed at /metrics"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self.metrics[metric.name] = metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+COMMAND_SECONDS = Histogram(
+    'builderbot_command_duration_seconds', 'Time to run a command, by command, kind and outcome',
+    ('command', 'kind', 'outcome')
+)
+BUILD_PHASE_SECONDS = Histogram(
+    'builderbot_build_phase_duration_seconds', 'Time spent in each phase of a build', ('phase',)
+)
+BUILD_OPERATIONS = Counter(
+    'builderbot_build_operations_total', 'Roles, categories and channels created, by kind and outcome',
+    ('kind', 'outcome')
+)
+API_REQUESTS = Counter(
+    'builderbot_api_requests_total', 'Discord API requests, by method, route and status', ('method', 'route', 'status')
+)
+API_REQUEST_SECONDS = Histogram(
+    'builderbot_api_request_duration_seconds', 'Discord API request latency, by method and route', ('method', 'route')
+)
+API_RATE_LIMITED = Counter(
+    'builderbot_api_rate_limited_total', 'Discord API responses with status 429, by route', ('method', 'route')
+)
+SCHEDULER_RETRIES = Counter(
+    'builderbot_scheduler_retries_total', 'Rate-limited calls retried by the route scheduler', ('route',)
+)
+STORE_FLUSH_SECONDS = Histogram(
+    'builderbot_store_flush_duration_seconds', 'Time to persist a write-behind store flush', ('store',)
+)
+STORE_FLUSH_ERRORS = Counter(
+    'builderbot_store_flush_errors_total', 'Write-behind flushes that failed and were requeued', ('store',)
+)
+STORE_OPERATION_SECONDS = Histogram(
+    'builderbot_store_operation_duration_seconds', 'Saved-build store call latency, by operation', ('operation',)
+)
+
+
+def api_route(path):
+    """Normalize an API path into a low-cardinality route label"""
+    path = path.split('/api/v', 1)[-1]
+    path = path[path.find('/'):] if '/' in path else path
+    path = _SNOWFLAKE.sub('/{id}', path)
+    path = _TOKEN.sub(r'/\1/{id}/{token}', path)
+    return _REACTION.sub('/reactions/{emoji}', path)
+
+
+def api_trace_config():
+    """aiohttp trace config recording every Discord API request; pass as ``http_trace``"""
+    async def on_request_start(session, context, params):
+        context.started = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        route = api_route(params.url.path)
+        API_REQUESTS.inc(method=params.method, route=route, status=params.response.status)
+        API_REQUEST_SECONDS.observe(time.perf_counter() - context.started, method=params.method, route=route)
+        if params.response.status == 429:
+            API_RATE_LIMITED.inc(method=params.method, route=route)
+
+    async def on_request_exception(session, context, params):
+        API_REQUESTS.inc(method=params.method, route=api_route(params.url.path), status='error')
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
+
+
+def _command_name(interaction):
+    command = interaction.command
+    return command.qualified_name if command is not None else 'unknown'
+
+
+def record_app_command(interaction, outcome):
+    """Record a finished slash command started under MetricsCommandTree"""
+    started = interaction.extras.pop('metrics_started', None)
+    if started is None:
+        return
+    COMMAND_SECONDS.observe(time.perf_counter() - started, command=_command_name(interaction), kind='slash',
+                            outcome=outcome)
+
+
+class MetricsCommandTree(app_commands.CommandTree):
+    """Command tree that records slash command latency through the public hooks
+
+    ``interaction_check`` stamps the start of every command, ``on_error``
+    records failures and the client's ``on_app_command_completion`` event
+    records successes with ``record_app_command``.
+    """
+
+    async def interaction_check(self, interaction):
+        if interaction.type.name != 'autocomplete':
+            interaction.extras['metrics_started'] = time.perf_counter()
+        return await super().interaction_check(interaction)
+
+    async def on_error(self, interaction, error):
+        record_app_command(interaction, 'error')
+        await super().on_error(interaction, error)
+
+
+def timed_autocomplete(callback):
+    """Record an autocomplete callback's latency; apply below ``@command.autocomplete``"""
+    @functools.wraps(callback)
+    async def wrapper(interaction, current):
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = await callback(interaction, current)
+            outcome = 'ok'
+            return result
+        finally:
+            COMMAND_SECONDS.observe(time.perf_counter() - started, command=_command_name(interaction),
+                                    kind='autocomplete', outcome=outcome)
+    return wrapper
+
+
+class MetricsServer:
+    """Serve the registry in the Prometheus text format at /metrics"""
+
+    def __init__(self, port, host=DEFAULT_METRICS_HOST, registry=REGISTRY):
+        self.port = port
+        self.host = host
+        self.registry = registry
+        self._runner = None
+
+    async def handle(self, request):
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"📈 Metrics available at http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
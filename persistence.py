@@ -0,0 +1,155 @@
+"""Write-behind persistence helpers.
+
+``WriteBehindWorker`` lets in-memory stores mark themselves dirty on every
+mutation while a background task coalesces bursts of mutations into a
+single flush.  The snapshot is taken on the event loop (so it is consistent),
+and serialization plus the atomic file write run in a worker thread so the
+loop never blocks on disk I/O.
+"""
+import asyncio
+import os
+import time
+
+from metrics import STORE_FLUSH_ERRORS, STORE_FLUSH_SECONDS
+
+# Seconds to wait after the first mutation so a burst lands in one flush
+DEFAULT_FLUSH_DELAY = 1.0
+
+
+def atomic_write(path, data):
+    """Write bytes to ``path`` via a fsynced temp file and an atomic rename"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+    # Make the rename itself durable
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class WriteBehindWorker:
+    """Coalesce mutations and persist them from a background task.
+
+    ``snapshot()`` runs on the event loop and must return data that is safe
+    to hand to another thread; ``write(data)`` runs in a thread.
+    """
+
+    def __init__(self, name, snapshot, write, delay=DEFAULT_FLUSH_DELAY):
+        self.name = name
+        self.snapshot = snapshot
+        self.write = write
+        self.delay = delay
+        self.pending = 0
+        self.dirty_since = None
+        self.flushes = 0
+        self.last_flush_at = None
+        self.last_flush_duration = 0.0
+        self._wakeup = None
+        self._stopping = None
+        self._task = None
+        # One flush at a time, so two threads never write the same temp file
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the background flush task on the running loop"""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        if self.pending:
+            self._wakeup.set()
+        self._task = asyncio.get_running_loop().create_task(self._run(), name=f"{self.name}-writer")
+
+    def mark_dirty(self):
+        """Record a mutation; it will be persisted by the next flush"""
+        self.pending += 1
+        if self.dirty_since is None:
+            self.dirty_since = time.monotonic()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def lag(self):
+        """How far the on-disk state lags memory: (pending mutations, seconds)"""
+        if self.dirty_since is None:
+            return 0, 0.0
+        return self.pending, time.monotonic() - self.dirty_since
+
+    def _take_snapshot(self):
+        pending, self.pending, self.dirty_since = self.pending, 0, None
+        return pending, self.snapshot()
+
+    def _flushed(self, started):
+        self.flushes += 1
+        self.last_flush_at = time.time()
+        self.last_flush_duration = time.perf_counter() - started
+        STORE_FLUSH_SECONDS.observe(self.last_flush_duration, store=self.name)
+
+    async def flush(self):
+        """Persist any pending mutations now"""
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            pending, data = self._take_snapshot()
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self.write, data)
+            except Exception as e:
+                # Put the mutations back so the next flush retries them
+                self.pending += pending
+                if self.dirty_since is None:
+                    self.dirty_since = time.monotonic()
+                STORE_FLUSH_ERRORS.inc(store=self.name)
+                print(f"Error flushing {self.name}: {e}")
+                if self._wakeup is not None:
+                    self._wakeup.set()
+                return
+            self._flushed(started)
+
+    def flush_sync(self):
+        """Persist pending mutations without an event loop (shutdown fallback)"""
+        if not self.pending:
+            return
+        pending, data = self._take_snapshot()
+        started = time.perf_counter()
+        self.write(data)
+        self._flushed(started)
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            await self._wakeup.wait()
+            # Let the rest of the burst arrive before writing, unless stopping
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def stop(self):
+        """Stop the background task and flush whatever is still pending
+
+        The task is not cancelled: a write already running in its thread is
+        awaited, so the final flush never races it for the temp file.
+        """
+        if self._task is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
@@ -0,0 +1,96 @@
+"""Coalesced progress reporting for build jobs.
+
+Progress message edits share the guild's rate-limit budget with the build
+itself, so instead of editing the message on every step the build feeds
+state changes into a ProgressReporter.  It renders and sends at most one
+edit per interval, flushes immediately when the phase changes, and always
+delivers the final state.
+"""
+import asyncio
+
+import tracing
+
+# Minimum seconds between two progress edits within the same phase
+DEFAULT_PROGRESS_INTERVAL = 2.0
+
+
+class ProgressReporter:
+    """Collect build state and edit a progress message at a bounded rate.
+
+    ``render(phase, state)`` turns the latest phase and state dict into an
+    embed; it only runs when an edit is actually sent.
+    """
+
+    def __init__(self, message, render, interval=DEFAULT_PROGRESS_INTERVAL):
+        self.message = message
+        self.render = render
+        self.interval = interval
+        self.phase = None
+        self.state = {}
+        self.edits = 0
+        self._dirty = False
+        self._urgent = False
+        self._editing = False
+        self._last_edit = None
+        self._timer = None
+        self._lock = asyncio.Lock()
+        # Edits run from timer tasks; keep them under the span the reporter was created in
+        self._trace_parent = tracing.current_span()
+
+    def update(self, phase, **state):
+        """Record a state change; the message is edited later, coalesced"""
+        self.state.update(state)
+        self._dirty = True
+        if phase != self.phase:
+            self.phase = phase
+            self._urgent = True
+            self._schedule(0)
+        else:
+            self._schedule(self._next_delay())
+
+    def _next_delay(self):
+        if self._last_edit is None:
+            return 0
+        return max(0.0, self._last_edit + self.interval - asyncio.get_running_loop().time())
+
+    def _schedule(self, delay):
+        if self._timer is not None and not self._timer.done():
+            if delay > 0 or self._editing:
+                # The pending timer (or the edit in flight) picks up the latest state
+                return
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        await self._send(None)
+        if self._dirty:
+            self._timer = None
+            self._schedule(0 if self._urgent else self._next_delay())
+
+    async def _send(self, embed):
+        async with self._lock:
+            if embed is None:
+                if not self._dirty:
+                    return
+                embed = self.render(self.phase, dict(self.state))
+            self._dirty = False
+            self._urgent = False
+            self._editing = True
+            try:
+                with tracing.span('progress edit', parent=self._trace_parent):
+                    await self.message.edit(embed=embed)
+                self.edits += 1
+            except Exception as e:
+                print(f"Error updating progress message: {e}")
+            finally:
+                self._editing = False
+                self._last_edit = asyncio.get_running_loop().time()
+
+    async def finish(self, embed):
+        """Stop coalescing and send the final embed"""
+        if self._timer is not None and not self._timer.done() and not self._editing:
+            self._timer.cancel()
+        self._dirty = False
+        await self._send(embed)
@@ -0,0 +1,381 @@
+"""Diff-based incremental apply of a template or saved build.
+
+``diff_structure`` compares the live guild (the shape produced by
+``save_server_structure(guild, include_ids=True)``) with a target template
+and emits the minimal list of create, rename, move, edit and delete
+operations.  Items are matched by exact name (and type, for channels), so
+anything that already matches is left alone and keeps its message history.
+
+A channel is renamed only when that is unambiguous: it is the one unmatched
+live channel of its type in a matched category, the target has exactly one
+unmatched channel of that type there too, and both sit at the same index.
+Every other unmatched item is deleted and created, never renamed into
+another one.  That includes every role and category, so renaming one in the
+template recreates it (a category's channels are moved into the new one).
+A reused role would hand its members the new role's permissions, and a
+reused channel would keep its permission overwrites and history.
+``apply_sync`` runs the operations through the shared RouteScheduler.
+"""
+import asyncio
+from bisect import bisect_left
+
+import discord
+
+import tracing
+from build_executor import (
+    ROUTE_CREATE_CHANNEL,
+    ROUTE_CREATE_ROLE,
+    ROUTE_DELETE_CHANNEL,
+    ROUTE_DELETE_ROLE,
+    ROUTE_EDIT_CHANNEL,
+    ROUTE_EDIT_ROLE,
+    permission_value,
+    role_permissions,
+)
+from metrics import BUILD_PHASE_SECONDS
+
+
+class SyncResult:
+    """Operations applied by a sync run"""
+
+    def __init__(self, ops):
+        self.ops = ops
+        self.applied = []
+        self.skipped = []
+        self.failed = []
+        self.created = {}
+
+    def _count(self, *actions):
+        return sum(1 for op in self.applied if op['action'] in actions)
+
+    @property
+    def created_count(self):
+        return self._count('create')
+
+    @property
+    def updated_count(self):
+        return self._count('rename', 'move', 'edit')
+
+    @property
+    def deleted_count(self):
+        return self._count('delete')
+
+
+def _longest_increasing(sequence):
+    """Positions in ``sequence`` that form a longest increasing subsequence"""
+    tails = []
+    tail_positions = []
+    previous = [None] * len(sequence)
+    for i, value in enumerate(sequence):
+        j = bisect_left(tails, value)
+        if j == len(tails):
+            tails.append(value)
+            tail_positions.append(i)
+        else:
+            tails[j] = value
+            tail_positions[j] = i
+        previous[i] = tail_positions[j - 1] if j else None
+
+    keep = set()
+    i = tail_positions[-1] if tail_positions else None
+    while i is not None:
+        keep.add(i)
+        i = previous[i]
+    return keep
+
+
+def _match_by(live, target, key):
+    """Pair live and target items with equal keys, preserving order.
+
+    Returns ``(pairs, live_left, target_left)`` where each element is an
+    ``(index, item)`` tuple.
+    """
+    available = {}
+    for i, item in enumerate(live):
+        available.setdefault(key(item), []).append(i)
+
+    pairs = []
+    matched = set()
+    target_left = []
+    for t, item in enumerate(target):
+        candidates = available.get(key(item))
+        if candidates:
+            i = candidates.pop(0)
+            matched.add(i)
+            pairs.append(((i, live[i]), (t, item)))
+        else:
+            target_left.append((t, item))
+
+    live_left = [(i, item) for i, item in enumerate(live) if i not in matched]
+    return pairs, live_left, target_left
+
+
+def _update(kind, live, changes):
+    """Build an update op, naming it after its most significant change"""
+    if 'name' in changes:
+        action = 'rename'
+    elif 'category' in changes or 'position' in changes:
+        action = 'move'
+    else:
+        action = 'edit'
+    return {'action': action, 'kind': kind, 'id': live['id'], 'name': live['name'], 'changes': changes}
+
+
+def _diff_roles(live_roles, target_roles, ops):
+    # Roles the bot cannot edit are neither reused nor deleted
+    live_roles = [role for role in live_roles if not role.get('protected')]
+    pairs, live_left, target_left = _match_by(live_roles, target_roles, lambda r: r['name'])
+
+    for (_, live), (_, target) in pairs:
+        if permission_value(live.get('permissions')) != permission_value(target.get('permissions')):
+            ops.append(_update('role', live, {'permissions': permission_value(target.get('permissions'))}))
+
+    for _, target in target_left:
+        ops.append({'action': 'create', 'kind': 'role', 'name': target['name'], 'data': target})
+    for _, live in live_left:
+        ops.append({'action': 'delete', 'kind': 'role', 'id': live['id'], 'name': live['name']})
+
+
+def _channel_key(channel):
+    return (channel['name'], channel.get('type', 'text'))
+
+
+def _display_order(channels):
+    """Channels in the order Discord shows them in a category: text first, then voice"""
+    return sorted(channels, key=lambda channel: channel.get('type') == 'voice')
+
+
+def _diff_categories(live_categories, target_categories, ops):
+    # The live structure comes from CategoryChannel.channels, which lists text
+    # channels before voice ones whatever their positions, so a template that
+    # mixes them could never match; diff the target in the same order
+    target_categories = [dict(category, channels=_display_order(category.get('channels', [])))
+                         for category in target_categories]
+    pairs, live_left, target_left = _match_by(live_categories, target_categories, lambda c: c['name'])
+    kept = sorted(pairs, key=lambda pair: pair[1][0])
+
+    # Category each target index ends up in: an existing id or a create ref
+    parents = {}
+    live_for_target = {}
+    stable = _longest_increasing([live_index for (live_index, _), _ in kept])
+    for n, ((live_index, live), (t, target)) in enumerate(kept):
+        parents[t] = {'id': live['id']}
+        live_for_target[t] = live_index
+        if n not in stable:
+            ops.append(_update('category', live, {'position': t}))
+
+    for t, target in target_left:
+        ref = f'category:{t}'
+        parents[t] = {'ref': ref}
+        ops.append({'action': 'create', 'kind': 'category', 'ref': ref, 'name': target['name'],
+                    'data': target, 'position': t})
+
+    # Pool of live channels, each tagged with the live category it is in
+    pool = {}
+    for live_index, category in enumerate(live_categories):
+        for position, channel in enumerate(category.get('channels', [])):
+            pool.setdefault(_channel_key(channel), []).append((live_index, position, channel))
+    used = set()
+
+    def take(key, live_index=None):
+        for entry in pool.get(key, []):
+            if entry[2]['id'] in used:
+                continue
+            if live_index is None or entry[0] == live_index:
+                used.add(entry[2]['id'])
+                return entry
+        return None
+
+    placements = {}
+    for t, target in enumerate(target_categories):
+        live_index = live_for_target.get(t)
+        placed = [None] * len(target.get('channels', []))
+        # Exact matches already in the right category
+        if live_index is not None:
+            for j, channel in enumerate(target.get('channels', [])):
+                placed[j] = take(_channel_key(channel), live_index)
+        placements[t] = placed
+
+    for t, target in enumerate(target_categories):
+        # Exact matches living in another category are moved
+        placed = placements[t]
+        for j, channel in enumerate(target.get('channels', [])):
+            if placed[j] is None:
+                placed[j] = take(_channel_key(channel))
+
+    unmatched = {}
+    for key, entries in pool.items():
+        for entry in entries:
+            if entry[2]['id'] not in used:
+                unmatched.setdefault((entry[0], key[1]), []).append(entry)
+
+    for t, target in enumerate(target_categories):
+        # A lone unmatched channel of a type on both sides, at the same index, was renamed
+        live_index = live_for_target.get(t)
+        if live_index is None:
+            continue
+        placed = placements[t]
+        open_slots = {}
+        for j, channel in enumerate(target.get('channels', [])):
+            if placed[j] is None:
+                open_slots.setdefault(channel.get('type', 'text'), []).append(j)
+        for channel_type, slots in open_slots.items():
+            candidates = unmatched.get((live_index, channel_type), [])
+            if len(slots) == 1 and len(candidates) == 1 and candidates[0][1] == slots[0]:
+                used.add(candidates[0][2]['id'])
+                placed[slots[0]] = candidates[0]
+
+    for t, target in enumerate(target_categories):
+        live_index = live_for_target.get(t)
+        placed = placements[t]
+        in_place = [j for j, entry in enumerate(placed) if entry is not None and entry[0] == live_index]
+        stable = {in_place[n] for n in _longest_increasing([placed[j][1] for j in in_place])}
+
+        for j, channel in enumerate(target.get('channels', [])):
+            kind = 'voice' if channel.get('type') == 'voice' else 'text'
+            entry = placed[j]
+            if entry is None:
+                ops.append({'action': 'create', 'kind': kind, 'name': channel['name'], 'data': channel,
+                            'parent': parents[t], 'position': j})
+                continue
+
+            live = entry[2]
+            changes = {}
+            if live['name'] != channel['name']:
+                changes['name'] = channel['name']
+            if entry[0] != live_index:
+                changes['category'] = parents[t]
+                changes['position'] = j
+            elif j not in stable:
+                changes['position'] = j
+            if kind == 'text' and (live.get('topic') or None) != (channel.get('topic') or None):
+                changes['topic'] = channel.get('topic') or None
+            if changes:
+                ops.append(_update(kind, live, changes))
+
+    for entries in pool.values():
+        for _, _, live in entries:
+            if live['id'] not in used:
+                kind = 'voice' if live.get('type') == 'voice' else 'text'
+                ops.append({'action': 'delete', 'kind': kind, 'id': live['id'], 'name': live['name']})
+
+    for _, live in live_left:
+        ops.append({'action': 'delete', 'kind': 'category', 'id': live['id'], 'name': live['name']})
+
+
+def diff_structure(live, target):
+    """Compute the minimal operations turning ``live`` into ``target``"""
+    ops = []
+    _diff_roles(live.get('roles', []), target.get('roles', []), ops)
+    _diff_categories(live.get('categories', []), target.get('categories', []), ops)
+    return ops
+
+
+async def _apply(guild, op, result, reason):
+    """Perform the API call for a single sync operation"""
+    kind = op['kind']
+    changes = op.get('changes', {})
+
+    def resolve_parent(parent):
+        if 'ref' in parent:
+            return result.created.get(parent['ref'])
+        return guild.get_channel(parent['id'])
+
+    if op['action'] == 'create':
+        data = op['data']
+        if kind == 'role':
+            return await guild.create_role(name=data['name'], permissions=role_permissions(data.get('permissions', [])),
+                                           reason=reason)
+        if kind == 'category':
+            return await guild.create_category(name=data['name'], position=op['position'], reason=reason)
+        parent = resolve_parent(op['parent'])
+        if parent is None:
+            raise RuntimeError(f"category for {data['name']} was not created")
+        if kind == 'voice':
+            return await guild.create_voice_channel(name=data['name'], category=parent, position=op['position'],
+                                                    reason=reason)
+        channel_kwargs = {'name': data['name'], 'category': parent, 'position': op['position'], 'reason': reason}
+        if data.get('topic'):
+            channel_kwargs['topic'] = data['topic']
+        return await guild.create_text_channel(**channel_kwargs)
+
+    target = guild.get_role(op['id']) if kind == 'role' else guild.get_channel(op['id'])
+    if target is None:
+        raise LookupError(f"{kind} {op['name']} no longer exists")
+    if op['action'] == 'delete':
+        return await target.delete(reason=reason)
+
+    edit_kwargs = {'reason': reason}
+    for field, value in changes.items():
+        if field == 'permissions':
+            value = role_permissions(value)
+        elif field == 'category':
+            value = resolve_parent(value)
+        edit_kwargs[field] = value
+    return await target.edit(**edit_kwargs)
+
+
+_ROUTES = {
+    ('create', 'role'): ROUTE_CREATE_ROLE,
+    ('delete', 'role'): ROUTE_DELETE_ROLE,
+    ('create', 'channel'): ROUTE_CREATE_CHANNEL,
+    ('delete', 'channel'): ROUTE_DELETE_CHANNEL,
+}
+
+
+def op_route(op):
+    """Rate-limit route used by a sync operation"""
+    family = 'role' if op['kind'] == 'role' else 'channel'
+    if op['action'] in ('create', 'delete'):
+        return _ROUTES[(op['action'], family)]
+    return ROUTE_EDIT_ROLE if family == 'role' else ROUTE_EDIT_CHANNEL
+
+
+def _protected(guild, op, keep_channel):
+    """Reason an existing item must not be touched, or None"""
+    if op['kind'] == 'role':
+        role = guild.get_role(op['id'])
+        if role is not None and (role.managed or role >= guild.me.top_role):
+            return 'role cannot be managed by the bot'
+    elif op['action'] == 'delete' and keep_channel is not None and op['id'] == keep_channel.id:
+        return 'command channel'
+    return None
+
+
+async def apply_sync(guild, ops, scheduler, reason=None, keep_channel=None):
+    """Apply sync operations: roles and categories, then channels, then empty categories"""
+    result = SyncResult(ops)
+
+    async def run(op):
+        if op['action'] != 'create':
+            protected = _protected(guild, op, keep_channel)
+            if protected:
+                result.skipped.append((op, protected))
+                return
+        try:
+            created = await scheduler.call(op_route(op), guild.id, lambda: _apply(guild, op, result, reason),
+                                           target=op['name'])
+            if op['action'] == 'create':
+                result.created[op.get('ref', op['name'])] = created
+            result.applied.append(op)
+        except (discord.NotFound, LookupError):
+            result.skipped.append((op, 'already deleted'))
+        except Exception as e:
+            result.failed.append((op, e))
+            print(f"Error applying {op['action']} {op['kind']} {op['name']}: {e}")
+
+    def is_category_delete(op):
+        return op['kind'] == 'category' and op['action'] == 'delete'
+
+    first = [op for op in ops if op['kind'] in ('role', 'category') and not is_category_delete(op)]
+    second = [op for op in ops if op['kind'] in ('text', 'voice')]
+    last = [op for op in ops if is_category_delete(op)]
+    with BUILD_PHASE_SECONDS.time(phase='sync'):
+        for name, phase in (('roles and categories', first), ('channels', second), ('empty categories', last)):
+            if phase:
+                with tracing.span(name, operations=len(phase)):
+                    await asyncio.gather(*(run(op) for op in phase))
+
+    print(f"Sync applied {len(result.applied)} operations "
+          f"({len(result.skipped)} skipped, {len(result.failed)} failed)")
+    return result
@@ -0,0 +1,62 @@
+"""Cache of rendered static embeds.
+
+Help and build-option embeds are the same for every caller with the same
+language and templates, but rendering them takes dozens of message lookups.
+``EmbedCache`` keeps the rendered payload per key (command, language,
+template registry version) and hands out independent copies with a fresh
+timestamp, so callers can still add per-user fields to their copy.
+"""
+from collections import OrderedDict
+from datetime import datetime
+
+import discord
+
+# Commands x languages x a few template versions in flight
+DEFAULT_RENDER_CACHE_SIZE = 64
+
+
+def _copy_payload(payload):
+    """Copy an embed payload deep enough that the copy can be mutated freely"""
+    copied = {}
+    for key, value in payload.items():
+        if isinstance(value, dict):
+            value = dict(value)
+        elif isinstance(value, list):
+            value = [dict(item) for item in value]
+        copied[key] = value
+    return copied
+
+
+class EmbedCache:
+    """LRU cache of embed payloads, keyed by any hashable render key"""
+
+    def __init__(self, max_size=DEFAULT_RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._payloads = OrderedDict()
+
+    def get(self, key, render):
+        """Get a fresh copy of the embed for ``key``, calling ``render()`` on a miss"""
+        payload = self._payloads.get(key)
+        if payload is None:
+            self.misses += 1
+            payload = render().to_dict()
+            self._payloads[key] = payload
+            while len(self._payloads) > self.max_size:
+                self._payloads.popitem(last=False)
+        else:
+            self.hits += 1
+            self._payloads.move_to_end(key)
+
+        embed = discord.Embed.from_dict(_copy_payload(payload))
+        if 'timestamp' in payload:
+            embed.timestamp = datetime.utcnow()
+        return embed
+
+    def invalidate(self):
+        """Drop every cached embed (templates or LANGUAGES changed)"""
+        self._payloads.clear()
+
+    def __len__(self):
+        return len(self._payloads)
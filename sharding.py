@@ -0,0 +1,70 @@
+"""Shard configuration shared by bot.py and the cluster launcher.
+
+Sharding is configured through the environment:
+
+* ``SHARDING=auto`` runs an AutoShardedBot with as many shards as Discord
+  recommends, all in this process.
+* ``SHARD_COUNT`` (plus optionally ``SHARD_IDS``, e.g. ``0-3`` or ``4,5``)
+  pins the total shard count and the shards this process runs.
+  ``cluster.py`` sets both for each of its worker processes.
+* ``CLUSTER_ID`` names the worker process in logs and ``!shards``.
+"""
+import os
+
+
+def parse_shard_ids(value):
+    """Parse a shard id list such as ``0-3,8`` into a sorted list of ints"""
+    shard_ids = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = (int(x) for x in part.split('-', 1))
+            shard_ids.update(range(start, end + 1))
+        else:
+            shard_ids.add(int(part))
+    return sorted(shard_ids)
+
+
+def format_shard_ids(shard_ids):
+    """Format shard ids the way parse_shard_ids reads them"""
+    shard_ids = sorted(shard_ids)
+    if shard_ids and shard_ids == list(range(shard_ids[0], shard_ids[-1] + 1)):
+        return f"{shard_ids[0]}-{shard_ids[-1]}"
+    return ','.join(str(shard_id) for shard_id in shard_ids)
+
+
+def shard_ranges(shard_count, clusters):
+    """Split shards 0..shard_count-1 into at most ``clusters`` contiguous ranges"""
+    clusters = max(1, min(clusters, shard_count))
+    per_cluster, extra = divmod(shard_count, clusters)
+    ranges = []
+    start = 0
+    for i in range(clusters):
+        size = per_cluster + (1 if i < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def shard_config_from_env():
+    """Get AutoShardedBot keyword arguments from the environment, or None to run unsharded"""
+    shard_count = os.getenv('SHARD_COUNT')
+    shard_ids = os.getenv('SHARD_IDS')
+    if shard_count:
+        config = {'shard_count': int(shard_count)}
+        if shard_ids:
+            config['shard_ids'] = parse_shard_ids(shard_ids)
+        return config
+    if shard_ids:
+        raise ValueError("SHARD_IDS requires SHARD_COUNT")
+    if os.getenv('SHARDING', 'off').lower() == 'auto':
+        return {}
+    return None
+
+
+def cluster_id():
+    """This process's cluster id, or None when not started by cluster.py"""
+    value = os.getenv('CLUSTER_ID')
+    return int(value) if value else None
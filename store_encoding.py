@@ -0,0 +1,51 @@
+"""Compact on-disk encoding for saved builds.
+
+The compact encoding is minified JSON compressed with zlib behind a small
+header: the magic bytes ``BBS`` and one encoding version byte.  Readers
+accept it as well as plain JSON text, so stores can switch encodings
+without a migration step; data is rewritten in the configured encoding on
+its next write.
+"""
+import json
+import zlib
+
+MAGIC = b'BBS'
+ENCODING_VERSION = 1
+
+ENCODING_JSON = 'json'
+ENCODING_COMPACT = 'compact'
+ENCODINGS = (ENCODING_JSON, ENCODING_COMPACT)
+
+# zlib level 6 is the usual size/speed balance; saves run off the event loop
+COMPRESSION_LEVEL = 6
+
+
+class EncodingError(ValueError):
+    """Raised when stored data cannot be decoded"""
+
+
+def dumps_compact(obj):
+    """Encode an object as header + zlib-compressed minified JSON"""
+    raw = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return MAGIC + bytes([ENCODING_VERSION]) + zlib.compress(raw, COMPRESSION_LEVEL)
+
+
+def is_compact(data):
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def loads(data):
+    """Decode data written either compact or as plain JSON text"""
+    if is_compact(data):
+        data = bytes(data)
+        version = data[len(MAGIC)]
+        if version != ENCODING_VERSION:
+            raise EncodingError(f"unsupported encoding version {version}")
+        try:
+            data = zlib.decompress(data[len(MAGIC) + 1:])
+        except zlib.error as e:
+            raise EncodingError(f"corrupt compressed data: {e}") from e
+    try:
+        return json.loads(data)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise EncodingError(f"invalid JSON: {e}") from e
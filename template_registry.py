@@ -0,0 +1,218 @@
+"""Hot-reloadable template registry.
+
+``templates.json`` is polled for changes (file mtime and size first, then a
+content hash, so an untouched file costs one ``stat`` per poll).  New
+content is validated before it replaces anything: a bad edit is reported
+and the previous templates stay live.  A valid file is swapped in as a
+single new mapping, and listeners are told which templates were added,
+changed or removed (by per-template content hash) so derived caches only
+drop what actually changed.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from types import MappingProxyType
+
+import discord
+
+DEFAULT_TEMPLATES_PATH = 'templates.json'
+
+# Seconds between checks of templates.json for changes
+DEFAULT_POLL_INTERVAL = 5.0
+
+CHANNEL_TYPES = ('text', 'voice')
+
+
+class TemplateValidationError(ValueError):
+    """Raised when templates.json does not match the template schema"""
+
+
+def _require(condition, path, message):
+    if not condition:
+        raise TemplateValidationError(f"{path}: {message}")
+
+
+def _require_name(data, path):
+    _require(isinstance(data, dict), path, "must be an object")
+    _require(isinstance(data.get('name'), str) and data['name'].strip(), path, "needs a non-empty 'name'")
+
+
+def validate_template(template, path):
+    """Check a single template against the schema the builders expect"""
+    _require(isinstance(template, dict), path, "must be an object")
+    _require(isinstance(template.get('server_name'), str), path, "needs a 'server_name' string")
+
+    categories = template.get('categories')
+    _require(isinstance(categories, list), path, "needs a 'categories' list")
+    for i, category in enumerate(categories):
+        category_path = f"{path}.categories[{i}]"
+        _require_name(category, category_path)
+        channels = category.get('channels')
+        _require(isinstance(channels, list), category_path, "needs a 'channels' list")
+        for j, channel in enumerate(channels):
+            channel_path = f"{category_path}.channels[{j}]"
+            _require_name(channel, channel_path)
+            _require(channel.get('type', 'text') in CHANNEL_TYPES, channel_path,
+                     f"'type' must be one of {', '.join(CHANNEL_TYPES)}")
+            _require(isinstance(channel.get('topic', ''), str), channel_path, "'topic' must be a string")
+
+    roles = template.get('roles')
+    _require(isinstance(roles, list), path, "needs a 'roles' list")
+    for i, role in enumerate(roles):
+        role_path = f"{path}.roles[{i}]"
+        _require_name(role, role_path)
+        permissions = role.get('permissions', [])
+        if isinstance(permissions, int) and not isinstance(permissions, bool):
+            continue
+        _require(isinstance(permissions, list), role_path, "'permissions' must be a list or an integer")
+        unknown = [perm for perm in permissions if perm not in discord.Permissions.VALID_FLAGS]
+        _require(not unknown, role_path, f"unknown permissions {unknown}")
+
+
+def validate_templates(templates):
+    """Check a whole templates.json document, raising TemplateValidationError"""
+    _require(isinstance(templates, dict), 'templates.json', "must be an object of name -> template")
+    for name, template in templates.items():
+        _require(name == name.lower() and name.strip(), name, "template names must be lowercase")
+        validate_template(template, name)
+
+
+def template_hash(template):
+    """Stable content hash of a template"""
+    canonical = json.dumps(template, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class TemplateRegistry:
+    """Read-only mapping of template name -> template that follows templates.json.
+
+    ``add_listener(callback)`` registers ``callback(changed_names)``, called
+    after every swap with the set of templates whose content changed.
+    """
+
+    def __init__(self, path=DEFAULT_TEMPLATES_PATH, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.templates = MappingProxyType({})
+        self.hashes = {}
+        self.version = 0
+        self.last_error = None
+        self._stat = None
+        self._file_hash = None
+        self._listeners = []
+        self._task = None
+        self.reload()
+
+    # Mapping access always reads the current snapshot
+    def __getitem__(self, name):
+        return self.templates[name]
+
+    def __contains__(self, name):
+        return name in self.templates
+
+    def __iter__(self):
+        return iter(self.templates)
+
+    def __len__(self):
+        return len(self.templates)
+
+    def get(self, name, default=None):
+        return self.templates.get(name, default)
+
+    def items(self):
+        return self.templates.items()
+
+    def keys(self):
+        return self.templates.keys()
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _read_if_changed(self):
+        """Return the file content if it changed since the last check, else None"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._stat != 'missing':
+                self._stat = 'missing'
+                print(f"Error: {self.path} not found!")
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._stat:
+            return None
+        self._stat = signature
+
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        file_hash = hashlib.sha256(content).hexdigest()
+        if file_hash == self._file_hash:
+            # Touched but not edited
+            return None
+        self._file_hash = file_hash
+        return content
+
+    def reload(self, content=None):
+        """Load templates.json if it changed; returns the set of changed template names"""
+        if content is None:
+            content = self._read_if_changed()
+            if content is None:
+                return set()
+
+        try:
+            templates = json.loads(content)
+            validate_templates(templates)
+        except (json.JSONDecodeError, UnicodeDecodeError, TemplateValidationError) as e:
+            self.last_error = str(e)
+            if self.version:
+                print(f"Error: Invalid {self.path} ({e}), keeping the previous templates")
+            else:
+                print(f"Error: Invalid {self.path} ({e})")
+            return set()
+
+        hashes = {name: template_hash(template) for name, template in templates.items()}
+        changed = {name for name in hashes.keys() | self.hashes.keys() if hashes.get(name) != self.hashes.get(name)}
+
+        # Swap in one step; readers hold either the old or the new snapshot
+        self.templates = MappingProxyType(templates)
+        self.hashes = hashes
+        self.version += 1
+        self.last_error = None
+
+        if changed and self.version > 1:
+            print(f"🔄 Reloaded {self.path}: {', '.join(sorted(changed))} changed")
+        for callback in self._listeners:
+            try:
+                callback(changed)
+            except Exception as e:
+                print(f"Error in template change listener: {e}")
+        return changed
+
+    async def poll(self):
+        """Check templates.json once without blocking the event loop on file I/O"""
+        content = await asyncio.to_thread(self._read_if_changed)
+        if content is not None:
+            return self.reload(content)
+        return set()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Error checking {self.path} for changes: {e}")
+
+    def start(self):
+        """Start polling templates.json on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name='template-registry')
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,96 @@
+"""Shared setup for tests that drive the bot against fake_discord.FakeDiscord.
+
+The bot module reads its storage paths at import time, so they are pointed
+at a temporary directory before it is imported.  One event loop, fake
+server and logged-in bot are shared by the whole session; every test gets
+a fresh guild with a ``general`` and a ``commands`` channel.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_directory = tempfile.mkdtemp(prefix='builderbot-tests-')
+for _name, _filename in (('BUILD_STORE_PATH', 'builds.db'), ('GUILD_SETTINGS_PATH', 'settings.db'),
+                         ('CHECKPOINT_PATH', 'checkpoints.json'), ('COMMAND_SYNC_PATH', 'command_sync.json'),
+                         ('TRACE_PATH', 'traces.jsonl')):
+    os.environ[_name] = os.path.join(_directory, _filename)
+os.environ['TEMPLATES_PATH'] = os.path.join(ROOT, 'templates.json')
+os.environ['PROGRESS_INTERVAL'] = '0'
+
+import bot as builder  # noqa: E402
+from fake_discord import FakeDiscord  # noqa: E402
+
+SETTLE_TIMEOUT = 30.0
+
+
+class Harness:
+    """The fake API, the bot and helpers for waiting on the work a command starts"""
+
+    def __init__(self, loop, fake):
+        self.loop = loop
+        self.fake = fake
+        self.bot = builder.bot
+
+    def run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def wait_until(self, predicate, timeout=SETTLE_TIMEOUT):
+        """Run the loop until ``predicate()`` is true"""
+        async def poll():
+            deadline = time.monotonic() + timeout
+            while not predicate():
+                if time.monotonic() > deadline:
+                    raise AssertionError(f"timed out after {timeout}s waiting for {predicate}")
+                await asyncio.sleep(0.01)
+        self.run(poll())
+
+    def _busy(self):
+        # Event handlers and slash command invocations run as named tasks; builds run as jobs
+        for task in asyncio.all_tasks(self.loop):
+            name = task.get_name()
+            if name.startswith('discord.py: on_') or name == 'CommandTree-invoker':
+                return True
+        return builder.BUILD_JOBS.active_count > 0 or builder.BUILD_JOBS.queued_count > 0
+
+    def settle(self, timeout=SETTLE_TIMEOUT):
+        """Wait for every command handler and queued build to finish"""
+        self.wait_until(lambda: not self._busy(), timeout)
+
+    def new_guild(self, name='Test Server'):
+        guild_id = self.fake.create_guild(name, channels=('general', 'commands'))
+        guild = self.bot.get_guild(int(guild_id))
+        return guild, guild.text_channels[1]
+
+    def send(self, channel, content):
+        """Post ``content`` as the guild owner and wait for what it started"""
+        message_id = self.fake.post_message(str(channel.id), content)
+        self.settle()
+        return message_id
+
+
+@pytest.fixture(scope='session')
+def harness():
+    loop = asyncio.new_event_loop()
+    fake = FakeDiscord()
+    loop.run_until_complete(fake.start())
+    loop.run_until_complete(builder.bot.login('fake-token'))
+    fake.attach(builder.bot)
+    yield Harness(loop, fake)
+    loop.run_until_complete(builder.bot.close())
+    loop.run_until_complete(fake.stop())
+    loop.close()
+
+
+@pytest.fixture
+def guild(harness):
+    """A fresh guild and its command channel, with an empty request log"""
+    guild, command_channel = harness.new_guild()
+    harness.fake.reset_log()
+    return guild, command_channel
@@ -0,0 +1,26 @@
+"""Resumed builds against FakeDiscord: what may and may not be adopted."""
+from build_executor import RouteScheduler, build_ops, execute_build
+
+
+def test_resumed_build_adopts_only_what_it_may_manage(harness, guild):
+    guild, command_channel = guild
+    member_role = harness.run(guild.create_role(name='Member'))
+    lobby = harness.run(guild.create_category('Lobby'))
+    harness.run(command_channel.edit(category=lobby))
+    bot_role = guild.me.top_role
+    template = {
+        'server_name': guild.name,
+        'roles': [{'name': bot_role.name, 'permissions': []}, {'name': 'Member', 'permissions': []}],
+        'categories': [{'name': 'Lobby', 'channels': [{'name': command_channel.name, 'type': 'text'}]}],
+    }
+
+    result = harness.run(execute_build(guild, build_ops(template), RouteScheduler(), adopt=True,
+                                       keep_channel=command_channel))
+
+    assert not result.failed
+    assert result.created['role:1'] == member_role
+    assert result.created['category:0'] == lobby
+    # The bot's own managed role and the command channel are never taken over
+    assert result.created['role:0'] != bot_role
+    assert result.created['channel:0:0'] != command_channel
+    assert harness.fake.count('POST /guilds/{guild_id}/roles') == 2
@@ -0,0 +1,193 @@
+"""Drive the build, sync, save and cleanup commands end to end against FakeDiscord."""
+import copy
+
+import discord
+
+import bot as builder
+from metrics import REGISTRY
+
+# Routes that change a guild's structure, as opposed to the bot's own messages
+STRUCTURE_ROUTES = (
+    'PATCH /guilds/{guild_id}',
+    'POST /guilds/{guild_id}/roles',
+    'PATCH /guilds/{guild_id}/roles',
+    'PATCH /guilds/{guild_id}/roles/{role_id}',
+    'DELETE /guilds/{guild_id}/roles/{role_id}',
+    'POST /guilds/{guild_id}/channels',
+    'PATCH /guilds/{guild_id}/channels',
+    'PATCH /channels/{channel_id}',
+    'DELETE /channels/{channel_id}',
+)
+
+
+def structure_requests(fake):
+    return [request['route'] for request in fake.requests if request['route'] in STRUCTURE_ROUTES]
+
+
+def layout(guild):
+    """Categories with their channels, and roles top to bottom, without ids or the server name"""
+    saved = builder.save_server_structure(guild)
+    return saved['categories'], saved['roles']
+
+
+def last_edited_message(fake):
+    edited = fake.calls('PATCH /channels/{channel_id}/messages/{message_id}')[-1]
+    return fake.messages[edited['path'].rsplit('/', 1)[1]]
+
+
+def saved_build_code(fake):
+    """The code shown by the last !savebuild"""
+    fields = last_edited_message(fake)['embeds'][0]['fields']
+    return next(field['value'] for field in fields if field['value'].startswith('`')).strip('`')
+
+
+def assert_built(guild, template_name):
+    plan = builder.get_template_plan(template_name)
+    assert guild.name == plan.server_name
+    assert [category.name for category in guild.categories] == \
+        [category['name'] for category in plan.template['categories']]
+    for category, expected in zip(guild.categories, plan.template['categories']):
+        assert sorted(channel.name for channel in category.channels) == \
+            sorted(channel['name'] for channel in expected['channels'])
+    role_names = {role.name for role in guild.roles}
+    assert {role['name'] for role in plan.template.get('roles', [])} <= role_names
+
+
+def test_build_template(harness, guild):
+    guild, command_channel = guild
+    harness.send(command_channel, '!build gaming')
+
+    assert_built(guild, 'gaming')
+    assert command_channel in guild.channels
+    harness.fake.assert_sequence(
+        'POST /channels/{channel_id}/messages',
+        'PATCH /guilds/{guild_id}',
+        'DELETE /channels/{channel_id}',
+        'POST /guilds/{guild_id}/roles',
+        'POST /guilds/{guild_id}/channels',
+        'PATCH /channels/{channel_id}/messages/{message_id}',
+    )
+    # The fake rejects channels whose category does not exist yet
+    assert harness.fake.count(status=400) == 0
+
+
+def test_estimate_counts_down_to_zero(harness, guild, monkeypatch):
+    guild, command_channel = guild
+    estimates = []
+    learn = builder.THROUGHPUT.learn
+    monkeypatch.setattr(builder.THROUGHPUT, 'learn', lambda estimate: (estimates.append(estimate), learn(estimate)))
+    harness.send(command_channel, '!build tech')
+
+    estimate, = estimates
+    assert estimate.completed == estimate.requests
+    assert estimate.remaining() == 0
+
+
+def test_sync_after_build_changes_nothing(harness, guild):
+    guild, command_channel = guild
+    harness.send(command_channel, '!build tech')
+    built = layout(guild)
+
+    harness.fake.reset_log()
+    harness.send(command_channel, '!build tech sync')
+
+    assert structure_requests(harness.fake) == []
+    assert layout(guild) == built
+    harness.fake.assert_sequence('POST /channels/{channel_id}/messages',
+                                 'PATCH /channels/{channel_id}/messages/{message_id}')
+
+
+def test_sync_renames_a_renamed_channel(harness, guild):
+    guild, command_channel = guild
+    harness.send(command_channel, '!build gaming')
+    template = copy.deepcopy(builder.get_template_plan('gaming').template)
+    channel_data = template['categories'][0]['channels'][0]
+    renamed = discord.utils.get(guild.categories[0].channels, name=channel_data['name'])
+    channel_data['name'] = 'renamed-channel'
+
+    harness.fake.reset_log()
+    harness.run(builder.sync_structure(guild, template, keep_channel=command_channel))
+
+    assert structure_requests(harness.fake) == ['PATCH /channels/{channel_id}']
+    assert guild.get_channel(renamed.id).name == 'renamed-channel'
+
+
+def test_build_survives_rate_limits_and_server_errors(harness, guild):
+    guild, command_channel = guild
+    harness.fake.fail('POST /guilds/{guild_id}/roles', status=500)
+    harness.fake.fail('POST /guilds/{guild_id}/channels', status=429, times=2)
+    harness.send(command_channel, '!build tech')
+
+    assert_built(guild, 'tech')
+    assert harness.fake.count('POST /guilds/{guild_id}/roles', status=500) == 1
+    assert harness.fake.count('POST /guilds/{guild_id}/channels', status=429) == 2
+
+
+def test_slash_build(harness, guild):
+    guild, command_channel = guild
+    harness.fake.invoke_slash(str(command_channel.id), 'build', {'template': 'study'})
+    harness.settle()
+
+    assert_built(guild, 'study')
+    harness.fake.assert_sequence(
+        'POST /interactions/{interaction_id}/{interaction_token}/callback',
+        'POST /webhooks/{application_id}/{interaction_token}',
+        'PATCH /guilds/{guild_id}',
+        'POST /guilds/{guild_id}/channels',
+        'PATCH /webhooks/{application_id}/{interaction_token}/messages/{message_id}',
+    )
+    assert 'command="build",kind="slash",outcome="ok"' in REGISTRY.render()
+
+
+def test_saved_build_round_trip(harness, guild):
+    guild, command_channel = guild
+    harness.send(command_channel, '!build community')
+    harness.send(command_channel, '!savebuild')
+
+    build_code = saved_build_code(harness.fake)
+
+    copy, copy_command_channel = harness.new_guild('Copy')
+    harness.fake.reset_log()
+    harness.send(copy_command_channel, f'!build {build_code}')
+
+    assert copy.name == guild.name
+    assert layout(copy) == layout(guild)
+    harness.fake.assert_sequence('PATCH /guilds/{guild_id}', 'POST /guilds/{guild_id}/roles',
+                                 'POST /guilds/{guild_id}/channels')
+
+
+def test_remove_saved_build(harness, guild):
+    guild, command_channel = guild
+    harness.send(command_channel, '!build study')
+    harness.send(command_channel, '!savebuild')
+    build_code = saved_build_code(harness.fake)
+    owner_id = guild.owner_id
+    before = harness.run(builder.run_store('count', builder.BUILD_STORE.count, owner_id))
+
+    harness.send(command_channel, f'!removebuild {build_code}')
+
+    assert harness.run(builder.get_build_by_code(build_code)) is None
+    assert harness.run(builder.run_store('count', builder.BUILD_STORE.count, owner_id)) == before - 1
+    removed = harness.fake.calls('POST /channels/{channel_id}/messages')[-1]['json']['embeds'][0]
+    assert any(build_code in field['value'] for field in removed['fields'])
+
+
+def test_delete_build_after_confirmation(harness, guild):
+    guild, command_channel = guild
+    harness.send(command_channel, '!build study')
+    assert guild.categories
+    harness.fake.reset_log()
+
+    harness.fake.post_message(str(command_channel.id), '!deletebuild')
+    reaction_route = 'PUT /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me'
+    harness.wait_until(lambda: harness.fake.count(reaction_route) == 2
+                       and harness.bot._listeners.get('raw_reaction_add'))
+    confirmation_id = harness.fake.calls(reaction_route)[0]['path'].split('/')[4]
+    harness.fake.add_user_reaction(confirmation_id, '✅')
+    harness.settle()
+
+    assert guild.categories == []
+    assert [channel.name for channel in guild.channels] == [command_channel.name]
+    assert harness.fake.count('DELETE /guilds/{guild_id}/roles/{role_id}') == 0
+    harness.fake.assert_sequence('POST /channels/{channel_id}/messages', reaction_route, reaction_route,
+                                 'DELETE /channels/{channel_id}', 'POST /channels/{channel_id}/messages')
@@ -0,0 +1,352 @@
+"""Per-build traces: nested timed spans written to a rotating JSONL file.
+
+A trace is opened around each deployment with ``trace()``; inside it,
+``span()`` opens child spans (phases, role/category/channel groups,
+scheduled API calls).  The current span lives in a context variable, so
+tasks started with ``asyncio.gather`` inherit the span that was current
+when they were created and concurrent work nests correctly.
+
+Discord HTTP requests are recorded by callbacks on the client's aiohttp
+trace config (``add_http_callbacks``): a request made inside a scheduled API
+call span is added to it as an ``http`` event (status, duration, 429
+retry-after), any other request becomes a leaf span of its own.  The time
+an API call span spends outside its HTTP events is time spent waiting on
+rate limits.
+
+Finished traces are one JSON line each, appended write-behind by
+``TraceLog``; tracing is best effort, so a failed append drops those
+traces instead of retrying them.  Outside a trace every helper is a no-op.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+from metrics import api_route
+from persistence import WriteBehindWorker
+
+DEFAULT_TRACE_PATH = 'build_traces.jsonl'
+DEFAULT_TRACE_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_TRACE_BACKUPS = 3
+
+# Span kind for calls made through the RouteScheduler; HTTP requests inside
+# one are recorded as events instead of separate spans
+KIND_API = 'api'
+
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    def __init__(self, trace, name, parent=None, **attrs):
+        self.trace = trace
+        self.id = trace.next_id()
+        self.parent_id = parent.id if parent is not None else None
+        self.name = name
+        self.attrs = attrs
+        self.events = []
+        self.started = time.perf_counter()
+        self.ended = None
+        trace.spans.append(self)
+
+    def __bool__(self):
+        return True
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def annotate(self, event, **attrs):
+        """Record a point-in-time event (retry, wait, HTTP response) on this span"""
+        self.events.append((time.perf_counter(), event, attrs))
+
+    def finish(self, error=None):
+        if self.ended is not None:
+            return
+        self.ended = time.perf_counter()
+        if error is not None:
+            self.attrs['error'] = str(error) or type(error).__name__
+
+    def to_dict(self):
+        start = self.trace.root_started
+        data = {
+            'id': self.id,
+            'parent': self.parent_id,
+            'name': self.name,
+            'start': round(self.started - start, 4),
+            'duration': round((self.ended if self.ended is not None else time.perf_counter()) - self.started, 4),
+        }
+        if self.attrs:
+            data['attrs'] = self.attrs
+        if self.events:
+            data['events'] = [dict(attrs, at=round(at - start, 4), event=event) for at, event, attrs in self.events]
+        return data
+
+
+class _NullSpan:
+    """Stand-in returned outside a trace so callers don't need None checks"""
+
+    id = None
+
+    def __bool__(self):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def annotate(self, event, **attrs):
+        pass
+
+    def finish(self, error=None):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """A tree of spans recorded for one build"""
+
+    def __init__(self, name, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.root_started = time.perf_counter()
+        self.spans = []
+        self._ids = 0
+        self.root = Span(self, name, **attrs)
+
+    def next_id(self):
+        self._ids += 1
+        return self._ids
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'name': self.root.name,
+            'started_at': self.started_at,
+            'duration': round((self.root.ended or time.perf_counter()) - self.root_started, 4),
+            'attrs': self.root.attrs,
+            'spans': [span.to_dict() for span in self.spans[1:]],
+        }
+
+
+def current_span():
+    """The innermost open span, or NULL_SPAN outside a trace"""
+    return _current.get() or NULL_SPAN
+
+
+def start_span(name, parent=None, **attrs):
+    """Open a span without making it current; finish it with ``span.finish()``"""
+    parent = parent if parent is not None else _current.get()
+    if not parent:
+        return NULL_SPAN
+    return Span(parent.trace, name, parent, **attrs)
+
+
+@contextmanager
+def use(span):
+    """Make an already open span current for the ``with`` block"""
+    token = _current.set(span or None)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name, parent=None, **attrs):
+    """Open a child span of ``parent`` (default: the current span) for the ``with`` block"""
+    child = start_span(name, parent, **attrs)
+    if not child:
+        yield child
+        return
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.finish(error=e)
+        raise
+    finally:
+        child.finish()
+        _current.reset(token)
+
+
+def annotate(event, **attrs):
+    current_span().annotate(event, **attrs)
+
+
+def set_attributes(**attrs):
+    current_span().set(**attrs)
+
+
+@contextmanager
+def trace(name, log, **attrs):
+    """Record a new trace for the ``with`` block and write it to ``log`` when done"""
+    recorded = Trace(name, **attrs)
+    token = _current.set(recorded.root)
+    try:
+        yield recorded
+    except BaseException as e:
+        recorded.root.finish(error=e)
+        raise
+    finally:
+        recorded.root.finish()
+        _current.reset(token)
+        try:
+            log.record(recorded.to_dict())
+        except Exception as e:
+            print(f"Error recording build trace: {e}")
+
+
+def add_http_callbacks(trace_config):
+    """Record Discord HTTP requests in the current trace via an aiohttp TraceConfig"""
+    async def on_request_start(session, context, params):
+        parent = _current.get()
+        context.span = None
+        if not parent:
+            return
+        context.http_started = time.perf_counter()
+        if parent.attrs.get('kind') == KIND_API:
+            context.span = parent
+        else:
+            context.span = Span(parent.trace, f"{params.method} {api_route(params.url.path)}", parent, kind='http')
+
+    async def on_request_end(session, context, params):
+        if context.span is None:
+            return
+        status = params.response.status
+        event = {'status': status, 'duration': round(time.perf_counter() - context.http_started, 4)}
+        if status == 429:
+            headers = params.response.headers
+            event['retry_after'] = headers.get('Retry-After') or headers.get('X-RateLimit-Reset-After')
+            event['scope'] = headers.get('X-RateLimit-Scope')
+        if context.span.attrs.get('kind') == 'http':
+            context.span.set(**event)
+            context.span.finish()
+        else:
+            context.span.annotate('http', **event)
+
+    async def on_request_exception(session, context, params):
+        if context.span is None:
+            return
+        if context.span.attrs.get('kind') == 'http':
+            context.span.finish(error=params.exception)
+        else:
+            context.span.annotate('http', error=str(params.exception))
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+class TraceLog:
+    """Append finished traces to a size-rotated JSONL file"""
+
+    def __init__(self, path=DEFAULT_TRACE_PATH, max_bytes=DEFAULT_TRACE_MAX_BYTES, backups=DEFAULT_TRACE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._pending = []
+        self.writer = WriteBehindWorker('build traces', self._snapshot, self._write)
+
+    def record(self, trace_data):
+        self._pending.append(json.dumps(trace_data, ensure_ascii=False, separators=(',', ':')))
+        self.writer.mark_dirty()
+
+    def _snapshot(self):
+        lines, self._pending = self._pending, []
+        return lines
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write(self, lines):
+        data = ''.join(line + '\n' for line in lines).encode('utf-8')
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and size + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'ab') as f:
+            f.write(data)
+
+    def _read_files(self, guild_id, limit):
+        found = []
+        for path in [self.path] + [f"{self.path}.{index}" for index in range(1, self.backups + 1)]:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            for line in reversed(lines):
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if guild_id is None or data.get('attrs', {}).get('guild_id') == guild_id:
+                    found.append(data)
+                    if len(found) >= limit:
+                        return found
+        return found
+
+    async def recent(self, guild_id=None, limit=5):
+        """The newest ``limit`` traces, optionally only those for one guild"""
+        found = []
+        for line in reversed(self._pending):
+            data = json.loads(line)
+            if guild_id is None or data.get('attrs', {}).get('guild_id') == guild_id:
+                found.append(data)
+        if len(found) < limit:
+            found.extend(await asyncio.to_thread(self._read_files, guild_id, limit - len(found)))
+        return found[:limit]
+
+    def start(self):
+        self.writer.start()
+
+    async def shutdown(self):
+        await self.writer.stop()
+
+
+def _children(spans, parent_id):
+    return [span for span in spans if span['parent'] == parent_id]
+
+
+def summarize(trace_data):
+    """Plain-text timeline of a recorded trace: phases, their groups and API totals"""
+    spans = trace_data['spans']
+    lines = []
+    for phase in _children(spans, 1):
+        if phase.get('attrs', {}).get('kind') in (KIND_API, 'http') or phase['name'] == 'progress edit':
+            continue
+        lines.append(f"{phase['name']:<22}+{phase['start']:>6.1f}s {phase['duration']:>6.1f}s")
+        for group in _children(spans, phase['id']):
+            if group.get('attrs', {}).get('kind') in (KIND_API, 'http'):
+                continue
+            calls = len(_children(spans, group['id']))
+            lines.append(f" {group['name']:<21}+{group['start']:>6.1f}s {group['duration']:>6.1f}s {calls:>4} calls")
+
+    api_calls = [span for span in spans if span.get('attrs', {}).get('kind') == KIND_API]
+    http_events = [event for span in api_calls for event in span.get('events', []) if event['event'] == 'http']
+    rate_limited = sum(1 for event in http_events if event.get('status') == 429)
+    waited = sum(span.get('attrs', {}).get('waited', 0) for span in api_calls)
+    in_http = sum(event.get('duration', 0) for event in http_events)
+    outside_http = sum(span['duration'] for span in api_calls) - in_http
+    lines.append(f"API: {len(api_calls)} calls, {len(http_events)} requests, {rate_limited} × 429")
+    # Summed over concurrent calls, so these can exceed the build's wall time
+    lines.append(f"call time queued {waited:.1f}s, in rate-limit waits {max(0.0, outside_http - waited):.1f}s")
+    progress = [span for span in spans if span['name'] == 'progress edit']
+    if progress:
+        lines.append(f"progress edits: {len(progress)} ({sum(span['duration'] for span in progress):.1f}s)")
+    return '\n'.join(lines)